@@ -0,0 +1,29 @@
+import os
+import shutil
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '3'))
+
+
+def on_starting(server):
+    """
+    Start every run with an empty Prometheus multiprocess directory. The
+    directory is the web service's own (celery writes to a sibling one).
+    """
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop live gauges of a worker that has exited"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    """Write out the worker's queued record-access audit events before it exits"""
+    from core.audit import flush_audit_log
+    flush_audit_log()
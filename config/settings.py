@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from celery.schedules import crontab
 
 load_dotenv()
 
@@ -18,11 +19,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'django_filters',
     'corsheaders',
     'core',
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -31,6 +34,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.QueryInstrumentationMiddleware',
+    'core.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -107,4 +112,136 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-}
\ No newline at end of file
+    'DEFAULT_THROTTLE_CLASSES': [
+        'core.throttling.TokenBucketThrottle',
+    ],
+    # Token buckets: user, client (IP) and endpoint classes; an empty rate disables a bucket
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.getenv('HARMS_THROTTLE_USER_RATE', '600/min'),
+        'client': os.getenv('HARMS_THROTTLE_CLIENT_RATE', '1200/min'),
+        'search': os.getenv('HARMS_THROTTLE_SEARCH_RATE', '120/min'),
+        'booking': os.getenv('HARMS_THROTTLE_BOOKING_RATE', '30/min'),
+        'exports': os.getenv('HARMS_THROTTLE_EXPORTS_RATE', '10/min'),
+        'analytics': os.getenv('HARMS_THROTTLE_ANALYTICS_RATE', '60/min'),
+    },
+}
+
+# Throttle bucket store: 'redis' (shared across workers) or 'memory' (tests, single process)
+HARMS_THROTTLE_BACKEND = os.getenv('HARMS_THROTTLE_BACKEND', 'redis')
+HARMS_THROTTLE_REDIS_URL = os.getenv('HARMS_THROTTLE_REDIS_URL', os.getenv('REDIS_CACHE_URL', 'redis://redis:6379/1'))
+
+# Shared cache (idempotency keys); the redis service in docker-compose
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_CACHE_URL', 'redis://redis:6379/1'),
+    }
+}
+
+# Idempotency-Key: how long responses are replayed, and how long an in-flight claim is held
+HARMS_IDEMPOTENCY_TTL_SECONDS = int(os.getenv('HARMS_IDEMPOTENCY_TTL_SECONDS', '86400'))
+HARMS_IDEMPOTENCY_LOCK_SECONDS = int(os.getenv('HARMS_IDEMPOTENCY_LOCK_SECONDS', '60'))
+
+# Celery
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULE = {
+    'send-appointment-reminders': {
+        'task': 'core.send_appointment_reminders',
+        'schedule': float(os.getenv('HARMS_REMINDER_INTERVAL_SECONDS', '300')),
+    },
+    'apply-notification-retention': {
+        'task': 'core.apply_notification_retention',
+        'schedule': crontab(hour=3, minute=0),
+    },
+    'maintain-partitions': {
+        'task': 'core.maintain_partitions',
+        'schedule': crontab(hour=2, minute=30),
+    },
+    'prune-change-log': {
+        'task': 'core.prune_change_log',
+        'schedule': crontab(hour=3, minute=30),
+    },
+    'refresh-rollups': {
+        'task': 'core.refresh_rollups',
+        'schedule': float(os.getenv('HARMS_ROLLUP_INTERVAL_SECONDS', '600')),
+    },
+    'refresh-next-available': {
+        'task': 'core.refresh_next_available',
+        'schedule': float(os.getenv('HARMS_NEXT_AVAILABLE_REFRESH_SECONDS', '300')),
+    },
+}
+
+# Hours before an appointment at which a reminder notification is sent
+HARMS_REMINDER_OFFSETS_HOURS = tuple(
+    int(hours) for hours in os.getenv('HARMS_REMINDER_OFFSETS_HOURS', '24,1').split(',')
+)
+
+# Change feeds: entries younger than the settle window are held back so slower
+# transactions can commit lower seqs first; the log is pruned after the retention
+HARMS_CHANGE_FEED_SETTLE_SECONDS = int(os.getenv('HARMS_CHANGE_FEED_SETTLE_SECONDS', '10'))
+HARMS_CHANGE_LOG_RETENTION_DAYS = int(os.getenv('HARMS_CHANGE_LOG_RETENTION_DAYS', '90'))
+
+# Cached patient summary (next appointment, unread count, latest results); dropped on writes
+HARMS_PATIENT_SUMMARY_TTL_SECONDS = int(os.getenv('HARMS_PATIENT_SUMMARY_TTL_SECONDS', '300'))
+
+# Read-through cache of single patients, doctors and appointments (GET by ID);
+# 0 disables. The optional per-process LRU may serve rows up to its TTL stale.
+HARMS_OBJECT_CACHE_TTL_SECONDS = int(os.getenv('HARMS_OBJECT_CACHE_TTL_SECONDS', '300'))
+HARMS_OBJECT_CACHE_LOCAL_SIZE = int(os.getenv('HARMS_OBJECT_CACHE_LOCAL_SIZE', '0'))
+HARMS_OBJECT_CACHE_LOCAL_TTL_SECONDS = float(os.getenv('HARMS_OBJECT_CACHE_LOCAL_TTL_SECONDS', '2'))
+
+# Precomputed next free slots per doctor and per specialty (the most a client can ask for)
+HARMS_NEXT_AVAILABLE_SIZE = int(os.getenv('HARMS_NEXT_AVAILABLE_SIZE', '20'))
+
+# Medical record access audit: 'buffered' writes in batches from a background
+# thread (spooling to disk while the database is unreachable); 'sync' writes per request
+HARMS_AUDIT_WRITE_MODE = os.getenv('HARMS_AUDIT_WRITE_MODE', 'buffered')
+HARMS_AUDIT_BATCH_SIZE = int(os.getenv('HARMS_AUDIT_BATCH_SIZE', '500'))
+HARMS_AUDIT_FLUSH_SECONDS = float(os.getenv('HARMS_AUDIT_FLUSH_SECONDS', '1.0'))
+HARMS_AUDIT_SPOOL_DIR = os.getenv('HARMS_AUDIT_SPOOL_DIR', os.path.join(BASE_DIR, 'audit_spool'))
+
+# Streaming table backups (SystemAdmin.backup_database, backup_database/restore_database commands)
+HARMS_BACKUP_DIR = os.getenv('HARMS_BACKUP_DIR', os.path.join(BASE_DIR, 'backups'))
+
+# Request instrumentation (query count, SQL time, Server-Timing headers)
+HARMS_INSTRUMENTATION_ENABLED = os.getenv('HARMS_INSTRUMENTATION_ENABLED', 'True') == 'True'
+HARMS_SLOW_QUERY_MS = float(os.getenv('HARMS_SLOW_QUERY_MS', '100'))
+
+# Prometheus metrics endpoint; set PROMETHEUS_MULTIPROC_DIR (one per service) to aggregate
+# gunicorn/celery workers, and HARMS_METRICS_EXTRA_DIRS to the other services' directories
+HARMS_METRICS_TOKEN = os.getenv('HARMS_METRICS_TOKEN', '')
+
+# On-demand request profiling (system admins or X-Harms-Profile secret header)
+HARMS_PROFILING_ENABLED = os.getenv('HARMS_PROFILING_ENABLED', 'False') == 'True'
+HARMS_PROFILING_SECRET = os.getenv('HARMS_PROFILING_SECRET', '')
+HARMS_PROFILING_SAMPLE_RATE = float(os.getenv('HARMS_PROFILING_SAMPLE_RATE', '1.0'))
+HARMS_PROFILE_DIR = os.getenv('HARMS_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'structured': {
+            'format': '%(asctime)s %(levelname)s %(name)s %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'structured',
+        },
+    },
+    'loggers': {
+        'core.instrumentation': {
+            'handlers': ['console'],
+            'level': os.getenv('HARMS_INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'core.slow_queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -1,23 +1,137 @@
+import json
+
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ALL_VAR, ORDER_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
 from .models import (
     User, Patient, Doctor, SystemAdmin,
-    MedicalRecord, Appointment, Notification,
+    MedicalRecord, Appointment, Notification, ArchivedNotification,
     Schedule, Analytics, Report,
-    Medication, TestResult, TimeSlot
+    Medication, TestResult, TimeSlot, RecordAccess
 )
 
+# Below this many (estimated) rows a changelist counts exactly
+EXACT_COUNT_LIMIT = 10000
+CURSOR_VAR = 'after'
+
+
+def estimated_count(queryset):
+    """The planner's row estimate for a queryset on PostgreSQL; None elsewhere"""
+    if connections[queryset.db].vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """Uses the planner estimate instead of COUNT(*) when it is large"""
+    estimated = False
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < EXACT_COUNT_LIMIT:
+            return super().count
+        self.estimated = True
+        return estimate
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Pages by primary key (?after=<pk>, newest first) while the list is in its
+    default order, so every page is an index range scan however deep it is.
+    Sorting by a column falls back to numbered pages.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.keyset = ORDER_VAR not in request.GET and ALL_VAR not in request.GET
+        self.cursor = request.GET.get(CURSOR_VAR) if self.keyset else None
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Changing a filter, the search or the sort starts again from the first page
+        return super().get_query_string(new_params, [*(remove or []), CURSOR_VAR])
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.cursor is not None and exclude_parameters is None:
+            try:
+                queryset = queryset.filter(pk__lt=self.model._meta.pk.to_python(self.cursor))
+            except ValidationError:
+                raise IncorrectLookupParameters
+        return queryset
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.first_page_url = self.get_query_string()
+        self.next_page_url = None
+        if self.keyset and self.multi_page:
+            self.result_list = list(self.result_list)
+            if self.result_list:
+                self.next_page_url = self.get_query_string({CURSOR_VAR: self.result_list[-1].pk})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist for tables too big to count or page by OFFSET: estimated counts,
+    keyset pages in primary-key order and no per-filter facet counts.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    ordering = ('-pk',)
+    # ID prefix -> lookup. A search for e.g. 'PAT-...' filters that one column;
+    # ORing every search field defeats the indexes once combined with LIMIT.
+    id_search_fields = {}
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip().upper()
+        lookup = self.id_search_fields.get(term.partition('-')[0]) if '-' in term else None
+        if lookup:
+            return queryset.filter(**{lookup: term}), False
+        return super().get_search_results(request, queryset, search_term)
+
+
+class SpecialtyFilter(admin.SimpleListFilter):
+    """Specialty choices from the doctors table rather than a DISTINCT over appointments"""
+    title = 'specialty'
+    parameter_name = 'specialty'
+
+    def lookups(self, request, model_admin):
+        specialties = Doctor.objects.order_by('specialty').values_list('specialty', flat=True).distinct()
+        return [(specialty, specialty) for specialty in specialties]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(specialty=self.value())
+        return queryset
+
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     list_display = ('user_id', 'email', 'user_type', 'is_active')
     list_filter = ('user_type', 'is_active')
-    search_fields = ('email', 'user_id')
+    search_fields = ('user_id__startswith', 'email__startswith')
+    search_help_text = 'Start of a user ID or email'
 
 
 @admin.register(Patient)
-class PatientAdmin(admin.ModelAdmin):
+class PatientAdmin(LargeTableAdmin):
     list_display = ('patient_id', 'full_name', 'email', 'phone_number')
-    search_fields = ('patient_id', 'full_name', 'email')
+    search_fields = ('patient_id__startswith', 'email__startswith', 'full_name')
 
 
 @admin.register(Doctor)
@@ -33,30 +147,48 @@ class SystemAdminAdmin(admin.ModelAdmin):
 
 
 @admin.register(MedicalRecord)
-class MedicalRecordAdmin(admin.ModelAdmin):
+class MedicalRecordAdmin(LargeTableAdmin):
     list_display = ('record_id', 'patient_id', 'doctor_id', 'visit_date')
-    list_filter = ('visit_date', 'visit_type')
-    search_fields = ('record_id', 'patient_id', 'doctor_id')
+    list_filter = ('visit_date',)
+    search_fields = ('record_id__startswith',)
+    id_search_fields = {'MR': 'record_id__startswith', 'PAT': 'patient_id', 'DOC': 'doctor_id'}
+    search_help_text = 'Start of a record ID, or a patient or doctor ID'
+    autocomplete_fields = ('medications', 'test_results')
 
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(LargeTableAdmin):
     list_display = ('appointment_id', 'patient_id', 'doctor_id', 'appointment_date', 'status')
-    list_filter = ('status', 'specialty', 'appointment_date')
-    search_fields = ('appointment_id', 'patient_id', 'doctor_id')
+    list_filter = ('status', SpecialtyFilter, 'appointment_date')
+    search_fields = ('appointment_id__startswith',)
+    id_search_fields = {'APT': 'appointment_id__startswith', 'PAT': 'patient_id', 'DOC': 'doctor_id'}
+    search_help_text = 'Start of an appointment ID, or a patient or doctor ID'
+    autocomplete_fields = ('time_slot',)
 
 
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
+class NotificationAdmin(LargeTableAdmin):
     list_display = ('notification_id', 'user_id', 'type', 'priority', 'is_read', 'sent_date')
     list_filter = ('type', 'priority', 'is_read', 'sent_date')
-    search_fields = ('notification_id', 'user_id', 'message')
+    search_fields = ('notification_id__startswith',)
+    id_search_fields = {'NOT': 'notification_id__startswith', 'PAT': 'user_id', 'DOC': 'user_id'}
+    search_help_text = 'Start of a notification ID, or the patient or doctor ID it was sent to'
+
+
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(LargeTableAdmin):
+    list_display = ('notification_id', 'user_id', 'type', 'priority', 'sent_date', 'archived_at')
+    list_filter = ('type', 'priority')
+    search_fields = ('notification_id__startswith',)
+    id_search_fields = {'NOT': 'notification_id__startswith', 'PAT': 'user_id', 'DOC': 'user_id'}
+    search_help_text = 'Start of a notification ID, or the patient or doctor ID it was sent to'
 
 
 @admin.register(Schedule)
 class ScheduleAdmin(admin.ModelAdmin):
     list_display = ('schedule_id', 'doctor_id', 'start_time', 'end_time')
     search_fields = ('schedule_id', 'doctor_id')
+    autocomplete_fields = ('available_slots', 'blocked_slots')
 
 
 @admin.register(Analytics)
@@ -73,20 +205,44 @@ class ReportAdmin(admin.ModelAdmin):
 
 
 @admin.register(Medication)
-class MedicationAdmin(admin.ModelAdmin):
+class MedicationAdmin(LargeTableAdmin):
     list_display = ('medication_id', 'name', 'dosage', 'prescribed_date')
-    search_fields = ('medication_id', 'name')
+    search_fields = ('medication_id__startswith',)
+    search_help_text = 'Start of a medication ID'
 
 
 @admin.register(TestResult)
-class TestResultAdmin(admin.ModelAdmin):
+class TestResultAdmin(LargeTableAdmin):
     list_display = ('test_id', 'test_name', 'test_date', 'status')
-    list_filter = ('test_date', 'status')
-    search_fields = ('test_id', 'test_name')
+    list_filter = ('test_date',)
+    search_fields = ('test_id__startswith',)
+    search_help_text = 'Start of a test result ID'
 
 
 @admin.register(TimeSlot)
-class TimeSlotAdmin(admin.ModelAdmin):
-    list_display = ('slot_id', 'start_time', 'end_time', 'is_available')
+class TimeSlotAdmin(LargeTableAdmin):
+    list_display = ('slot_id', 'doctor_id', 'start_time', 'end_time', 'is_available')
     list_filter = ('is_available', 'start_time')
-    search_fields = ('slot_id',)
\ No newline at end of file
+    search_fields = ('slot_id__startswith',)
+    id_search_fields = {'TS': 'slot_id__startswith', 'DOC': 'doctor_id'}
+    search_help_text = 'Start of a slot ID, or a doctor ID'
+
+
+@admin.register(RecordAccess)
+class RecordAccessAdmin(LargeTableAdmin):
+    """The audit log is append-only; the admin only reads it"""
+    list_display = ('accessed_at', 'record_id', 'patient_id', 'accessed_by', 'access_type', 'client_ip')
+    list_filter = ('access_type', 'accessed_at')
+    search_fields = ('record_id__startswith',)
+    id_search_fields = {'MR': 'record_id__startswith', 'PAT': 'patient_id', 'DOC': 'accessed_by',
+                        'USR': 'accessed_by'}
+    search_help_text = 'Start of a record ID, a patient ID, or the user ID of the reader'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
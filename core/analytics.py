@@ -0,0 +1,397 @@
+"""
+Vectorized appointment analytics.
+
+Appointment history is read with a single query into NumPy columns (integer
+codes and epoch seconds, no model instances), and every metric is computed
+with array operations (bincount, lexsort, cumsum) instead of per-row loops.
+"""
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from django.db import connections
+from django.db.models import BigIntegerField, Case, Func, IntegerField, Value, When
+from django.utils import timezone
+
+from .enums import AnalyticsMetric, AppointmentStatus
+from .models import Appointment, Doctor
+from .rollups import weekly_capacity_minutes
+
+STATUSES = list(AppointmentStatus)
+STATUS_CODES = {status.value: code for code, status in enumerate(STATUSES)}
+CANCELLED = STATUS_CODES[AppointmentStatus.CANCELLED.value]
+COMPLETED = STATUS_CODES[AppointmentStatus.COMPLETED.value]
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Lead-time histogram bucket edges in days; each bucket is [edge, next edge)
+LEAD_TIME_BINS = [0, 1, 2, 4, 8, 15, 31, 61, 91, np.inf]
+LEAD_TIME_PERCENTILES = [50, 75, 90, 95]
+
+CHUNK_SIZE = 100000
+
+# doctor: index into doctor_ids; status: index into STATUSES; start/created:
+# epoch seconds; duration: slot length in minutes
+AppointmentColumns = namedtuple('AppointmentColumns', [
+    'doctor_ids', 'doctor', 'status', 'start', 'created', 'duration', 'window_start', 'window_end',
+])
+
+
+class Epoch(Func):
+    """Seconds since 1970-01-01 UTC of a datetime column, as an integer"""
+    output_field = BigIntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='EXTRACT(EPOCH FROM %(expressions)s)',
+                              **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection,
+                              template='CAST(EXTRACT(EPOCH FROM %(expressions)s) AS bigint)', **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection,
+                              template="CAST(strftime('%%%%s', %(expressions)s) AS integer)", **extra_context)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='UNIX_TIMESTAMP(%(expressions)s)', **extra_context)
+
+
+def _utc_offset():
+    """Offset of the current time zone in seconds, used to bucket epochs by local day/hour"""
+    offset = timezone.localtime().utcoffset()
+    return int(offset.total_seconds()) if offset else 0
+
+
+def load_appointment_columns(start=None, end=None, doctor_ids=None, specialty=None):
+    """
+    Load appointments in [start, end) as NumPy columns with one query, streamed
+    in chunks so memory stays at the size of the arrays. Appointments of doctors
+    without a Doctor row (or outside doctor_ids) are left out.
+    """
+    appointments = Appointment.objects.all()
+    if start:
+        appointments = appointments.filter(appointment_date__gte=start)
+    if end:
+        appointments = appointments.filter(appointment_date__lt=end)
+    if doctor_ids:
+        appointments = appointments.filter(doctor_id__in=doctor_ids)
+    if specialty:
+        appointments = appointments.filter(specialty=specialty)
+
+    status_code = Case(*[When(status=value, then=Value(code)) for value, code in STATUS_CODES.items()],
+                       default=Value(-1), output_field=IntegerField())
+    rows = appointments.annotate(
+        status_code=status_code,
+        start_epoch=Epoch('appointment_date'),
+        created_epoch=Epoch('created_at'),
+        duration_seconds=Epoch('time_slot__end_time') - Epoch('time_slot__start_time'),
+    ).order_by().values_list('doctor_id', 'status_code', 'start_epoch', 'created_epoch', 'duration_seconds')
+
+    doctor_ids = list(doctor_ids or Doctor.objects.order_by('doctor_id').values_list('doctor_id', flat=True))
+    if connections[rows.db].vendor == 'postgresql':
+        doctor, status, starts, created, duration = _copy_columns(rows, doctor_ids)
+    else:
+        doctor, status, starts, created, duration = _fetch_columns(rows, doctor_ids)
+
+    columns = AppointmentColumns(
+        doctor_ids=doctor_ids,
+        doctor=doctor.astype(np.int32),
+        status=status.astype(np.int8),
+        start=starts.astype(np.int64),
+        created=created.astype(np.int64),
+        duration=duration.astype(np.float32) / 60,
+        window_start=None,
+        window_end=None,
+    )
+    window_start, window_end = _window_days(columns, start, end)
+    return columns._replace(window_start=window_start, window_end=window_end)
+
+
+class _BinaryCopySink:
+    """
+    File-like target for COPY ... TO STDOUT (FORMAT binary) whose columns are all
+    fixed-width and NOT NULL: every tuple then has the same layout, so complete
+    tuples are decoded with np.frombuffer as the data streams in.
+    """
+    HEADER_SIZE = 19  # signature (11), flags (4), header extension length (4)
+    DRAIN_BYTES = 1 << 22
+
+    def __init__(self, fields):
+        layout = [('field_count', '>i2')]
+        for name, dtype in fields:
+            layout += [(f'{name}_length', '>i4'), (name, dtype)]
+        self.dtype = np.dtype(layout)
+        self.buffer = bytearray()
+        self.header_read = False
+        self.parts = []
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.DRAIN_BYTES:
+            self.drain()
+
+    def drain(self):
+        offset = 0
+        if not self.header_read:
+            if len(self.buffer) < self.HEADER_SIZE:
+                return
+            offset = self.HEADER_SIZE + int.from_bytes(self.buffer[15:19], 'big')
+            self.header_read = True
+        # Whatever is left over is a partial tuple, or the 2-byte trailer at the end
+        usable = (len(self.buffer) - offset) // self.dtype.itemsize * self.dtype.itemsize
+        if usable:
+            self.parts.append(np.frombuffer(bytes(self.buffer[offset:offset + usable]), dtype=self.dtype))
+        del self.buffer[:offset + usable]
+
+    def column(self, name):
+        self.drain()
+        if not self.parts:
+            return np.empty(0, dtype=self.dtype[name].newbyteorder('='))
+        return np.concatenate([part[name] for part in self.parts]).astype(self.dtype[name].newbyteorder('='))
+
+
+def _copy_columns(rows, doctor_ids):
+    """PostgreSQL: stream the query through binary COPY, mapping doctor ids to indexes in SQL"""
+    connection = connections[rows.db]
+    sql, params = rows.query.get_compiler(rows.db).as_sql()
+    sink = _BinaryCopySink([('doctor', '>i4'), ('status', '>i4'), ('start', '>i8'),
+                            ('created', '>i8'), ('duration', '>i8')])
+    with connection.cursor() as cursor:
+        query = cursor.mogrify(
+            f"SELECT CAST(d.idx - 1 AS integer), q.status_code, q.start_epoch, q.created_epoch, q.duration_seconds "
+            f"FROM ({sql}) q JOIN unnest(%s::varchar[]) WITH ORDINALITY AS d(doctor_id, idx) "
+            f"ON d.doctor_id = q.doctor_id",
+            list(params) + [doctor_ids],
+        )
+        if isinstance(query, bytes):
+            query = query.decode()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", sink)
+    return [sink.column(name) for name in ('doctor', 'status', 'start', 'created', 'duration')]
+
+
+def _fetch_columns(rows, doctor_ids):
+    """Other databases: read the query in chunks through a raw cursor, skipping per-row ORM converters"""
+    index = {doctor_id: i for i, doctor_id in enumerate(doctor_ids)}
+    parts = [[] for _ in range(5)]
+    sql, params = rows.query.get_compiler(rows.db).as_sql()
+    with connections[rows.db].chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            chunk = cursor.fetchmany(CHUNK_SIZE)
+            if not chunk:
+                break
+            doctor_values, *values = zip(*chunk)
+            doctor = np.fromiter((index.get(doctor_id, -1) for doctor_id in doctor_values),
+                                 dtype=np.int32, count=len(chunk))
+            known = doctor >= 0
+            parts[0].append(doctor[known])
+            for part, column in zip(parts[1:], values):
+                part.append(np.array(column, dtype=np.int64)[known])
+    return [np.concatenate(part) if part else np.empty(0, dtype=np.int64) for part in parts]
+
+
+def _window_days(columns, start, end):
+    """Local [first, last) day numbers (days since epoch) covered by the analysis"""
+    offset = _utc_offset()
+    if start:
+        first = timezone.localdate(start).toordinal() - EPOCH_ORDINAL
+    elif columns.start.size:
+        first = int((columns.start.min() + offset) // 86400)
+    else:
+        first = timezone.localdate().toordinal() - EPOCH_ORDINAL
+    if end:
+        last = timezone.localdate(end - timedelta(microseconds=1)).toordinal() - EPOCH_ORDINAL + 1
+    elif columns.start.size:
+        last = int((columns.start.max() + offset) // 86400) + 1
+    else:
+        last = first + 1
+    return first, max(last, first + 1)
+
+
+def _day_label(day_number):
+    return date.fromordinal(day_number + EPOCH_ORDINAL)
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.maximum(denominator, 1), 0.0)
+
+
+def utilization(columns):
+    """Booked minutes (non-cancelled) over scheduled capacity, per doctor"""
+    n = len(columns.doctor_ids)
+    booked = np.bincount(columns.doctor, weights=np.where(columns.status != CANCELLED, columns.duration, 0),
+                         minlength=n)
+    weekly = np.zeros((n, 7))
+    position = {doctor_id: i for i, doctor_id in enumerate(columns.doctor_ids)}
+    for doctor_id, minutes in weekly_capacity_minutes().items():
+        if doctor_id in position:
+            weekly[position[doctor_id]] = minutes
+    # 1970-01-01 was a Thursday (weekday 3)
+    weekdays = (np.arange(columns.window_start, columns.window_end) + 3) % 7
+    capacity = weekly @ np.bincount(weekdays, minlength=7)
+    rates = _ratio(booked, capacity)
+    return {
+        'overall': float(_ratio(booked.sum(), capacity.sum())),
+        'doctors': [
+            {'doctor_id': doctor_id, 'booked_minutes': float(booked[i]),
+             'capacity_minutes': float(capacity[i]), 'utilization': float(rates[i])}
+            for i, doctor_id in enumerate(columns.doctor_ids)
+        ],
+    }
+
+
+def cancellation_rate(columns):
+    """Cancelled share of appointments, per doctor"""
+    n = len(columns.doctor_ids)
+    total = np.bincount(columns.doctor, minlength=n)
+    cancelled = np.bincount(columns.doctor[columns.status == CANCELLED], minlength=n)
+    rates = _ratio(cancelled, total)
+    return {
+        'overall': float(_ratio(cancelled.sum(), total.sum())),
+        'doctors': [
+            {'doctor_id': doctor_id, 'appointments': int(total[i]), 'cancelled': int(cancelled[i]),
+             'cancellation_rate': float(rates[i])}
+            for i, doctor_id in enumerate(columns.doctor_ids)
+        ],
+    }
+
+
+def lead_time(columns):
+    """Distribution of days between booking and appointment, with per-doctor medians"""
+    valid = (columns.created >= 0) & (columns.start >= columns.created)
+    days = (columns.start[valid] - columns.created[valid]) / 86400.0
+    doctors = columns.doctor[valid]
+    counts, _ = np.histogram(days, bins=LEAD_TIME_BINS)
+
+    n = len(columns.doctor_ids)
+    per_doctor = np.bincount(doctors, minlength=n)
+    order = np.lexsort((days, doctors))
+    offsets = np.concatenate(([0], np.cumsum(per_doctor)[:-1]))
+    has_rows = per_doctor > 0
+    medians = np.zeros(n)
+    if days.size:
+        lower = days[order][offsets[has_rows] + (per_doctor[has_rows] - 1) // 2]
+        upper = days[order][offsets[has_rows] + per_doctor[has_rows] // 2]
+        medians[has_rows] = (lower + upper) / 2
+
+    buckets = [
+        {'from_days': LEAD_TIME_BINS[i], 'to_days': None if np.isinf(LEAD_TIME_BINS[i + 1]) else LEAD_TIME_BINS[i + 1],
+         'count': int(counts[i])}
+        for i in range(len(counts))
+    ]
+    percentiles = np.percentile(days, LEAD_TIME_PERCENTILES) if days.size else np.zeros(len(LEAD_TIME_PERCENTILES))
+    return {
+        'histogram': buckets,
+        'percentiles': {f'p{pct}': float(value) for pct, value in zip(LEAD_TIME_PERCENTILES, percentiles)},
+        'mean_days': float(days.mean()) if days.size else 0.0,
+        'doctors': [
+            {'doctor_id': doctor_id, 'appointments': int(per_doctor[i]), 'median_days': float(medians[i])}
+            for i, doctor_id in enumerate(columns.doctor_ids) if per_doctor[i]
+        ],
+    }
+
+
+def hour_of_week(columns):
+    """7 x 24 matrix of non-cancelled appointments by local weekday and hour"""
+    hours = (columns.start[columns.status != CANCELLED] + _utc_offset()) // 3600
+    # Hour 0 of the epoch is Thursday 00:00, i.e. hour 72 of a Monday-based week
+    matrix = np.bincount((hours + 72) % 168, minlength=168).reshape(7, 24)
+    return {'days': DAY_NAMES, 'hours': list(range(24)), 'matrix': matrix.tolist()}
+
+
+def moving_average(values, window):
+    """Trailing moving average; the first window-1 points average what is available"""
+    values = np.asarray(values, dtype=float)
+    if window <= 1 or not values.size:
+        return values
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    counts = np.minimum(np.arange(1, values.size + 1), window)
+    return (sums[1:] - sums[np.arange(1, values.size + 1) - counts]) / counts
+
+
+def daily_trend(columns, window=7):
+    """Daily bookings, cancellations and completions with moving averages"""
+    first, last = columns.window_start, columns.window_end
+    days = (columns.start + _utc_offset()) // 86400 - first
+    inside = (days >= 0) & (days < last - first)
+    days, status = days[inside], columns.status[inside]
+    size = last - first
+    bookings = np.bincount(days, minlength=size)
+    cancellations = np.bincount(days[status == CANCELLED], minlength=size)
+    completions = np.bincount(days[status == COMPLETED], minlength=size)
+    return {
+        'window': window,
+        'days': [_day_label(day) for day in range(first, last)],
+        'bookings': bookings.tolist(),
+        'cancellations': cancellations.tolist(),
+        'completions': completions.tolist(),
+        'bookings_moving_average': moving_average(bookings, window).tolist(),
+        'cancellation_rate_moving_average': _ratio(
+            moving_average(cancellations, window), moving_average(bookings, window)).tolist(),
+    }
+
+
+METRICS = {
+    AnalyticsMetric.UTILIZATION: utilization,
+    AnalyticsMetric.CANCELLATION_RATE: cancellation_rate,
+    AnalyticsMetric.LEAD_TIME: lead_time,
+    AnalyticsMetric.HOUR_OF_WEEK: hour_of_week,
+    AnalyticsMetric.DAILY_TREND: daily_trend,
+}
+
+
+def compute_analytics(metrics=None, start=None, end=None, doctor_ids=None, specialty=None, window=7):
+    """
+    Compute the requested metrics (all when None) over one load of the
+    appointment columns. Returns {metric value: result}.
+    """
+    metrics = metrics or list(METRICS)
+    columns = load_appointment_columns(start, end, doctor_ids, specialty)
+    results = {}
+    for metric in metrics:
+        if metric == AnalyticsMetric.DAILY_TREND:
+            results[metric.value] = daily_trend(columns, window)
+        else:
+            results[metric.value] = METRICS[metric](columns)
+    return results
+
+
+def period_bounds(period):
+    """Turn an Analytics.period ({'start': 'YYYY-MM-DD', 'end': 'YYYY-MM-DD'}) into a [start, end) window"""
+    period = period or {}
+    start = period.get('start')
+    end = period.get('end')
+    start = timezone.make_aware(datetime.combine(date.fromisoformat(start), time.min)) if start else None
+    end = timezone.make_aware(datetime.combine(date.fromisoformat(end) + timedelta(days=1), time.min)) if end else None
+    return start, end
+
+
+def chart(metric, result):
+    """Chart-ready description (type, labels, series) of a metric result"""
+    if metric == AnalyticsMetric.DAILY_TREND:
+        return {
+            'type': 'line',
+            'labels': [day.isoformat() for day in result['days']],
+            'series': [
+                {'name': 'bookings', 'data': result['bookings']},
+                {'name': f"bookings ({result['window']}-day average)", 'data': result['bookings_moving_average']},
+                {'name': 'cancellations', 'data': result['cancellations']},
+            ],
+        }
+    if metric == AnalyticsMetric.HOUR_OF_WEEK:
+        return {'type': 'heatmap', 'x': result['hours'], 'y': result['days'], 'data': result['matrix']}
+    if metric == AnalyticsMetric.LEAD_TIME:
+        return {
+            'type': 'bar',
+            'labels': [f"{bucket['from_days']}+" if bucket['to_days'] is None
+                       else f"{bucket['from_days']}-{bucket['to_days']}" for bucket in result['histogram']],
+            'series': [{'name': 'appointments', 'data': [bucket['count'] for bucket in result['histogram']]}],
+        }
+    key = 'utilization' if metric == AnalyticsMetric.UTILIZATION else 'cancellation_rate'
+    return {
+        'type': 'bar',
+        'labels': [row['doctor_id'] for row in result['doctors']],
+        'series': [{'name': key, 'data': [row[key] for row in result['doctors']]}],
+    }
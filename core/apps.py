@@ -4,4 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
-    verbose_name = 'HARMS Core'
\ No newline at end of file
+    verbose_name = 'HARMS Core'
+
+    def ready(self):
+        from . import metrics  # noqa: F401  (connects Celery task signals)
+        from . import signals  # noqa: F401  (connects model signals)
+        from . import filters  # noqa: F401  (registers the filter index check)
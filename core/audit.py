@@ -0,0 +1,265 @@
+"""
+Write-behind audit trail of medical record reads.
+
+Views call record_reads() with the records they are about to return. Events
+are queued in-process and a background thread writes them to
+record_access_log with one bulk insert per batch (COPY on PostgreSQL), every
+HARMS_AUDIT_FLUSH_SECONDS or as soon as HARMS_AUDIT_BATCH_SIZE events are
+waiting, so a read never waits on an audit insert.
+
+If a batch cannot be written it is spooled to HARMS_AUDIT_SPOOL_DIR and
+replayed by whichever process next writes successfully. The queue is flushed
+at interpreter exit and from gunicorn's worker_exit hook, so a graceful
+shutdown loses nothing. HARMS_AUDIT_WRITE_MODE = 'sync' writes each request's
+events immediately instead (tests, shells).
+"""
+import atexit
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.permissions import BasePermission
+
+from .bulk import bulk_insert
+from .enums import UserType
+from .metrics import AUDIT_EVENTS
+from .models import RecordAccess
+
+logger = logging.getLogger('core.audit')
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+FIELDS = ['record_id', 'patient_id', 'accessed_by', 'access_type', 'client_ip', 'accessed_at']
+
+
+def write_events(events):
+    """Insert (FIELDS...) tuples in one statement, stamping written_at"""
+    now = timezone.now()
+    # One transaction per batch: it is written or spooled whole
+    with transaction.atomic():
+        return bulk_insert(RecordAccess, FIELDS + ['written_at'], (event + (now,) for event in events))
+
+
+class AuditWriter:
+    """In-process event queue drained by a daemon thread"""
+
+    def __init__(self, batch_size, flush_seconds, spool_dir):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.spool_dir = spool_dir
+        self.queue = deque()
+        self.wake = threading.Event()
+        self.flush_lock = threading.Lock()
+        self.thread = None
+        self.thread_lock = threading.Lock()
+        self.pid = None
+        self.stopping = False
+
+    def add(self, events):
+        self._ensure_thread()
+        # deque.extend/popleft are thread-safe; no lock on the request path
+        self.queue.extend(events)
+        if len(self.queue) >= self.batch_size:
+            self.wake.set()
+
+    def _ensure_thread(self):
+        # Threads do not survive fork: a preforked worker starts its own (and
+        # drops events copied from the parent, which the parent writes itself)
+        if self.pid == os.getpid() and self.thread.is_alive():
+            return
+        with self.thread_lock:
+            if self.pid != os.getpid():
+                self.queue.clear()
+            elif self.thread.is_alive():
+                return
+            else:
+                logger.error('Audit writer thread died; restarting it')
+            self.thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self.thread.start()
+            self.pid = os.getpid()
+
+    def _run(self):
+        while not self.stopping:
+            self.wake.wait(self.flush_seconds)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # e.g. an unwritable spool dir; the events stay queued for the next pass
+                logger.exception('Audit flush failed')
+
+    def flush(self):
+        """Write everything queued so far; returns the number of events written"""
+        written = 0
+        with self.flush_lock:
+            try:
+                while self.queue:
+                    batch = []
+                    while self.queue and len(batch) < self.batch_size:
+                        batch.append(self.queue.popleft())
+                    try:
+                        written += write_events(batch)
+                        AUDIT_EVENTS.labels(outcome='written').inc(len(batch))
+                    except DatabaseError:
+                        logger.exception('Audit write failed; spooling %s events', len(batch))
+                        # Drop the broken connection; the next flush reconnects
+                        connection.close()
+                        try:
+                            self._spool(batch)
+                        except OSError:
+                            # Nowhere to put them either: keep them queued for the next flush
+                            self.queue.extendleft(reversed(batch))
+                            raise
+                        return written
+                if written:
+                    self.replay_spool()
+            except DatabaseError:
+                logger.exception('Replaying the audit spool failed')
+                connection.close()
+            finally:
+                if threading.current_thread() is self.thread:
+                    connection.close_if_unusable_or_obsolete()
+        return written
+
+    def _spool(self, batch):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f'audit-{os.getpid()}-{time.time_ns()}.ndjson')
+        with open(f'{path}.tmp', 'w') as handle:
+            for event in batch:
+                handle.write(json.dumps([*event[:-1], event[-1].isoformat()]) + '\n')
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(f'{path}.tmp', path)
+        AUDIT_EVENTS.labels(outcome='spooled').inc(len(batch))
+
+    def replay_spool(self):
+        """Write spooled batches left by any process; returns the number of events written"""
+        if not os.path.isdir(self.spool_dir):
+            return 0
+        written = 0
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.endswith('.ndjson'):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            claimed = f'{path}.{os.getpid()}.replaying'
+            try:
+                # Renaming claims the file; another process that got there first wins
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            with open(claimed) as handle:
+                events = [(*row[:-1], parse_datetime(row[-1])) for row in map(json.loads, handle)]
+            try:
+                written += write_events(events)
+            except DatabaseError:
+                os.rename(claimed, path)
+                raise
+            os.remove(claimed)
+            AUDIT_EVENTS.labels(outcome='written').inc(len(events))
+        return written
+
+    def close(self):
+        self.stopping = True
+        self.wake.set()
+        self.flush()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = AuditWriter(settings.HARMS_AUDIT_BATCH_SIZE, settings.HARMS_AUDIT_FLUSH_SECONDS,
+                                      settings.HARMS_AUDIT_SPOOL_DIR)
+                atexit.register(_writer.close)
+    return _writer
+
+
+def flush_audit_log():
+    """Write out this process's queued events (called on worker shutdown)"""
+    if _writer is not None:
+        _writer.close()
+
+
+def record_reads(request, records, access_type):
+    """
+    Audit the records a response is about to return. records are serialized
+    records (dicts with record_id and patient_id), or a paginated
+    {'results': [...]} payload.
+    """
+    if isinstance(records, dict):
+        records = records.get('results', [])
+    user = getattr(request, 'user', None)
+    accessed_by = getattr(user, 'user_id', None) if user is not None and user.is_authenticated else None
+    client_ip = request.META.get('REMOTE_ADDR') or None
+    now = timezone.now()
+    events = [(record['record_id'], record['patient_id'], accessed_by, access_type.value, client_ip, now)
+              for record in records]
+    if not events:
+        return
+    if settings.HARMS_AUDIT_WRITE_MODE == 'sync':
+        write_events(events)
+        AUDIT_EVENTS.labels(outcome='written').inc(len(events))
+    else:
+        get_writer().add(events)
+
+
+def encode_cursor(entry):
+    raw = json.dumps([entry.accessed_at.isoformat(), entry.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token):
+    """(accessed_at, id) from encode_cursor; ValueError if the token is malformed"""
+    try:
+        at, entry_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return datetime.fromisoformat(at), int(entry_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+
+def access_page(patient_id=None, user_id=None, since=None, until=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Newest-first page of audit entries for a patient and/or user within
+    [since, until); returns (entries, next_cursor or None). Each filter
+    combination is a range scan on one of the record_access_log indexes.
+    """
+    entries = RecordAccess.objects.all()
+    if patient_id:
+        entries = entries.filter(patient_id=patient_id)
+    if user_id:
+        entries = entries.filter(accessed_by=user_id)
+    if since:
+        entries = entries.filter(accessed_at__gte=since)
+    if until:
+        entries = entries.filter(accessed_at__lt=until)
+    if cursor:
+        at, entry_id = cursor
+        entries = entries.filter(Q(accessed_at__lt=at) | Q(accessed_at=at, id__lt=entry_id))
+    page = list(entries.order_by('-accessed_at', '-id')[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+class CanReadAccessLog(BasePermission):
+    """The access log shows who read which patient's records; only system admins may list it"""
+
+    def has_permission(self, request, view):
+        user = getattr(request, 'user', None)
+        return bool(user and user.is_authenticated and
+                    getattr(user, 'user_type', None) == UserType.SYSTEM_ADMIN.value)
@@ -0,0 +1,217 @@
+"""
+Per-doctor, per-day availability bitsets.
+
+Each DayAvailability row holds three SLOTS_PER_DAY-bit masks over the local
+day, one bit per SLOT_MINUTES: open (covered by one of the doctor's
+TimeSlots), booked (covered by a reserved TimeSlot) and blocked. A moment is
+free when its bit is open and neither booked nor blocked, so checking
+availability reads one row and enumerating free time walks one day's bits.
+
+open/booked are derived from TimeSlot and rebuilt for a day whenever one of
+its slots changes (see core/signals.py). blocked is owned by the bitmap:
+range blocks from Schedule.block_time_slot are written straight into it, and
+slots in Schedule.blocked_slots are OR-ed in on rebuild. The next-available
+lists (core/next_available.py) treat slots under blocked bits as taken.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .bulk import bulk_insert
+from .models import DayAvailability, Schedule, TimeSlot
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+BITMAP_BYTES = SLOTS_PER_DAY // 8
+
+
+def to_int(value):
+    return int.from_bytes(bytes(value or b''), 'big')
+
+
+def to_bytes(bits):
+    return bits.to_bytes(BITMAP_BYTES, 'big')
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def mask(first, last):
+    """Bits [first, last) set"""
+    return ((1 << max(last - first, 0)) - 1) << first
+
+
+def day_masks(start, end):
+    """Split [start, end) into (local day, mask) pairs covering every slot it touches"""
+    start, end = (timezone.localtime(value) if timezone.is_aware(value) else timezone.make_aware(value)
+                  for value in (start, end))
+    while start < end:
+        midnight = day_start(start.date())
+        next_midnight = day_start(start.date() + timedelta(days=1))
+        chunk_end = min(end, next_midnight)
+        first = int((start - midnight).total_seconds() // 60) // SLOT_MINUTES
+        last = -(-int((chunk_end - midnight).total_seconds() // 60) // SLOT_MINUTES)
+        yield start.date(), mask(first, min(last, SLOTS_PER_DAY))
+        start = next_midnight
+
+
+def free_bits(row):
+    return to_int(row.open_bits) & ~to_int(row.booked_bits) & ~to_int(row.blocked_bits)
+
+
+def is_free(doctor_id, start, end=None):
+    """Whether the doctor is free for all of [start, end) (one slot when end is omitted)"""
+    end = end or start + timedelta(minutes=SLOT_MINUTES)
+    masks = list(day_masks(start, end))
+    rows = {row.day: row for row in DayAvailability.objects.filter(
+        doctor_id=doctor_id, day__in=[day for day, _ in masks])}
+    return all(day in rows and free_bits(rows[day]) & bits == bits for day, bits in masks)
+
+
+def free_ranges(doctor_id, day):
+    """Free [start, end) runs of the doctor's day, merged across adjacent slots"""
+    row = DayAvailability.objects.filter(doctor_id=doctor_id, day=day).first()
+    if row is None:
+        return []
+    bits = free_bits(row)
+    midnight = day_start(day)
+    ranges = []
+    run_start = None
+    for index in range(SLOTS_PER_DAY + 1):
+        free = index < SLOTS_PER_DAY and bits >> index & 1
+        if free and run_start is None:
+            run_start = index
+        elif not free and run_start is not None:
+            ranges.append((midnight + timedelta(minutes=run_start * SLOT_MINUTES),
+                           midnight + timedelta(minutes=index * SLOT_MINUTES)))
+            run_start = None
+    return ranges
+
+
+def _locked_row(doctor_id, day):
+    row, _ = DayAvailability.objects.select_for_update().get_or_create(doctor_id=doctor_id, day=day)
+    return row
+
+
+def _set_blocked(doctor_id, start, end, blocked):
+    from .next_available import refresh_for_slots
+
+    with transaction.atomic():
+        for day, bits in day_masks(start, end):
+            row = _locked_row(doctor_id, day)
+            current = to_int(row.blocked_bits)
+            row.blocked_bits = to_bytes(current | bits if blocked else current & ~bits)
+            row.save(update_fields=['blocked_bits'])
+    # The doctor's slots in the range enter or leave the next-available lists
+    refresh_for_slots(TimeSlot.objects.filter(doctor_id=doctor_id, start_time__lt=end, end_time__gt=start))
+    return True
+
+
+def block_range(doctor_id, start, end):
+    """Block [start, end) for the doctor: one row write per day touched, plus a next-available refresh"""
+    return _set_blocked(doctor_id, start, end, True)
+
+
+def unblock_range(doctor_id, start, end):
+    """Clear blocks in [start, end); slots still in Schedule.blocked_slots come back on the next rebuild"""
+    return _set_blocked(doctor_id, start, end, False)
+
+
+def _blocked_slot():
+    return Exists(Schedule.blocked_slots.through.objects.filter(timeslot_id=OuterRef('pk')))
+
+
+def _slot_masks(slots):
+    """Accumulate {(doctor_id, day): [open, booked, blocked]} from (doctor, start, end, available, blocked) rows"""
+    masks = {}
+    for doctor_id, start, end, is_available, blocked in slots:
+        for day, bits in day_masks(start, end):
+            entry = masks.setdefault((doctor_id, day), [0, 0, 0])
+            entry[0] |= bits
+            if not is_available:
+                entry[1] |= bits
+            if blocked:
+                entry[2] |= bits
+    return masks
+
+
+def rebuild_days(doctor_id, days):
+    """Recompute open/booked bits of the given days from the doctor's TimeSlots"""
+    days = sorted(set(days))
+    if not doctor_id or not days:
+        return
+    with transaction.atomic():
+        # Lock the rows first so concurrent rebuilds of a day serialize and each
+        # one reads the slots the previous one committed
+        rows = {day: _locked_row(doctor_id, day) for day in days}
+        slots = (TimeSlot.objects
+                 .filter(doctor_id=doctor_id,
+                         start_time__gte=day_start(days[0]) - timedelta(days=1),
+                         start_time__lt=day_start(days[-1] + timedelta(days=1)),
+                         end_time__gt=day_start(days[0]))
+                 .annotate(blocked=_blocked_slot())
+                 .values_list('doctor_id', 'start_time', 'end_time', 'is_available', 'blocked'))
+        masks = _slot_masks(slots)
+        for day, row in rows.items():
+            open_bits, booked_bits, blocked_bits = masks.get((doctor_id, day), (0, 0, 0))
+            row.open_bits = to_bytes(open_bits)
+            row.booked_bits = to_bytes(booked_bits)
+            row.blocked_bits = to_bytes(to_int(row.blocked_bits) | blocked_bits)
+            row.save(update_fields=['open_bits', 'booked_bits', 'blocked_bits'])
+
+
+def rebuild_slot_days(slots):
+    """Rebuild the bitmaps of every doctor-day the given slots touch"""
+    days = {}
+    for slot in slots:
+        if slot.doctor_id:
+            days.setdefault(slot.doctor_id, set()).update(
+                day for day, _ in day_masks(slot.start_time, slot.end_time))
+    for doctor_id, doctor_days in days.items():
+        rebuild_days(doctor_id, doctor_days)
+
+
+def unblock_slots(slots):
+    """Clear the blocked bits of slots taken out of Schedule.blocked_slots"""
+    for slot in slots:
+        if slot.doctor_id:
+            unblock_range(slot.doctor_id, slot.start_time, slot.end_time)
+    rebuild_slot_days(slots)
+
+
+def rebuild_availability(start_day=None, end_day=None, doctor_ids=None, batch_size=5000):
+    """
+    Rebuild every bitmap in [start_day, end_day) from TimeSlot in one streaming
+    pass, keeping existing blocks. Used after bulk loads that bypass signals.
+    Returns the number of day rows written.
+    """
+    slots = TimeSlot.objects.filter(doctor_id__isnull=False)
+    existing = DayAvailability.objects.all()
+    if start_day:
+        slots = slots.filter(start_time__gte=day_start(start_day))
+        existing = existing.filter(day__gte=start_day)
+    if end_day:
+        slots = slots.filter(start_time__lt=day_start(end_day))
+        existing = existing.filter(day__lt=end_day)
+    if doctor_ids:
+        slots = slots.filter(doctor_id__in=doctor_ids)
+        existing = existing.filter(doctor_id__in=doctor_ids)
+
+    masks = _slot_masks(slots.annotate(blocked=_blocked_slot()).values_list(
+        'doctor_id', 'start_time', 'end_time', 'is_available', 'blocked').iterator(chunk_size=batch_size))
+    # Slots running past midnight can spill into days outside the window
+    masks = {key: value for key, value in masks.items()
+             if (not start_day or key[1] >= start_day) and (not end_day or key[1] < end_day)}
+    with transaction.atomic():
+        for doctor_id, day, blocked in existing.values_list('doctor_id', 'day', 'blocked_bits'):
+            masks.setdefault((doctor_id, day), [0, 0, 0])[2] |= to_int(blocked)
+        existing.delete()
+        rows = [(doctor_id, day, to_bytes(open_bits), to_bytes(booked_bits), to_bytes(blocked_bits))
+                for (doctor_id, day), (open_bits, booked_bits, blocked_bits) in masks.items()]
+        for start in range(0, len(rows), batch_size):
+            bulk_insert(DayAvailability, ['doctor_id', 'day', 'open_bits', 'booked_bits', 'blocked_bits'],
+                        rows[start:start + batch_size])
+    return len(rows)
@@ -0,0 +1,308 @@
+"""
+Streaming, incremental, compressed backups of the core tables.
+
+A backup is a directory under HARMS_BACKUP_DIR holding one gzipped NDJSON
+file per table (a header line with the column names, then one JSON array per
+row) and a manifest.json with row counts and SHA-256 checksums. Tables are
+read in primary-key order, chunk_size rows per query, and written as they
+are read, so memory does not grow with the table. All tables are read in one
+transaction (REPEATABLE READ on PostgreSQL) so the backup is a consistent
+snapshot.
+
+An incremental backup holds only the rows changed since the previous backup
+in the same root:
+  * appointments, medical records and notifications: rows with change_log
+    entries since then, plus their change_log deletions;
+  * tables with an updated_at (users and their patient/doctor/admin rows)
+    or an append-only timestamp (change_log, notifications_archive,
+    record_access_log): rows stamped since then;
+  * every other table is copied whole.
+Deletions from tables without a change log are only picked up by the next
+full backup.
+
+Restore follows an incremental backup back to its full base, verifies every
+checksum, then replays the chain in one transaction with bulk inserts (COPY
+on PostgreSQL).
+"""
+import base64
+import gzip
+import json
+import os
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+from .bulk import bulk_insert
+from .enums import ChangeEntity, ChangeOperation
+from .exports import _write_json, file_sha256
+from .models import Appointment, ChangeLogEntry, MedicalRecord, Notification
+
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+DEFAULT_CHUNK_SIZE = 5000
+
+# Rows committed shortly after the previous backup's snapshot may carry an
+# earlier timestamp; re-copying a few minutes of changes is harmless (restore upserts)
+INCREMENTAL_OVERLAP = timedelta(minutes=5)
+
+CHANGE_LOGGED = {
+    Appointment: ChangeEntity.APPOINTMENT,
+    MedicalRecord: ChangeEntity.MEDICAL_RECORD,
+    Notification: ChangeEntity.NOTIFICATION,
+}
+TIMESTAMP_FIELDS = ['updated_at', 'changed_at', 'archived_at', 'written_at']
+
+
+class BackupJSONEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder cuts datetimes to milliseconds; a backup keeps them exact"""
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def backup_models():
+    """Concrete core models, including the auto-created M2M tables"""
+    return [model for model in apps.get_app_config('core').get_models(include_auto_created=True)
+            if model._meta.managed and not model._meta.proxy]
+
+
+def _fields(model):
+    return model._meta.local_concrete_fields
+
+
+def _incremental_filter(model, since):
+    """Queryset of rows changed since `since`, or None if the table has no change marker"""
+    if model in CHANGE_LOGGED:
+        changed = (ChangeLogEntry.objects
+                   .filter(entity=CHANGE_LOGGED[model].value, changed_at__gt=since)
+                   .exclude(operation=ChangeOperation.DELETED.value)
+                   .values('object_id'))
+        return model._base_manager.filter(pk__in=changed)
+    for name in TIMESTAMP_FIELDS:
+        try:
+            model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        return model._base_manager.filter(**{f'{name}__gt': since})
+    return None
+
+
+def _encode(fields, row):
+    return [base64.b64encode(bytes(value)).decode() if value is not None and isinstance(field, models.BinaryField)
+            else value for field, value in zip(fields, row)]
+
+
+def _stream_rows(queryset, fields, chunk_size):
+    """Rows of a queryset in primary-key order, one keyset query per chunk"""
+    attnames = [field.attname for field in fields]
+    pk_index = attnames.index(queryset.model._meta.pk.attname)
+    last = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last is not None:
+            chunk = chunk.filter(pk__gt=last)
+        rows = list(chunk.values_list(*attnames)[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1][pk_index]
+
+
+def _write_table(path, model, fields, rows):
+    count = 0
+    with open(path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as stream:
+            header = {'table': model._meta.db_table, 'columns': [field.attname for field in fields]}
+            stream.write(json.dumps(header).encode() + b'\n')
+            for row in rows:
+                stream.write(json.dumps(_encode(fields, row), cls=BackupJSONEncoder,
+                                        separators=(',', ':')).encode() + b'\n')
+                count += 1
+        raw.flush()
+        os.fsync(raw.fileno())
+    return count
+
+
+def read_manifest(path):
+    with open(os.path.join(path, MANIFEST)) as handle:
+        return json.load(handle)
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def latest_backup(root):
+    """Name of the newest completed backup under root, or None"""
+    if not os.path.isdir(root):
+        return None
+    for name in sorted(os.listdir(root), reverse=True):
+        path = os.path.join(root, name)
+        if os.path.exists(os.path.join(path, MANIFEST)) and read_manifest(path).get('completed_at'):
+            return name
+    return None
+
+
+def create_backup(root=None, incremental=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Write a backup under root (HARMS_BACKUP_DIR by default). An incremental
+    backup builds on the newest completed one there, and is a full backup if
+    there is none. Returns the new backup's directory.
+    """
+    root = root or settings.HARMS_BACKUP_DIR
+    base = latest_backup(root) if incremental else None
+    since = None
+    if base:
+        since = _parse_time(read_manifest(os.path.join(root, base))['started_at']) - INCREMENTAL_OVERLAP
+
+    started = timezone.now()
+    kind = 'incremental' if base else 'full'
+    name = f"{started:%Y%m%dT%H%M%S%fZ}-{kind}"
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'kind': kind,
+        'base': base,
+        'since': since,
+        'started_at': started,
+        'vendor': connection.vendor,
+        'tables': {},
+        'completed_at': None,
+    }
+
+    # Inside a caller's transaction the snapshot is that transaction's
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if connection.vendor == 'postgresql' and outermost:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        for model in backup_models():
+            fields = _fields(model)
+            table = model._meta.db_table
+            queryset = _incremental_filter(model, since) if since else None
+            mode = 'changed' if queryset is not None else 'full'
+            if queryset is None:
+                queryset = model._base_manager.all()
+            entry = {'file': f'{table}.ndjson.gz', 'mode': mode}
+            entry['rows'] = _write_table(os.path.join(path, entry['file']), model, fields,
+                                         _stream_rows(queryset, fields, chunk_size))
+            entry['sha256'] = file_sha256(os.path.join(path, entry['file']))
+            if mode == 'changed' and model in CHANGE_LOGGED:
+                deleted = (ChangeLogEntry.objects
+                           .filter(entity=CHANGE_LOGGED[model].value, changed_at__gt=since,
+                                   operation=ChangeOperation.DELETED.value)
+                           .order_by('seq').values_list('object_id').iterator(chunk_size=chunk_size))
+                entry['deleted_file'] = f'{table}.deleted.ndjson.gz'
+                entry['deleted'] = _write_table(os.path.join(path, entry['deleted_file']), model,
+                                                [model._meta.pk], deleted)
+                entry['deleted_sha256'] = file_sha256(os.path.join(path, entry['deleted_file']))
+            manifest['tables'][table] = entry
+
+    manifest['completed_at'] = timezone.now()
+    _write_json(os.path.join(path, MANIFEST), manifest)
+    return path
+
+
+def backup_chain(path):
+    """[(path, manifest)] from the full backup up to the given one"""
+    chain = []
+    while path:
+        manifest = read_manifest(path)
+        if manifest.get('version') != MANIFEST_VERSION or not manifest.get('completed_at'):
+            raise ValueError(f'{path} is not a completed backup')
+        chain.append((path, manifest))
+        path = os.path.join(os.path.dirname(path.rstrip(os.sep)), manifest['base']) if manifest['base'] else None
+    return chain[::-1]
+
+
+def verify_backup(path):
+    """Check every file of the chain against its manifest checksum; raises ValueError on a mismatch"""
+    for directory, manifest in backup_chain(path):
+        for entry in manifest['tables'].values():
+            for file_key, sum_key in (('file', 'sha256'), ('deleted_file', 'deleted_sha256')):
+                if file_key in entry and file_sha256(os.path.join(directory, entry[file_key])) != entry[sum_key]:
+                    raise ValueError(f'Checksum mismatch for {os.path.join(directory, entry[file_key])}')
+
+
+def _read_table(path, model):
+    """(fields, row iterator) for a table file written by _write_table"""
+    stream = gzip.open(path, 'rb')
+    header = json.loads(stream.readline())
+    fields = [model._meta.get_field(name) for name in header['columns']]
+
+    def rows():
+        with stream:
+            for line in stream:
+                yield [field.to_python(value) if value is not None else None
+                       for field, value in zip(fields, json.loads(line))]
+    return fields, rows()
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def _delete_pks(model, pks):
+    model._base_manager.filter(pk__in=pks)._raw_delete(connection.alias)
+
+
+def restore_backup(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Replace the core tables with the contents of a backup (and the backups it
+    builds on). Signals are not sent. Returns {table: rows restored}.
+    """
+    verify_backup(path)
+    chain = backup_chain(path)
+    by_table = {model._meta.db_table: model for model in backup_models()}
+    counts = {}
+    with transaction.atomic():
+        with connection.constraint_checks_disabled():
+            for directory, manifest in chain:
+                tables = manifest['tables']
+                replaced = [table for table, entry in tables.items()
+                            if table in by_table and (manifest['kind'] == 'full' or entry['mode'] == 'full')]
+                if manifest['kind'] == 'full':
+                    # TRUNCATE on PostgreSQL; cascades to non-core tables that reference users
+                    connection.ops.execute_sql_flush(
+                        connection.ops.sql_flush(no_style(), replaced, allow_cascade=True))
+                else:
+                    # Rows in other tables still point at these (appointments at
+                    # time slots), so empty them without cascading
+                    for table in replaced:
+                        by_table[table]._base_manager.all()._raw_delete(connection.alias)
+                for table, entry in tables.items():
+                    model = by_table.get(table)
+                    if model is None:
+                        continue
+                    if 'deleted_file' in entry:
+                        _, pks = _read_table(os.path.join(directory, entry['deleted_file']), model)
+                        for chunk in _chunks(pks, chunk_size):
+                            _delete_pks(model, [row[0] for row in chunk])
+                    fields, rows = _read_table(os.path.join(directory, entry['file']), model)
+                    pk_index = fields.index(model._meta.pk)
+                    for chunk in _chunks(rows, chunk_size):
+                        if table not in replaced:
+                            # Changed rows replace their older copies
+                            _delete_pks(model, [row[pk_index] for row in chunk])
+                        counts[table] = counts.get(table, 0) + bulk_insert(
+                            model, [field.attname for field in fields], chunk)
+        connection.check_constraints(table_names=list(counts))
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), list(by_table.values())):
+                cursor.execute(sql)
+    # Cached summaries and idempotent replays describe the pre-restore data
+    cache.clear()
+    return counts
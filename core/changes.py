@@ -0,0 +1,138 @@
+"""
+Per-entity change feeds: "everything changed since cursor X".
+
+Every create, update and delete of an appointment, medical record or
+notification appends a ChangeLogEntry (core/signals.py for ORM saves; bulk
+paths such as reminders and retention call record_changes). A client keeps
+the last seq it has seen and asks for the entries after it, so a sync reads
+one index range of change_log plus the changed rows, however large the
+tables are.
+
+seq is allocated when a row is written, not when its transaction commits, so
+a slow transaction can commit a lower seq after a higher one is visible.
+Entries younger than HARMS_CHANGE_FEED_SETTLE_SECONDS are held back until
+such stragglers have landed; writes to these tables must commit within that
+window (all paths in this codebase are short transactions).
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from .bulk import bulk_insert
+from .enums import ChangeOperation
+from .models import ChangeLogEntry
+
+DEFAULT_FEED_LIMIT = 500
+MAX_FEED_LIMIT = 5000
+
+
+def record_change(entity, object_id, operation):
+    ChangeLogEntry.objects.create(entity=entity.value, object_id=object_id, operation=operation.value)
+
+
+def record_changes(entity, object_ids, operation, now=None):
+    """Bulk version of record_change for paths that bypass model signals"""
+    now = now or timezone.now()
+    return bulk_insert(ChangeLogEntry, ['entity', 'object_id', 'operation', 'changed_at'],
+                       ((entity.value, object_id, operation.value, now) for object_id in object_ids))
+
+
+def changes_after(entity, cursor, limit=DEFAULT_FEED_LIMIT, now=None):
+    """Settled entries of one entity with seq > cursor, oldest first"""
+    now = now or timezone.now()
+    settled = now - timedelta(seconds=settings.HARMS_CHANGE_FEED_SETTLE_SECONDS)
+    return list(ChangeLogEntry.objects
+                .filter(entity=entity.value, seq__gt=cursor, changed_at__lte=settled)
+                .order_by('seq')[:limit])
+
+
+def cursor_expired(cursor):
+    """True if entries after cursor may already have been pruned (cursor 0 means the start of the log)"""
+    if not cursor:
+        return False
+    oldest = ChangeLogEntry.objects.order_by('seq').values_list('seq', flat=True).first()
+    return oldest is not None and cursor < oldest - 1
+
+
+def prune_change_log(now=None, batch_size=5000):
+    """Delete entries older than HARMS_CHANGE_LOG_RETENTION_DAYS in seq batches. Returns the count"""
+    now = now or timezone.now()
+    expired = (ChangeLogEntry.objects
+               .filter(changed_at__lt=now - timedelta(days=settings.HARMS_CHANGE_LOG_RETENTION_DAYS))
+               .order_by('seq').values_list('seq', flat=True))
+    deleted = 0
+    while True:
+        seqs = list(expired[:batch_size])
+        if not seqs:
+            return deleted
+        deleted += ChangeLogEntry.objects.filter(seq__in=seqs).delete()[0]
+
+
+class ChangeFeedMixin:
+    """
+    Adds GET <list>/changes/?cursor=&limit= to a ViewSet. Set change_entity and,
+    to avoid per-row queries when serializing, change_feed_queryset.
+    """
+    change_entity = None
+    change_feed_queryset = None
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Created, updated and deleted rows after ?cursor= (0 for the start of the log)"""
+        try:
+            cursor = int(request.query_params.get('cursor', 0))
+            limit = min(int(request.query_params.get('limit', DEFAULT_FEED_LIMIT)), MAX_FEED_LIMIT)
+        except ValueError:
+            raise ValidationError({'cursor': 'cursor and limit must be integers'})
+        if cursor < 0 or limit < 1:
+            raise ValidationError({'cursor': 'cursor must be >= 0 and limit >= 1'})
+
+        if cursor_expired(cursor):
+            return Response({'error': 'Cursor is older than the retained change log; resync from the list endpoint'},
+                            status=status.HTTP_410_GONE)
+        entries = changes_after(self.change_entity, cursor, limit)
+
+        # Several entries for one row in a page collapse into its latest state,
+        # still reported as created if the page saw the row appear
+        latest = {}
+        created = set()
+        for entry in entries:
+            latest.pop(entry.object_id, None)
+            latest[entry.object_id] = entry
+            if entry.operation == ChangeOperation.CREATED.value:
+                created.add(entry.object_id)
+        queryset = self.change_feed_queryset if self.change_feed_queryset is not None else self.get_queryset()
+        rows = {row.pk: row for row in queryset.filter(pk__in=[
+            object_id for object_id, entry in latest.items()
+            if entry.operation != ChangeOperation.DELETED.value
+        ])}
+
+        changes = []
+        for object_id, entry in latest.items():
+            row = rows.get(object_id)
+            if row is None:
+                # Also covers rows deleted after this entry was written
+                operation = ChangeOperation.DELETED.value
+            elif object_id in created:
+                operation = ChangeOperation.CREATED.value
+            else:
+                operation = entry.operation
+            changes.append({
+                'seq': entry.seq,
+                'object_id': object_id,
+                'operation': operation,
+                'changed_at': entry.changed_at,
+                'data': self.get_serializer(row).data if row is not None else None,
+            })
+        return Response({
+            'entity': self.change_entity.value,
+            'cursor': cursor,
+            'next_cursor': entries[-1].seq if entries else cursor,
+            'has_more': len(entries) == limit,
+            'changes': changes,
+        })
@@ -35,4 +35,68 @@ class ReportType(Enum):
     PATIENT_DEMOGRAPHICS = "PATIENT_DEMOGRAPHICS"
     DOCTOR_UTILIZATION = "DOCTOR_UTILIZATION"
     APPOINTMENT_STATISTICS = "APPOINTMENT_STATISTICS"
-    REVENUE_ANALYSIS = "REVENUE_ANALYSIS"
\ No newline at end of file
+    REVENUE_ANALYSIS = "REVENUE_ANALYSIS"
+
+
+class RollupGranularity(Enum):
+    DAY = "DAY"
+    WEEK = "WEEK"
+    MONTH = "MONTH"
+
+
+class RollupDimension(Enum):
+    ALL = "ALL"
+    DOCTOR = "DOCTOR"
+    SPECIALTY = "SPECIALTY"
+    STATUS = "STATUS"
+
+
+class RollupMetric(Enum):
+    BOOKINGS = "BOOKINGS"
+    CANCELLATIONS = "CANCELLATIONS"
+    COMPLETIONS = "COMPLETIONS"
+    NO_SHOWS = "NO_SHOWS"
+    BOOKED_MINUTES = "BOOKED_MINUTES"
+    CAPACITY_MINUTES = "CAPACITY_MINUTES"
+    UTILIZATION = "UTILIZATION"
+    MEDICAL_RECORDS = "MEDICAL_RECORDS"
+
+
+class AnalyticsMetric(Enum):
+    UTILIZATION = "UTILIZATION"
+    CANCELLATION_RATE = "CANCELLATION_RATE"
+    LEAD_TIME = "LEAD_TIME"
+    HOUR_OF_WEEK = "HOUR_OF_WEEK"
+    DAILY_TREND = "DAILY_TREND"
+
+
+class ChangeEntity(Enum):
+    APPOINTMENT = "APPOINTMENT"
+    MEDICAL_RECORD = "MEDICAL_RECORD"
+    NOTIFICATION = "NOTIFICATION"
+
+
+class ChangeOperation(Enum):
+    CREATED = "CREATED"
+    UPDATED = "UPDATED"
+    DELETED = "DELETED"
+
+
+class TimelineItemType(Enum):
+    APPOINTMENT = "APPOINTMENT"
+    MEDICAL_RECORD = "MEDICAL_RECORD"
+    TEST_RESULT = "TEST_RESULT"
+    NOTIFICATION = "NOTIFICATION"
+
+
+class RecordAccessType(Enum):
+    LIST = "LIST"
+    RETRIEVE = "RETRIEVE"
+    PATIENT_RECORDS = "PATIENT_RECORDS"
+    CHANGE_FEED = "CHANGE_FEED"
+    TIMELINE = "TIMELINE"
+
+
+class AvailabilityScope(Enum):
+    DOCTOR = "DOCTOR"
+    SPECIALTY = "SPECIALTY"
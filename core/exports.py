@@ -0,0 +1,238 @@
+"""
+Bulk export of patient bundles: profile, appointments and medical records
+with their medications and test results, one JSON object per patient.
+
+Patients are split into shards by patient_id range. Shards are exported by
+a process pool, each worker with its own database connection, streaming its
+patients through a server-side cursor and loading the related rows for a
+batch of patients at a time (a few queries per batch, not per patient).
+Each shard is written to shard-NNNN.ndjson.gz and recorded in manifest.json
+with its SHA-256 and row counts once the file is complete. A rerun into the
+same directory reuses the manifest's shard bounds and snapshot time and only
+exports the shards that are missing or fail their checksum.
+"""
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import django
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils import timezone
+
+from .models import Appointment, MedicalRecord, Patient
+
+MANIFEST = 'manifest.json'
+MANIFEST_VERSION = 1
+HASH_CHUNK = 1 << 20
+
+PATIENT_FIELDS = ['patient_id', 'user_id', 'full_name', 'email', 'phone_number', 'date_of_birth',
+                  'address', 'insurance_info', 'emergency_contact', 'is_active', 'created_at']
+APPOINTMENT_FIELDS = ['appointment_id', 'doctor_id', 'appointment_date', 'time_slot_id', 'specialty',
+                      'reason_for_visit', 'status', 'notes', 'created_at', 'updated_at']
+RECORD_FIELDS = ['record_id', 'patient_id', 'doctor_id', 'visit_date', 'diagnosis', 'treatment_plan',
+                 'visit_type', 'updated_at']
+MEDICATION_FIELDS = ['medication_id', 'name', 'dosage', 'frequency', 'duration', 'prescribed_date']
+TEST_RESULT_FIELDS = ['test_id', 'test_name', 'test_date', 'results', 'status', 'normal_ranges']
+
+
+def shard_file(shard):
+    return f'shard-{shard:04d}.ndjson.gz'
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_json(path, data):
+    """Replace path atomically, so a crash never leaves a half-written manifest"""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as handle:
+        json.dump(data, handle, indent=2, cls=DjangoJSONEncoder)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp, path)
+
+
+def _patients(snapshot):
+    # Patients registered after the export started are left out, so a resumed
+    # export describes the same population as the shards already written
+    return Patient.objects.filter(created_at__lte=snapshot)
+
+
+def shard_bounds(snapshot, shards):
+    """
+    Lower patient_id bound of each shard (the first is None), splitting the
+    patients into ranges of about equal size
+    """
+    patients = _patients(snapshot).order_by('patient_id').values_list('patient_id', flat=True)
+    total = patients.count()
+    shards = max(1, min(shards, total))
+    bounds = [None]
+    for shard in range(1, shards):
+        bounds.append(patients[shard * total // shards])
+    return bounds
+
+
+def _group(rows, key):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row.pop(key), []).append(row)
+    return grouped
+
+
+def _bundles(patients):
+    """Bundles for a batch of patient rows, with one query per related table"""
+    patient_ids = [patient['patient_id'] for patient in patients]
+    appointments = _group(Appointment.objects.filter(patient_id__in=patient_ids)
+                          .order_by('patient_id', 'appointment_date', 'appointment_id')
+                          .values('patient_id', *APPOINTMENT_FIELDS), 'patient_id')
+    records = list(MedicalRecord.objects.filter(patient_id__in=patient_ids)
+                   .order_by('patient_id', 'visit_date', 'record_id').values(*RECORD_FIELDS))
+    record_ids = [record['record_id'] for record in records]
+    medications = _group(MedicalRecord.medications.through.objects
+                         .filter(medicalrecord_id__in=record_ids).order_by('medication_id')
+                         .values('medicalrecord_id', *[f'medication__{field}' for field in MEDICATION_FIELDS]),
+                         'medicalrecord_id')
+    test_results = _group(MedicalRecord.test_results.through.objects
+                          .filter(medicalrecord_id__in=record_ids).order_by('testresult_id')
+                          .values('medicalrecord_id', *[f'testresult__{field}' for field in TEST_RESULT_FIELDS]),
+                          'medicalrecord_id')
+    for record in records:
+        record['medications'] = [{field.split('__', 1)[1]: value for field, value in row.items()}
+                                 for row in medications.get(record['record_id'], [])]
+        record['test_results'] = [{field.split('__', 1)[1]: value for field, value in row.items()}
+                                  for row in test_results.get(record['record_id'], [])]
+    records = _group(records, 'patient_id')
+    for patient in patients:
+        yield {
+            'patient': patient,
+            'appointments': appointments.get(patient['patient_id'], []),
+            'medical_records': records.get(patient['patient_id'], []),
+        }
+
+
+def export_shard(out_dir, shard, lower, upper, snapshot, batch_size=500):
+    """
+    Write one shard file (runs in a worker process). The file is built under a
+    temporary name and renamed when complete. Returns its manifest entry.
+    """
+    patients = _patients(snapshot)
+    if lower is not None:
+        patients = patients.filter(patient_id__gte=lower)
+    if upper is not None:
+        patients = patients.filter(patient_id__lt=upper)
+    patients = patients.order_by('patient_id').values(*PATIENT_FIELDS)
+
+    counts = {'patients': 0, 'appointments': 0, 'medical_records': 0}
+    path = os.path.join(out_dir, shard_file(shard))
+    tmp = f'{path}.part'
+
+    def flush(batch):
+        for bundle in _bundles(batch):
+            stream.write(json.dumps(bundle, cls=DjangoJSONEncoder, separators=(',', ':')).encode())
+            stream.write(b'\n')
+            counts['patients'] += 1
+            counts['appointments'] += len(bundle['appointments'])
+            counts['medical_records'] += len(bundle['medical_records'])
+
+    with open(tmp, 'wb') as raw:
+        # mtime=0 keeps the bytes (and checksum) identical across reruns over the same data
+        with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as stream:
+            batch = []
+            # iterator() reads through a server-side cursor on PostgreSQL
+            for patient in patients.iterator(chunk_size=batch_size):
+                batch.append(patient)
+                if len(batch) == batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+    return {
+        'shard': shard,
+        'file': shard_file(shard),
+        'lower': lower,
+        'upper': upper,
+        'sha256': file_sha256(path),
+        'bytes': os.path.getsize(path),
+        **counts,
+        'completed_at': timezone.now(),
+    }
+
+
+def _shard_done(out_dir, entry):
+    if not entry:
+        return False
+    path = os.path.join(out_dir, entry['file'])
+    return os.path.exists(path) and file_sha256(path) == entry['sha256']
+
+
+def _init_worker():
+    # Workers must not share the parent's sockets; each opens its own connection
+    django.setup()
+    connections.close_all()
+
+
+def export_patients(out_dir, shards=None, workers=None, batch_size=500, restart=False, progress=None):
+    """
+    Export every patient bundle into out_dir, resuming a previous run there
+    unless restart is set. progress(entry) is called as each shard finishes.
+    Returns the manifest.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    manifest = None
+    if not restart and os.path.exists(manifest_path):
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+        if manifest.get('version') != MANIFEST_VERSION:
+            manifest = None
+    if manifest is None:
+        snapshot = timezone.now()
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'snapshot': snapshot,
+            'bounds': shard_bounds(snapshot, shards or workers * 4),
+            'shards': {},
+            'completed_at': None,
+        }
+        _write_json(manifest_path, manifest)
+    snapshot = manifest['snapshot']
+    if isinstance(snapshot, str):
+        snapshot = datetime.fromisoformat(snapshot.replace('Z', '+00:00'))
+
+    bounds = manifest['bounds']
+    uppers = bounds[1:] + [None]
+    pending = [shard for shard in range(len(bounds))
+               if not _shard_done(out_dir, manifest['shards'].get(str(shard)))]
+
+    # Forked workers would inherit (and corrupt) the parent's open connection
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=min(workers, len(pending)) or 1, initializer=_init_worker) as pool:
+        futures = [pool.submit(export_shard, out_dir, shard, bounds[shard], uppers[shard], snapshot, batch_size)
+                   for shard in pending]
+        for future in as_completed(futures):
+            entry = future.result()
+            manifest['shards'][str(entry['shard'])] = entry
+            _write_json(manifest_path, manifest)
+            if progress:
+                progress(entry)
+
+    manifest['completed_at'] = timezone.now()
+    manifest['totals'] = {
+        key: sum(entry[key] for entry in manifest['shards'].values())
+        for key in ('patients', 'appointments', 'medical_records', 'bytes')
+    }
+    _write_json(manifest_path, manifest)
+    return manifest
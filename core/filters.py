@@ -0,0 +1,188 @@
+"""
+Query-parameter filters and orderings for the list endpoints.
+
+Each FilterSet below is paired with an ordering whitelist on its ViewSet
+(IndexedListMixin). Only columns that lead an index may be filtered or
+sorted on, so every combination a client can ask for is an index scan; the
+system check at the bottom (manage.py check, runserver, migrate) fails if a
+filter or ordering is added without one. Lists are returned in keyset pages
+(ListCursorPagination), so a page reads one index range however many rows
+match.
+"""
+from datetime import datetime, time, timedelta
+from urllib.parse import parse_qs, urlparse
+
+from django.core import checks
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django_filters import rest_framework as filters
+from django_filters.fields import IsoDateTimeField
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from .enums import AppointmentStatus, NotificationType, Priority
+from .models import Appointment, Doctor, MedicalRecord, Notification, TimeSlot
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class WindowEndField(IsoDateTimeField):
+    """ISO date or datetime; a plain date means the end of that day"""
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            try:
+                day = parse_date(value.strip())
+            except ValueError:
+                day = None
+            if day is not None:
+                return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+        return super().to_python(value)
+
+
+class WindowEndFilter(filters.IsoDateTimeFilter):
+    field_class = WindowEndField
+
+
+def _choices(enum):
+    return [(tag.value, tag.name) for tag in enum]
+
+
+class AppointmentFilter(filters.FilterSet):
+    """?status=&doctor_id=&patient_id=&specialty=&start=&end= (appointment_date in [start, end))"""
+    status = filters.MultipleChoiceFilter(choices=_choices(AppointmentStatus))
+    start = filters.IsoDateTimeFilter(field_name='appointment_date', lookup_expr='gte')
+    end = WindowEndFilter(field_name='appointment_date', lookup_expr='lt')
+
+    class Meta:
+        model = Appointment
+        fields = ['status', 'doctor_id', 'patient_id', 'specialty', 'start', 'end']
+
+
+class DoctorFilter(filters.FilterSet):
+    """?specialty=&department="""
+
+    class Meta:
+        model = Doctor
+        fields = ['specialty', 'department']
+
+
+class TimeSlotFilter(filters.FilterSet):
+    """?is_available=&doctor_id=&start=&end= (start_time in [start, end))"""
+    start = filters.IsoDateTimeFilter(field_name='start_time', lookup_expr='gte')
+    end = WindowEndFilter(field_name='start_time', lookup_expr='lt')
+
+    class Meta:
+        model = TimeSlot
+        fields = ['is_available', 'doctor_id', 'start', 'end']
+
+
+class MedicalRecordFilter(filters.FilterSet):
+    """?patient_id=&doctor_id=&visit_type=&visit_date_from=&visit_date_to= (inclusive dates)"""
+    visit_date_from = filters.DateFilter(field_name='visit_date', lookup_expr='gte')
+    visit_date_to = filters.DateFilter(field_name='visit_date', lookup_expr='lte')
+
+    class Meta:
+        model = MedicalRecord
+        fields = ['patient_id', 'doctor_id', 'visit_type', 'visit_date_from', 'visit_date_to']
+
+
+class NotificationFilter(filters.FilterSet):
+    """?user_id=&is_read=&type=&priority=&start=&end= (sent_date in [start, end))"""
+    type = filters.MultipleChoiceFilter(choices=_choices(NotificationType))
+    priority = filters.MultipleChoiceFilter(choices=_choices(Priority))
+    start = filters.IsoDateTimeFilter(field_name='sent_date', lookup_expr='gte')
+    end = WindowEndFilter(field_name='sent_date', lookup_expr='lt')
+
+    class Meta:
+        model = Notification
+        fields = ['user_id', 'is_read', 'type', 'priority', 'start', 'end']
+
+
+class TiebreakOrderingFilter(OrderingFilter):
+    """OrderingFilter that ends every ordering with the primary key, so rows tied on the sort column keep one order"""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or [])
+        if ordering and ordering[-1].lstrip('-') != 'pk':
+            ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+        return ordering
+
+
+class ListCursorPagination(CursorPagination):
+    """
+    Keyset pages of ?limit= rows (no COUNT query), in the list's ?ordering=.
+    The response is {'results': [...], 'next_cursor': token or None}, like
+    the other cursor-paginated endpoints; pass the token back as ?cursor=.
+    """
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+    def decode_cursor(self, request):
+        try:
+            return super().decode_cursor(request)
+        except NotFound:
+            raise ValidationError({'cursor': 'Invalid cursor'})
+
+    def get_paginated_response(self, data):
+        link = self.get_next_link()
+        next_cursor = parse_qs(urlparse(link).query)[self.cursor_query_param][0] if link else None
+        return Response({'results': data, 'next_cursor': next_cursor})
+
+
+class IndexedListMixin:
+    """
+    Filtering (filterset_class) and ?ordering= restricted to ordering_fields
+    for a ViewSet's list action, paginated by ListCursorPagination. Unknown
+    ordering fields are ignored; without ?ordering= the list follows ordering,
+    which must be one of ordering_fields.
+    """
+    filter_backends = [filters.DjangoFilterBackend, TiebreakOrderingFilter]
+    pagination_class = ListCursorPagination
+    filterset_class = None
+    ordering_fields = []
+    ordering = None
+
+
+def _indexed_columns(model):
+    """Columns that lead an index on model (primary key, unique and db_index columns included)"""
+    opts = model._meta
+    columns = {field.attname for field in opts.concrete_fields
+               if field.primary_key or field.unique or field.db_index}
+    for index in opts.indexes:
+        # A partial index only serves queries that repeat its condition
+        if index.condition is None:
+            columns.add(opts.get_field(index.fields[0].lstrip('-')).attname)
+    for constraint in opts.constraints:
+        if getattr(constraint, 'fields', None):
+            columns.add(opts.get_field(constraint.fields[0]).attname)
+    return columns
+
+
+@checks.register(checks.Tags.models)
+def check_filter_indexes(app_configs, **kwargs):
+    """core.E001: a filter or ordering on a column that no index leads with"""
+    from . import views  # noqa: F401  (defines the ViewSets)
+
+    errors = []
+    for viewset in IndexedListMixin.__subclasses__():
+        filterset = viewset.filterset_class
+        model = filterset._meta.model
+        indexed = _indexed_columns(model)
+        names = [f.field_name for f in filterset.base_filters.values()] + list(viewset.ordering_fields)
+        if (viewset.ordering or '').lstrip('-') not in viewset.ordering_fields:
+            errors.append(checks.Error(
+                f'{viewset.__name__}.ordering must be one of its ordering_fields',
+                hint='Set ordering to the default sort of the paginated list',
+                obj=viewset, id='core.E002'))
+        for name in names:
+            if model._meta.get_field(name).attname not in indexed:
+                errors.append(checks.Error(
+                    f'{viewset.__name__} filters or orders by {model.__name__}.{name}, which no index leads with',
+                    hint='Add an index starting with that column, or drop the filter',
+                    obj=viewset, id='core.E001'))
+    return errors
@@ -0,0 +1,91 @@
+"""
+Idempotency-Key support for retried POSTs.
+
+The first request with a given key runs the view and its response is stored
+in the cache (Redis in deployment) for HARMS_IDEMPOTENCY_TTL_SECONDS; repeats
+get the stored response back without touching the database. While the first
+request is still running the key holds an in-flight marker, claimed with an
+atomic cache.add(), so a concurrent duplicate gets 409 instead of doing the
+work twice. Server errors are not stored, so the client can retry them.
+"""
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+IN_FLIGHT = 'in-flight'
+
+
+def _fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder, default=str)
+    return hashlib.sha256(f'{request.method} {request.path} {body}'.encode()).hexdigest()
+
+
+def _cache_key(request, key):
+    user = request.user.pk if request.user and request.user.is_authenticated else 'anonymous'
+    digest = hashlib.sha256(f'{user}:{request.path}:{key}'.encode()).hexdigest()
+    return f'idempotency:{digest}'
+
+
+def _replay(entry):
+    response = Response(entry['data'], status=entry['status'])
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _conflict(entry, fingerprint):
+    """Response for a key that is already taken, or None if it can be replayed"""
+    if entry == IN_FLIGHT:
+        response = Response({'error': 'A request with this Idempotency-Key is still being processed'},
+                            status=status.HTTP_409_CONFLICT)
+        response['Retry-After'] = '1'
+        return response
+    if entry['fingerprint'] != fingerprint:
+        return Response({'error': 'Idempotency-Key was already used with a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return None
+
+
+def idempotent(view):
+    """Make a ViewSet POST handler honour the Idempotency-Key header"""
+
+    @functools.wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = _cache_key(request, key)
+        fingerprint = _fingerprint(request)
+        if not cache.add(cache_key, IN_FLIGHT, settings.HARMS_IDEMPOTENCY_LOCK_SECONDS):
+            entry = cache.get(cache_key)
+            if entry is not None:
+                return _conflict(entry, fingerprint) or _replay(entry)
+            # Expired between add() and get(); take the key over
+            cache.set(cache_key, IN_FLIGHT, settings.HARMS_IDEMPOTENCY_LOCK_SECONDS)
+
+        try:
+            response = view(self, request, *args, **kwargs)
+        except Exception:
+            cache.delete(cache_key)
+            raise
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            cache.set(cache_key, {'status': response.status_code, 'data': response.data,
+                                  'fingerprint': fingerprint},
+                      settings.HARMS_IDEMPOTENCY_TTL_SECONDS)
+        return response
+
+    return wrapper
@@ -0,0 +1,77 @@
+"""
+Time-ordered, prefixed entity IDs.
+
+new_id('APT') returns e.g. 'APT-01HB3K2QZ7XW5M9RT': the readable prefix, then
+9 Crockford base32 characters of milliseconds since ID_EPOCH and 8 of
+randomness (40 bits per millisecond). IDs sort by creation time, so primary
+key inserts land at the right edge of the B-tree instead of splitting random
+pages. Within a process IDs are strictly increasing: a second ID in the same
+millisecond increments the random part rather than drawing a new one.
+"""
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'  # Crockford base32, in ASCII order
+TIME_CHARS = 9
+RANDOM_CHARS = 8
+RANDOM_BITS = RANDOM_CHARS * 5
+ID_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+_EPOCH_MS = int(ID_EPOCH.timestamp() * 1000)
+
+
+def _encode(value, length):
+    chars = []
+    for _ in range(length):
+        value, index = divmod(value, 32)
+        chars.append(ALPHABET[index])
+    return ''.join(reversed(chars))
+
+
+class IdGenerator:
+    """Monotonic ID source; the module-level new_id/new_ids share one per process"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.last_ms = -1
+        self.last_random = 0
+
+    def _next(self):
+        now_ms = int(time.time() * 1000) - _EPOCH_MS
+        if now_ms > self.last_ms:
+            self.last_ms, self.last_random = now_ms, secrets.randbits(RANDOM_BITS)
+        else:
+            # Same millisecond (or the clock stepped back): stay ordered
+            self.last_random += 1
+            if self.last_random >> RANDOM_BITS:
+                self.last_ms, self.last_random = self.last_ms + 1, secrets.randbits(RANDOM_BITS - 1)
+        return _encode(self.last_ms, TIME_CHARS) + _encode(self.last_random, RANDOM_CHARS)
+
+    def new_ids(self, prefix, count):
+        with self.lock:
+            return [f"{prefix}-{self._next()}" for _ in range(count)]
+
+
+_generator = IdGenerator()
+
+
+def new_id(prefix):
+    """A fresh ID such as 'NOT-01HB3K2QZ7XW5M9RT'"""
+    return _generator.new_ids(prefix, 1)[0]
+
+
+def new_ids(prefix, count):
+    """count increasing IDs in one call, for bulk creates"""
+    return _generator.new_ids(prefix, count)
+
+
+def id_timestamp(value):
+    """Creation time encoded in an ID from new_id, or None for other formats"""
+    body = value.rpartition('-')[2]
+    if len(body) != TIME_CHARS + RANDOM_CHARS or any(char not in ALPHABET for char in body):
+        return None
+    ms = 0
+    for char in body[:TIME_CHARS]:
+        ms = ms * 32 + ALPHABET.index(char)
+    return ID_EPOCH + timedelta(milliseconds=ms)
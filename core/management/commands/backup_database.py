@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.backups import DEFAULT_CHUNK_SIZE, read_manifest, create_backup
+
+
+class Command(BaseCommand):
+    help = 'Stream the core tables into a compressed backup under HARMS_BACKUP_DIR (or --dir)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help='Backup root (default: HARMS_BACKUP_DIR)')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only rows changed since the newest backup in the root')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        path = create_backup(options['dir'], incremental=options['incremental'],
+                             chunk_size=options['chunk_size'])
+        manifest = read_manifest(path)
+        for table, entry in manifest['tables'].items():
+            deleted = f", {entry['deleted']} deleted" if 'deleted' in entry else ''
+            self.stdout.write(f"  {table}: {entry['rows']} rows ({entry['mode']}){deleted}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{manifest['kind'].capitalize()} backup written to {path} in {time.monotonic() - started:.1f}s"
+        ))
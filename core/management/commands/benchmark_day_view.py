@@ -0,0 +1,129 @@
+import json
+import statistics
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.models import Appointment, Doctor
+from core.partitions import is_partitioned
+
+BASELINE_TABLE = 'core_appointment_baseline'
+
+QUERIES = {
+    'doctor day view': (
+        "SELECT appointment_id, patient_id, appointment_date, status, time_slot_id FROM {table} "
+        "WHERE doctor_id = %s AND appointment_date >= %s AND appointment_date < %s "
+        "ORDER BY appointment_date"
+    ),
+    'clinic day view': (
+        "SELECT appointment_id, doctor_id, patient_id, appointment_date, status FROM {table} "
+        "WHERE appointment_date >= %s AND appointment_date < %s AND status = ANY(%s) "
+        "ORDER BY appointment_date"
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = ('Compare day-view query latency on the partitioned appointments table against an '
+            'unpartitioned copy of the same rows (PostgreSQL only)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--day', type=date.fromisoformat, default=None,
+                            help='Day to query (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--rebuild-baseline', action='store_true',
+                            help='Recreate the unpartitioned copy even if it exists')
+        parser.add_argument('--drop-baseline', action='store_true',
+                            help='Drop the unpartitioned copy when done')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('This benchmark needs PostgreSQL')
+        table = Appointment._meta.db_table
+        if not is_partitioned(table):
+            raise CommandError(f'{table} is not partitioned; run migrations first')
+
+        self.ensure_baseline(table, options['rebuild_baseline'])
+        day = options['day'] or date.today()
+        start = datetime.combine(day, datetime.min.time(), tzinfo=dt_timezone.utc)
+        end = start + timedelta(days=1)
+        doctor_ids = list(Doctor.objects.order_by('?').values_list('doctor_id', flat=True)[:options['iterations']])
+        if not doctor_ids:
+            raise CommandError('No doctors found; generate a dataset with generate_dataset first')
+        statuses = ['PENDING', 'CONFIRMED', 'SCHEDULED']
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            self.stdout.write(f"Rows: {cursor.fetchone()[0]}, day: {day}, iterations: {options['iterations']}")
+
+        for name, sql in QUERIES.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            for label, target in (('partitioned', table), ('unpartitioned', BASELINE_TABLE)):
+                query = sql.format(table=connection.ops.quote_name(target))
+                if name == 'doctor day view':
+                    params_list = [[doctor_id, start, end] for doctor_id in doctor_ids]
+                else:
+                    params_list = [[start, end, statuses]] * options['iterations']
+                timings = self.run(query, params_list)
+                plan = self.explain(query, params_list[0])
+                self.stdout.write(
+                    f"  {label:<14} median {statistics.median(timings):8.3f} ms   "
+                    f"p95 {self.percentile(timings, 95):8.3f} ms   "
+                    f"buffers {plan['buffers']:>7}   relations scanned {plan['relations']}"
+                )
+
+        if options['drop_baseline']:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {BASELINE_TABLE}")
+
+    def ensure_baseline(self, table, rebuild):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s)", [BASELINE_TABLE])
+            exists = cursor.fetchone()[0] is not None
+            if exists and not rebuild:
+                return
+            self.stdout.write(f"Building unpartitioned copy {BASELINE_TABLE} ...")
+            cursor.execute(f"DROP TABLE IF EXISTS {BASELINE_TABLE}")
+            cursor.execute(f"CREATE TABLE {BASELINE_TABLE} (LIKE {table} INCLUDING DEFAULTS)")
+            cursor.execute(f"INSERT INTO {BASELINE_TABLE} SELECT * FROM {table}")
+            cursor.execute(f"ALTER TABLE {BASELINE_TABLE} ADD PRIMARY KEY (appointment_id)")
+            cursor.execute(f"CREATE INDEX ON {BASELINE_TABLE} (doctor_id, appointment_date)")
+            cursor.execute(f"CREATE INDEX ON {BASELINE_TABLE} (appointment_date, status)")
+            cursor.execute(f"ANALYZE {BASELINE_TABLE}")
+            cursor.execute(f"ANALYZE {table}")
+
+    def run(self, query, params_list):
+        timings = []
+        with connection.cursor() as cursor:
+            for params in params_list:
+                started = time.perf_counter()
+                cursor.execute(query, params)
+                cursor.fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def explain(self, query, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        root = plan[0]['Plan']
+        relations = set()
+
+        def walk(node):
+            if 'Relation Name' in node:
+                relations.add(node['Relation Name'])
+            for child in node.get('Plans', []):
+                walk(child)
+
+        walk(root)
+        buffers = root.get('Shared Hit Blocks', 0) + root.get('Shared Read Blocks', 0)
+        return {'buffers': buffers, 'relations': len(relations)}
+
+    @staticmethod
+    def percentile(values, pct):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
@@ -0,0 +1,84 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.ids import new_ids
+
+TABLE_PREFIX = 'core_id_benchmark'
+
+
+def legacy_ids(prefix, count):
+    return [f"{prefix}-{uuid.uuid4().hex[:8].upper()}" for _ in range(count)]
+
+
+SCHEMES = {
+    'random': legacy_ids,
+    'time-ordered': new_ids,
+}
+
+
+class Command(BaseCommand):
+    help = ('Compare primary-key index size and insert throughput of the old random '
+            '8-hex IDs against time-ordered core.ids IDs (PostgreSQL only)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--batch', type=int, default=500,
+                            help='Rows per INSERT; IDs are generated per batch as live traffic would')
+        parser.add_argument('--prefix', default='APT')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark tables')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('This benchmark needs PostgreSQL')
+        stats = self.index_stats_available()
+        self.stdout.write(f"Rows: {options['rows']}, batch: {options['batch']}")
+        for label, generate in SCHEMES.items():
+            table = f"{TABLE_PREFIX}_{label.replace('-', '_')}"
+            elapsed, inserted, sample = self.load(table, generate, options)
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT pg_relation_size('{table}_pkey'), pg_relation_size('{table}')")
+                index_bytes, table_bytes = cursor.fetchone()
+                density = ''
+                if stats:
+                    cursor.execute(f"SELECT avg_leaf_density, leaf_fragmentation FROM pgstatindex('{table}_pkey')")
+                    leaf_density, fragmentation = cursor.fetchone()
+                    density = f"   leaf density {leaf_density:5.1f}%   fragmentation {fragmentation:5.1f}%"
+                if not options['keep']:
+                    cursor.execute(f"DROP TABLE {table}")
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{label}  (e.g. {sample})"))
+            self.stdout.write(
+                f"  {inserted / elapsed:10.0f} rows/s   pkey index {index_bytes / 2 ** 20:8.1f} MiB   "
+                f"table {table_bytes / 2 ** 20:8.1f} MiB   collisions {options['rows'] - inserted}{density}"
+            )
+
+    def load(self, table, generate, options):
+        batch = options['batch']
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"CREATE TABLE {table} (id varchar(100) PRIMARY KEY, "
+                           f"created_at timestamptz NOT NULL DEFAULT now())")
+            inserted = 0
+            elapsed = 0.0
+            sample = None
+            for start in range(0, options['rows'], batch):
+                ids = generate(options['prefix'], min(batch, options['rows'] - start))
+                sample = sample or ids[0]
+                sql = (f"INSERT INTO {table} (id) VALUES " + ', '.join(['(%s)'] * len(ids)) +
+                       " ON CONFLICT DO NOTHING")
+                started = time.perf_counter()
+                cursor.execute(sql, ids)
+                elapsed += time.perf_counter() - started
+                inserted += cursor.rowcount
+        return elapsed, inserted, sample
+
+    def index_stats_available(self):
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pgstattuple")
+                return True
+            except Exception:
+                self.stdout.write('pgstattuple is not available; leaf density is not reported')
+                return False
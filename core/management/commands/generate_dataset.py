@@ -0,0 +1,359 @@
+import random
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.availability import rebuild_availability
+from core.bulk import bulk_insert
+from core.next_available import rebuild_next_available
+from core.enums import AppointmentStatus, NotificationType, Priority, UserType
+from core.models import (
+    User, Patient, Doctor, Appointment, MedicalRecord, TimeSlot,
+    Schedule, Notification, Medication, TestResult, DayAvailability, NextAvailableSlots
+)
+
+SPECIALTIES = [
+    ('General Practice', 30), ('Pediatrics', 12), ('Cardiology', 8),
+    ('Dermatology', 7), ('Orthopedics', 7), ('Obstetrics & Gynecology', 7),
+    ('Psychiatry', 6), ('Neurology', 5), ('Ophthalmology', 5),
+    ('Endocrinology', 4), ('Gastroenterology', 4), ('Oncology', 3),
+    ('Pulmonology', 2),
+]
+WORKING_WEEKS = [
+    (['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday'], 70),
+    (['Monday', 'Tuesday', 'Wednesday', 'Thursday'], 15),
+    (['Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday'], 10),
+    (['Monday', 'Wednesday', 'Friday'], 5),
+]
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+               'David', 'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica',
+               'Thomas', 'Sarah', 'Carlos', 'Maria', 'Wei', 'Aisha', 'Raj', 'Yuki', 'Omar', 'Fatima']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Wilson', 'Anderson', 'Thomas',
+              'Taylor', 'Moore', 'Jackson', 'Lee', 'Patel', 'Nguyen', 'Kim', 'Chen', 'Khan']
+REASONS = ['Annual checkup', 'Follow-up visit', 'Persistent cough', 'Back pain', 'Headache',
+           'Skin rash', 'Chest pain', 'Medication review', 'Vaccination', 'Lab results review',
+           'Joint pain', 'Fatigue', 'Allergy symptoms', 'Blood pressure check']
+DIAGNOSES = ['Hypertension', 'Type 2 diabetes', 'Upper respiratory infection', 'Migraine',
+             'Lower back strain', 'Atopic dermatitis', 'Seasonal allergies', 'Anxiety disorder',
+             'Osteoarthritis', 'Hyperlipidemia', 'Healthy - no findings']
+MEDICATIONS = [('Lisinopril', '10mg'), ('Metformin', '500mg'), ('Atorvastatin', '20mg'),
+               ('Amoxicillin', '500mg'), ('Ibuprofen', '400mg'), ('Cetirizine', '10mg'),
+               ('Sertraline', '50mg'), ('Omeprazole', '20mg'), ('Levothyroxine', '50mcg')]
+FREQUENCIES = ['Once daily', 'Twice daily', 'Three times daily', 'As needed']
+TESTS = [('Complete Blood Count', 'WBC 4.5-11.0 x10^9/L'), ('Lipid Panel', 'LDL < 100 mg/dL'),
+         ('HbA1c', '4.0-5.6 %'), ('Thyroid Panel', 'TSH 0.4-4.0 mIU/L'),
+         ('Basic Metabolic Panel', 'Glucose 70-99 mg/dL'), ('Urinalysis', 'Negative')]
+VISIT_TYPES = [('Consultation', 50), ('Follow-up', 35), ('Emergency', 5), ('Procedure', 10)]
+
+PAST_STATUSES = [(AppointmentStatus.COMPLETED.value, 78), (AppointmentStatus.CANCELLED.value, 14),
+                 (AppointmentStatus.CONFIRMED.value, 8)]
+FUTURE_STATUSES = [(AppointmentStatus.SCHEDULED.value, 40), (AppointmentStatus.CONFIRMED.value, 35),
+                   (AppointmentStatus.PENDING.value, 15), (AppointmentStatus.CANCELLED.value, 10)]
+EXTRA_NOTIFICATIONS = [(NotificationType.TEST_RESULTS_AVAILABLE.value, 35),
+                       (NotificationType.PRESCRIPTION_RENEWAL.value, 25),
+                       (NotificationType.HEALTH_ALERT.value, 15),
+                       (NotificationType.SYSTEM_MAINTENANCE.value, 25)]
+PRIORITIES = [(Priority.LOW.value, 30), (Priority.MEDIUM.value, 45),
+              (Priority.HIGH.value, 20), (Priority.URGENT.value, 5)]
+
+SLOT_MINUTES = 30
+DAY_START_HOUR = 9
+SLOTS_PER_DAY = 16
+
+
+def _weighted(choices):
+    values = [value for value, _ in choices]
+    weights = [weight for _, weight in choices]
+    total = float(sum(weights))
+    cumulative, running = [], 0.0
+    for weight in weights:
+        running += weight / total
+        cumulative.append(running)
+    return values, cumulative
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible synthetic dataset (patients, doctors, schedules, slots, appointments, records, notifications)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=1000)
+        parser.add_argument('--doctors', type=int, default=50)
+        parser.add_argument('--appointments', type=int, default=10000)
+        parser.add_argument('--open-slots', type=int, default=40,
+                            help='Free future time slots per doctor')
+        parser.add_argument('--record-rate', type=float, default=0.7,
+                            help='Share of completed appointments that get a medical record')
+        parser.add_argument('--notifications', type=int, default=2,
+                            help='Additional notifications per patient')
+        parser.add_argument('--days-back', type=int, default=365)
+        parser.add_argument('--days-ahead', type=int, default=60)
+        parser.add_argument('--anchor-date', type=date.fromisoformat, default=None,
+                            help="Date treated as 'today' (YYYY-MM-DD); fix it for byte-identical reruns")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.tag = f"G{options['seed']}"
+        self.batch_size = options['batch_size']
+        self.anchor = options['anchor_date'] or date.today()
+        self.now = datetime.combine(self.anchor, datetime.min.time(), tzinfo=dt_timezone.utc)
+        self.first_day = self.anchor - timedelta(days=options['days_back'])
+        self.last_day = self.anchor + timedelta(days=options['days_ahead'])
+        self.buffers = {}
+        self.counts = {}
+        self.sequences = {}
+
+        if User.objects.filter(user_id__startswith=f"USR-{self.tag}-").exists():
+            raise CommandError(f"A dataset for seed {options['seed']} already exists; use another --seed")
+
+        started = time.monotonic()
+        password = make_password('defaultpass123')
+        patient_ids = self.create_patients(options['patients'], password)
+        doctors = self.create_doctors(options['doctors'], password)
+        self.create_schedules_and_appointments(doctors, patient_ids, options)
+        self.create_extra_notifications(patient_ids, options['notifications'])
+        self.flush()
+        # Bulk inserts bypass the signals that maintain the availability bitmaps
+        self.counts[DayAvailability] = rebuild_availability(
+            start_day=self.anchor, doctor_ids=[doctor_id for doctor_id, _ in doctors])
+        self.counts[NextAvailableSlots] = rebuild_next_available([doctor_id for doctor_id, _ in doctors])
+
+        elapsed = time.monotonic() - started
+        for model, count in self.counts.items():
+            self.stdout.write(f"{model._meta.db_table}: {count} rows")
+        self.stdout.write(self.style.SUCCESS(f"Dataset generated in {elapsed:.1f}s"))
+
+    # Helpers
+
+    def next_id(self, prefix):
+        value = self.sequences.get(prefix, 0) + 1
+        self.sequences[prefix] = value
+        return f"{prefix}-{self.tag}-{value:09d}"
+
+    def pick(self, table):
+        values, cumulative = table
+        r = self.rng.random()
+        for value, bound in zip(values, cumulative):
+            if r <= bound:
+                return value
+        return values[-1]
+
+    def add(self, model, fields, row):
+        buffer = self.buffers.setdefault(model, (fields, []))
+        buffer[1].append(row)
+        if len(buffer[1]) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        # Parents before children so foreign keys resolve inside each batch
+        order = [TimeSlot, Appointment, Schedule.available_slots.through, Medication, TestResult,
+                 MedicalRecord, MedicalRecord.medications.through,
+                 MedicalRecord.test_results.through, Notification]
+        with transaction.atomic():
+            for model in order:
+                fields, rows = self.buffers.get(model, (None, []))
+                if rows:
+                    self.counts[model] = self.counts.get(model, 0) + bulk_insert(model, fields, rows)
+                    rows.clear()
+
+    def person_name(self):
+        return f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}"
+
+    def create_users(self, count, user_type, password):
+        users = []
+        created = []
+        for n in range(count):
+            users.append(User(
+                user_id=self.next_id('USR'),
+                email=f"{user_type.lower()}.{self.tag.lower()}.{n}@example.com",
+                phone_number=f"+1-555-{self.rng.randint(1000000, 9999999)}",
+                date_of_birth=self.anchor - timedelta(days=self.rng.randint(18 * 365, 90 * 365)),
+                user_type=user_type,
+                password=password,
+            ))
+            if len(users) >= self.batch_size:
+                created.extend(User.objects.bulk_create(users))
+                users = []
+        created.extend(User.objects.bulk_create(users))
+        self.counts[User] = self.counts.get(User, 0) + len(created)
+        return [user.pk for user in created]
+
+    # Generators
+
+    def create_patients(self, count, password):
+        user_pks = self.create_users(count, UserType.PATIENT.value, password)
+        patient_ids = []
+        rows = []
+        for user_pk in user_pks:
+            patient_id = self.next_id('PAT')
+            patient_ids.append(patient_id)
+            rows.append((user_pk, patient_id, self.person_name(),
+                         f"Insurance policy #{self.rng.randint(10000, 99999)}",
+                         f"{self.person_name()}: +1-555-{self.rng.randint(1000000, 9999999)}",
+                         f"{self.rng.randint(1, 9999)} Main St"))
+        with transaction.atomic():
+            for start in range(0, len(rows), self.batch_size):
+                bulk_insert(Patient, ['user_ptr', 'patient_id', 'full_name', 'insurance_info',
+                                      'emergency_contact', 'address'], rows[start:start + self.batch_size])
+        self.counts[Patient] = len(rows)
+        return patient_ids
+
+    def create_doctors(self, count, password):
+        user_pks = self.create_users(count, UserType.DOCTOR.value, password)
+        specialties = _weighted(SPECIALTIES)
+        doctors = []
+        rows = []
+        for user_pk in user_pks:
+            doctor_id = self.next_id('DOC')
+            specialty = self.pick(specialties)
+            doctors.append((doctor_id, specialty))
+            rows.append((user_pk, doctor_id, f"Dr. {self.person_name()}", specialty,
+                         f"MD-{self.tag}-{user_pk}", f"{specialty} Department"))
+        with transaction.atomic():
+            for start in range(0, len(rows), self.batch_size):
+                bulk_insert(Doctor, ['user_ptr', 'doctor_id', 'full_name', 'specialty',
+                                     'license_number', 'department'], rows[start:start + self.batch_size])
+        self.counts[Doctor] = len(rows)
+        return doctors
+
+    def create_schedules_and_appointments(self, doctors, patient_ids, options):
+        if not doctors or not patient_ids:
+            return
+        weeks = _weighted(WORKING_WEEKS)
+        past_statuses = _weighted(PAST_STATUSES)
+        future_statuses = _weighted(FUTURE_STATUSES)
+        visit_types = _weighted(VISIT_TYPES)
+        all_days = [self.first_day + timedelta(days=i)
+                    for i in range((self.last_day - self.first_day).days)]
+
+        # Long-tailed doctor load: a few doctors are much busier than the rest
+        weights = [self.rng.lognormvariate(0, 0.6) for _ in doctors]
+        total_weight = sum(weights)
+        plan = [int(options['appointments'] * w / total_weight) for w in weights]
+        for i in range(options['appointments'] - sum(plan)):
+            plan[i % len(plan)] += 1
+
+        schedule_fields = ['schedule_id', 'doctor_id', 'working_days', 'start_time', 'end_time', 'created_at']
+        schedules = []
+        for doctor_id, _ in doctors:
+            schedules.append((self.next_id('SCH'), doctor_id, self.pick(weeks),
+                              f"{DAY_START_HOUR:02d}:00:00", f"{DAY_START_HOUR + 8:02d}:00:00", self.now))
+        with transaction.atomic():
+            for start in range(0, len(schedules), self.batch_size):
+                self.counts[Schedule] = self.counts.get(Schedule, 0) + bulk_insert(
+                    Schedule, schedule_fields, schedules[start:start + self.batch_size])
+
+        capped = 0
+        for (doctor_id, specialty), schedule, planned in zip(doctors, schedules, plan):
+            schedule_id, working_days = schedule[0], schedule[2]
+            days = [d for d in all_days if DAY_NAMES[d.weekday()] in working_days]
+            capacity = len(days) * SLOTS_PER_DAY
+            if planned > capacity:
+                capped += planned - capacity
+                planned = capacity
+            positions = self.rng.sample(range(capacity), planned)
+            for position in positions:
+                self.add_appointment(doctor_id, specialty, schedule_id, patient_ids,
+                                     days[position // SLOTS_PER_DAY], position % SLOTS_PER_DAY,
+                                     past_statuses, future_statuses, visit_types, options['record_rate'])
+            self.add_open_slots(doctor_id, schedule_id, days, set(positions), options['open_slots'])
+
+        if capped:
+            self.stdout.write(self.style.WARNING(
+                f"{capped} appointments dropped: doctors' working hours are fully booked; "
+                f"increase --doctors or --days-back"))
+
+    def slot_bounds(self, day, index):
+        start = datetime.combine(day, datetime.min.time(), tzinfo=dt_timezone.utc) + \
+            timedelta(hours=DAY_START_HOUR, minutes=SLOT_MINUTES * index)
+        return start, start + timedelta(minutes=SLOT_MINUTES)
+
+    def add_slot(self, doctor_id, schedule_id, start, end, is_available):
+        slot_id = self.next_id('TS')
+        self.add(TimeSlot, ['slot_id', 'start_time', 'end_time', 'is_available', 'doctor_id'],
+                 (slot_id, start, end, is_available, doctor_id))
+        self.add(Schedule.available_slots.through, ['schedule', 'timeslot'], (schedule_id, slot_id))
+        return slot_id
+
+    def add_open_slots(self, doctor_id, schedule_id, days, booked, count):
+        future = [i for i, day in enumerate(days) if day >= self.anchor]
+        candidates = [day_index * SLOTS_PER_DAY + s for day_index in future for s in range(SLOTS_PER_DAY)]
+        free = [position for position in candidates if position not in booked]
+        for position in sorted(self.rng.sample(free, min(count, len(free)))):
+            start, end = self.slot_bounds(days[position // SLOTS_PER_DAY], position % SLOTS_PER_DAY)
+            self.add_slot(doctor_id, schedule_id, start, end, True)
+
+    def add_appointment(self, doctor_id, specialty, schedule_id, patient_ids, day, index,
+                        past_statuses, future_statuses, visit_types, record_rate):
+        start, end = self.slot_bounds(day, index)
+        status = self.pick(past_statuses if start < self.now else future_statuses)
+        cancelled = status == AppointmentStatus.CANCELLED.value
+        slot_id = self.add_slot(doctor_id, schedule_id, start, end, cancelled)
+
+        # Frequent visitors: skew patient choice towards the start of the list
+        patient_id = patient_ids[int(len(patient_ids) * self.rng.random() ** 2)]
+        lead_days = min(int(self.rng.expovariate(1 / 10.0)), 90)
+        booked_at = start - timedelta(days=lead_days, hours=self.rng.randint(1, 12))
+        appointment_id = self.next_id('APT')
+        self.add(Appointment, ['appointment_id', 'patient_id', 'doctor_id', 'appointment_date',
+                               'appointment_end', 'time_slot', 'specialty', 'reason_for_visit', 'status',
+                               'notes', 'created_at', 'updated_at'],
+                 (appointment_id, patient_id, doctor_id, start, end, slot_id, specialty,
+                  self.rng.choice(REASONS), status, None, booked_at, min(end, self.now)))
+        self.add(Notification, ['notification_id', 'user_id', 'type', 'message', 'sent_date',
+                                'is_read', 'priority'],
+                 (self.next_id('NOT'), patient_id, NotificationType.APPOINTMENT_CONFIRMATION.value,
+                  f"Your appointment has been booked for {start}", booked_at,
+                  booked_at < self.now - timedelta(days=3), Priority.HIGH.value))
+
+        if status == AppointmentStatus.COMPLETED.value and self.rng.random() < record_rate:
+            self.add_medical_record(patient_id, doctor_id, day, end, visit_types)
+
+    def add_medical_record(self, patient_id, doctor_id, day, updated_at, visit_types):
+        record_id = self.next_id('MR')
+        self.add(MedicalRecord, ['record_id', 'patient_id', 'doctor_id', 'visit_date', 'diagnosis',
+                                 'treatment_plan', 'visit_type', 'updated_at'],
+                 (record_id, patient_id, doctor_id, day, self.rng.choice(DIAGNOSES),
+                  'Rest, fluids and follow-up as needed', self.pick(visit_types), updated_at))
+
+        for _ in range(self.rng.choice([0, 0, 1, 1, 1, 2, 3])):
+            medication_id = self.next_id('MED')
+            name, dosage = self.rng.choice(MEDICATIONS)
+            self.add(Medication, ['medication_id', 'name', 'dosage', 'frequency', 'duration',
+                                  'prescribed_date'],
+                     (medication_id, name, dosage, self.rng.choice(FREQUENCIES),
+                      f"{self.rng.choice([7, 10, 14, 30, 90])} days", day))
+            self.add(MedicalRecord.medications.through, ['medicalrecord', 'medication'],
+                     (record_id, medication_id))
+
+        for _ in range(self.rng.choice([0, 0, 0, 1, 1, 2])):
+            test_id = self.next_id('TR')
+            name, normal_range = self.rng.choice(TESTS)
+            abnormal = self.rng.random() < 0.15
+            self.add(TestResult, ['test_id', 'test_name', 'test_date', 'results', 'status',
+                                  'normal_ranges'],
+                     (test_id, name, day, 'Outside normal range' if abnormal else 'Within normal range',
+                      'ABNORMAL' if abnormal else 'NORMAL', normal_range))
+            self.add(MedicalRecord.test_results.through, ['medicalrecord', 'testresult'],
+                     (record_id, test_id))
+
+    def create_extra_notifications(self, patient_ids, per_patient):
+        types = _weighted(EXTRA_NOTIFICATIONS)
+        priorities = _weighted(PRIORITIES)
+        span = (self.now - datetime.combine(self.first_day, datetime.min.time(),
+                                            tzinfo=dt_timezone.utc)).total_seconds()
+        for patient_id in patient_ids:
+            for _ in range(per_patient):
+                sent = self.now - timedelta(seconds=self.rng.random() * span)
+                notification_type = self.pick(types)
+                self.add(Notification, ['notification_id', 'user_id', 'type', 'message', 'sent_date',
+                                        'is_read', 'priority'],
+                         (self.next_id('NOT'), patient_id, notification_type,
+                          notification_type.replace('_', ' ').capitalize(), sent,
+                          self.rng.random() < 0.6, self.pick(priorities)))
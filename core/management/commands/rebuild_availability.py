@@ -0,0 +1,21 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.availability import rebuild_availability
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-doctor daily availability bitmaps from time slots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, default=None,
+                            help='First day to rebuild (YYYY-MM-DD), defaults to today')
+        parser.add_argument('--end', type=date.fromisoformat, default=None,
+                            help='Day after the last one to rebuild (YYYY-MM-DD), defaults to no limit')
+        parser.add_argument('--doctor', action='append', dest='doctors', default=None,
+                            help='Only rebuild this doctor (repeatable)')
+
+    def handle(self, *args, **options):
+        rows = rebuild_availability(options['start'] or date.today(), options['end'], options['doctors'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} day availability row(s)"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core.rollups import refresh_rollups
+
+
+class Command(BaseCommand):
+    help = 'Fold appointment and medical record changes into the metric rollup table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Rebuild every bucket instead of only days changed since the last run')
+
+    def handle(self, *args, **options):
+        days = refresh_rollups(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed rollups for {days} day(s)"))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.backups import DEFAULT_CHUNK_SIZE, restore_backup
+
+
+class Command(BaseCommand):
+    help = ('Replace the core tables with a backup from backup_database; an incremental backup '
+            'is restored on top of the backups it builds on')
+
+    def add_arguments(self, parser):
+        parser.add_argument('backup_dir')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--noinput', action='store_true', help='Do not ask for confirmation')
+
+    def handle(self, *args, **options):
+        if not options['noinput']:
+            answer = input('This replaces the data in every core table. Type "yes" to continue: ')
+            if answer != 'yes':
+                raise CommandError('Restore cancelled')
+        try:
+            counts = restore_backup(options['backup_dir'], chunk_size=options['chunk_size'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {sum(counts.values())} rows into {len(counts)} tables"
+        ))
@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from core.availability import day_masks, rebuild_days, to_int
+from core.enums import AppointmentStatus
+from core.models import Appointment, DayAvailability, TimeSlot
+
+DOCTOR_ID = 'DOC-STRESS'
+PATIENT_ID = 'PAT-STRESS'
+
+
+class Command(BaseCommand):
+    help = ('Hammer Appointment.reschedule from concurrent threads on a throwaway doctor and check '
+            'that no slot is double-booked, no deadlock occurs and the availability bitmap '
+            'matches the slots (PostgreSQL only)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=20)
+        parser.add_argument('--free-slots', type=int, default=5)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=200, help='Reschedules per thread')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--keep', action='store_true', help='Keep the generated rows')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('This check needs row locks; run it against PostgreSQL')
+        rng = random.Random(options['seed'])
+        self.cleanup()
+        appointment_ids, slot_ids, day = self.setup(options['appointments'], options['free_slots'])
+
+        outcomes = Counter()
+        errors = []
+        lock = threading.Lock()
+
+        def worker(seed):
+            thread_rng = random.Random(seed)
+            try:
+                for _ in range(options['attempts']):
+                    appointment = Appointment.objects.get(pk=thread_rng.choice(appointment_ids))
+                    try:
+                        moved = appointment.reschedule(thread_rng.choice(slot_ids))
+                    except DatabaseError as exc:
+                        with lock:
+                            errors.append(exc)
+                        continue
+                    with lock:
+                        outcomes['moved' if moved else 'conflict'] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(rng.random(),)) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        total = outcomes['moved'] + outcomes['conflict']
+        self.stdout.write(f"{total} reschedules in {elapsed:.2f}s ({total / elapsed:.0f}/s): "
+                          f"{outcomes['moved']} moved, {outcomes['conflict']} slot taken, {len(errors)} errors")
+        problems = [f'database error: {exc}' for exc in errors[:5]] + self.verify(appointment_ids, slot_ids, day)
+        if not options['keep']:
+            self.cleanup()
+        if problems:
+            raise CommandError('\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('No double bookings, deadlocks or bitmap drift'))
+
+    def setup(self, appointment_count, free_count):
+        day = timezone.localdate() + timedelta(days=3650)
+        start = timezone.make_aware(datetime.combine(day, dt_time(8)))
+        slots = [TimeSlot(slot_id=f'SLOT-STRESS-{index:04d}', doctor_id=DOCTOR_ID,
+                          start_time=start + timedelta(minutes=15 * index),
+                          end_time=start + timedelta(minutes=15 * (index + 1)),
+                          is_available=index >= appointment_count)
+                 for index in range(appointment_count + free_count)]
+        TimeSlot.objects.bulk_create(slots)
+        Appointment.objects.bulk_create([
+            Appointment(appointment_id=f'APT-STRESS-{index:04d}', patient_id=PATIENT_ID, doctor_id=DOCTOR_ID,
+                        appointment_date=slot.start_time, appointment_end=slot.end_time,
+                        time_slot=slot, specialty='Stress',
+                        reason_for_visit='Reschedule contention check',
+                        status=AppointmentStatus.CONFIRMED.value)
+            for index, slot in enumerate(slots[:appointment_count])
+        ])
+        rebuild_days(DOCTOR_ID, [day])
+        return [f'APT-STRESS-{index:04d}' for index in range(appointment_count)], [slot.slot_id for slot in slots], day
+
+    def verify(self, appointment_ids, slot_ids, day):
+        problems = []
+        held = Counter(Appointment.objects.filter(pk__in=appointment_ids).values_list('time_slot_id', flat=True))
+        for slot_id, count in held.items():
+            if count > 1:
+                problems.append(f'{slot_id} is held by {count} appointments')
+        booked = 0
+        for slot in TimeSlot.objects.filter(slot_id__in=slot_ids):
+            if slot.is_available == (slot.slot_id in held):
+                problems.append(f'{slot.slot_id} is_available={slot.is_available} but held={slot.slot_id in held}')
+            if not slot.is_available:
+                for _, bits in day_masks(slot.start_time, slot.end_time):
+                    booked |= bits
+        for appointment in Appointment.objects.filter(pk__in=appointment_ids).select_related('time_slot'):
+            if appointment.appointment_date != appointment.time_slot.start_time:
+                problems.append(f'{appointment.pk} date does not match its slot')
+        row = DayAvailability.objects.filter(doctor_id=DOCTOR_ID, day=day).first()
+        if row is None or to_int(row.booked_bits) != booked:
+            problems.append('availability bitmap booked bits do not match the slots')
+        return problems
+
+    def cleanup(self):
+        Appointment.objects.filter(doctor_id=DOCTOR_ID).delete()
+        TimeSlot.objects.filter(doctor_id=DOCTOR_ID).delete()
+        DayAvailability.objects.filter(doctor_id=DOCTOR_ID).delete()
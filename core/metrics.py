@@ -0,0 +1,163 @@
+import glob
+import os
+import time
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry,
+    Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+from .middleware import resolve_view_name
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 500)
+TASK_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0)
+
+# A fresh volume mounted over the metrics root may not hold this service's directory yet
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+REQUESTS = Counter(
+    'harms_http_requests_total',
+    'HTTP requests by viewset action, method and status code',
+    ['view', 'method', 'status'],
+)
+REQUEST_ERRORS = Counter(
+    'harms_http_request_errors_total',
+    'HTTP requests that ended with a 5xx status',
+    ['view', 'method'],
+)
+REQUEST_LATENCY = Histogram(
+    'harms_http_request_duration_seconds',
+    'HTTP request latency by viewset action',
+    ['view', 'method'],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    'harms_http_requests_in_flight',
+    'HTTP requests currently being processed',
+    ['view'],
+    multiprocess_mode='livesum',
+)
+REQUEST_DB_QUERIES = Histogram(
+    'harms_http_request_db_queries',
+    'Database queries issued per HTTP request',
+    ['view'],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    'harms_http_request_db_duration_seconds',
+    'Total SQL time per HTTP request',
+    ['view'],
+    buckets=LATENCY_BUCKETS,
+)
+THROTTLED_REQUESTS = Counter(
+    'harms_http_throttled_requests_total',
+    'Requests rejected by the token-bucket throttle, by endpoint class',
+    ['scope'],
+)
+AUDIT_EVENTS = Counter(
+    'harms_audit_events_total',
+    'Medical record access events by outcome (written to the database or spooled to disk)',
+    ['outcome'],
+)
+OBJECT_CACHE = Counter(
+    'harms_object_cache_requests_total',
+    'Cached single-object lookups by model and result (local_hit, hit, miss)',
+    ['model', 'result'],
+)
+CELERY_TASK_DURATION = Histogram(
+    'harms_celery_task_duration_seconds',
+    'Celery task run time by task name and final state',
+    ['task', 'state'],
+    buckets=TASK_BUCKETS,
+)
+
+UNRESOLVED_VIEW = 'unresolved'
+
+_task_started = {}
+
+
+class MetricsMiddleware:
+    """
+    Record request rate, latency, errors, in-flight requests and DB query counts
+    per viewset action. Keep it near the top of MIDDLEWARE so latency covers the
+    whole stack and query stats from QueryInstrumentationMiddleware are available.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        request.metrics_view = UNRESOLVED_VIEW
+        try:
+            response = self.get_response(request)
+        finally:
+            if request.metrics_view != UNRESOLVED_VIEW:
+                REQUESTS_IN_FLIGHT.labels(request.metrics_view).dec()
+        view = request.metrics_view
+        REQUEST_LATENCY.labels(view, request.method).observe(time.perf_counter() - start)
+        REQUESTS.labels(view, request.method, str(response.status_code)).inc()
+        if response.status_code >= 500:
+            REQUEST_ERRORS.labels(view, request.method).inc()
+        stats = getattr(request, 'query_stats', None)
+        if stats is not None:
+            REQUEST_DB_QUERIES.labels(view).observe(stats.count)
+            REQUEST_DB_DURATION.labels(view).observe(stats.duration)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = resolve_view_name(view_func, request.method)
+        REQUESTS_IN_FLIGHT.labels(request.metrics_view).inc()
+        return None
+
+
+@task_prerun.connect
+def _task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None and task is not None:
+        CELERY_TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - started)
+
+
+def metrics_dirs():
+    """This service's multiprocess directory plus those of the services listed in HARMS_METRICS_EXTRA_DIRS"""
+    extra = [path for path in os.environ.get('HARMS_METRICS_EXTRA_DIRS', '').split(',') if path]
+    return [os.environ['PROMETHEUS_MULTIPROC_DIR'], *extra]
+
+
+class ServiceMetricsCollector:
+    """
+    Merge the multiprocess files of several services. Each service writes to
+    its own directory: process IDs repeat across containers, and each service
+    clears only its own directory when it starts.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def collect(self):
+        files = [name for path in self.paths for name in glob.glob(os.path.join(path, '*.db'))]
+        return multiprocess.MultiProcessCollector.merge(files, accumulate=True)
+
+
+def metrics_view(request):
+    """Expose metrics in Prometheus text format, aggregated across worker processes"""
+    token = getattr(settings, 'HARMS_METRICS_TOKEN', '')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        registry.register(ServiceMetricsCollector(metrics_dirs()))
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
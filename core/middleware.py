@@ -0,0 +1,134 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('core.instrumentation')
+slow_query_logger = logging.getLogger('core.slow_queries')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,?)+\)', re.IGNORECASE)
+_VALUES_LIST = re.compile(r'\bVALUES\s*(?:\((?:\s*\?\s*,?)+\)\s*,?\s*)+', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint_sql(sql):
+    """Normalize a SQL statement so queries that differ only in literals group together"""
+    normalized = _PLACEHOLDER.sub('?', sql)
+    normalized = _STRING_LITERAL.sub('?', normalized)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _IN_LIST.sub('IN (...)', normalized)
+    normalized = _VALUES_LIST.sub('VALUES (...) ', normalized)
+    normalized = _WHITESPACE.sub(' ', normalized).strip()
+    digest = hashlib.md5(normalized.encode('utf-8')).hexdigest()[:12]
+    return digest, normalized
+
+
+def resolve_view_name(view_func, method):
+    """Return a 'ViewSet.action' label for a resolved view function"""
+    view_cls = getattr(view_func, 'cls', None)
+    if view_cls is None:
+        return getattr(view_func, '__qualname__', getattr(view_func, '__name__', 'unknown'))
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f"{view_cls.__name__}.{action}"
+
+
+class QueryStats:
+    """Per-request SQL statistics collected through a connection execute wrapper"""
+    __slots__ = ('count', 'duration', 'slowest', 'slowest_sql', 'threshold', 'view_name')
+
+    def __init__(self, threshold):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = 0.0
+        self.slowest_sql = None
+        self.threshold = threshold
+        self.view_name = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if elapsed > self.slowest:
+                self.slowest = elapsed
+                self.slowest_sql = sql
+            if elapsed >= self.threshold:
+                self.log_slow_query(sql, elapsed, context)
+
+    def log_slow_query(self, sql, elapsed, context):
+        fingerprint, normalized = fingerprint_sql(sql)
+        slow_query_logger.warning(json.dumps({
+            'event': 'slow_query',
+            'view': self.view_name,
+            'database': context['connection'].alias,
+            'duration_ms': round(elapsed * 1000, 3),
+            'fingerprint': fingerprint,
+            'statement': normalized,
+        }))
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Record query count, SQL time, slowest statement and view time for every request.
+    Results are emitted as Server-Timing headers and one structured log line per request.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'HARMS_INSTRUMENTATION_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'HARMS_SLOW_QUERY_MS', 100) / 1000.0
+
+    def __call__(self, request):
+        stats = QueryStats(self.threshold)
+        request.query_stats = stats
+        request_start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(stats))
+            response = self.get_response(request)
+        total = time.perf_counter() - request_start
+        view_start = getattr(request, '_view_start', None)
+        view_time = (time.perf_counter() - view_start) if view_start else 0.0
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"',
+            f'db-slowest;dur={stats.slowest * 1000:.2f}',
+            f'view;dur={view_time * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+        payload = {
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'view': stats.view_name,
+            'status': response.status_code,
+            'queries': stats.count,
+            'sql_ms': round(stats.duration * 1000, 3),
+            'slowest_sql_ms': round(stats.slowest * 1000, 3),
+            'view_ms': round(view_time * 1000, 3),
+            'total_ms': round(total * 1000, 3),
+        }
+        if stats.slowest_sql is not None:
+            payload['slowest_fingerprint'] = fingerprint_sql(stats.slowest_sql)[0]
+        logger.info(json.dumps(payload))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_stats.view_name = resolve_view_name(view_func, request.method)
+        request._view_start = time.perf_counter()
+        return None
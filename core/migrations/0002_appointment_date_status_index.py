@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["appointment_date", "status"],
+                name="appointment_date_status_idx",
+            ),
+        ),
+    ]
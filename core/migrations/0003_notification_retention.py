@@ -0,0 +1,170 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:51
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+# Frozen copy of the partitioning SQL as it stood when this migration was
+# written; core/partitions.py may change, this must not.
+
+def _add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _convert_to_partitioned(schema_editor, table, column, primary_key):
+    """Recreate table as PARTITION BY RANGE (column) with monthly and default partitions, keeping its rows"""
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    old_table = f"{table}_unpartitioned"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT ic.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i "
+            "JOIN pg_class ic ON ic.oid = i.indexrelid "
+            "WHERE i.indrelid = %s::regclass AND NOT i.indisunique",
+            [table],
+        )
+        indexes = cursor.fetchall()
+
+    for name, _ in indexes:
+        schema_editor.execute(f"DROP INDEX {quote(name)}")
+    schema_editor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}")
+    schema_editor.execute(
+        f"ALTER TABLE {quote(old_table)} RENAME CONSTRAINT {quote(table + '_pkey')} "
+        f"TO {quote(old_table + '_pkey')}"
+    )
+    schema_editor.execute(
+        f"CREATE TABLE {quote(table)} (LIKE {quote(old_table)} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE ({quote(column)})"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {quote(table)} ADD PRIMARY KEY ({', '.join(quote(name) for name in primary_key)})"
+    )
+    schema_editor.execute(f"CREATE TABLE {quote(table + '_default')} PARTITION OF {quote(table)} DEFAULT")
+    for _, definition in indexes:
+        schema_editor.execute(definition)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({quote(column)}), MAX({quote(column)}) FROM {quote(old_table)}")
+        lowest, highest = cursor.fetchone()
+    this_month = _month_start(date.today())
+    month = _month_start(lowest) if lowest else this_month
+    last = _add_months(max(_month_start(highest), this_month) if highest else this_month, 3)
+    while month <= last:
+        schema_editor.execute(
+            f"CREATE TABLE {quote(f'{table}_p{month.year:04d}{month.month:02d}')} PARTITION OF {quote(table)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [month.isoformat(), _add_months(month, 1).isoformat()],
+        )
+        month = _add_months(month, 1)
+
+    schema_editor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old_table)}")
+    schema_editor.execute(f"DROP TABLE {quote(old_table)} CASCADE")
+    for name, definition in foreign_keys:
+        schema_editor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
+
+
+def partition_archive(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    _convert_to_partitioned(
+        schema_editor,
+        "notifications_archive",
+        column="sent_date",
+        primary_key=["notification_id", "sent_date"],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_appointment_date_status_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedNotification",
+            fields=[
+                (
+                    "notification_id",
+                    models.CharField(max_length=100, primary_key=True, serialize=False),
+                ),
+                ("user_id", models.CharField(max_length=100)),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("APPOINTMENT_CONFIRMATION", "APPOINTMENT_CONFIRMATION"),
+                            ("APPOINTMENT_REMINDER", "APPOINTMENT_REMINDER"),
+                            ("TEST_RESULTS_AVAILABLE", "TEST_RESULTS_AVAILABLE"),
+                            ("PRESCRIPTION_RENEWAL", "PRESCRIPTION_RENEWAL"),
+                            ("HEALTH_ALERT", "HEALTH_ALERT"),
+                            ("SYSTEM_MAINTENANCE", "SYSTEM_MAINTENANCE"),
+                        ],
+                        max_length=50,
+                    ),
+                ),
+                ("message", models.TextField()),
+                ("sent_date", models.DateTimeField()),
+                ("is_read", models.BooleanField(default=False)),
+                (
+                    "priority",
+                    models.CharField(
+                        choices=[
+                            ("LOW", "LOW"),
+                            ("MEDIUM", "MEDIUM"),
+                            ("HIGH", "HIGH"),
+                            ("URGENT", "URGENT"),
+                        ],
+                        default="MEDIUM",
+                        max_length=20,
+                    ),
+                ),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Archived Notification",
+                "verbose_name_plural": "Archived Notifications",
+                "db_table": "notifications_archive",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user_id", "sent_date"], name="notification_user_sent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["type", "priority", "sent_date"],
+                name="notification_retention_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivednotification",
+            index=models.Index(
+                fields=["user_id", "sent_date"], name="archived_notif_user_sent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivednotification",
+            index=models.Index(
+                fields=["type", "priority", "sent_date"],
+                name="archived_notif_retention_idx",
+            ),
+        ),
+        migrations.RunPython(partition_archive, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:52
+
+from datetime import date
+
+from django.db import migrations, models
+
+
+# Frozen copy of the partitioning SQL as it stood when this migration was
+# written; core/partitions.py may change, this must not.
+
+def _add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def _convert_to_partitioned(schema_editor, table, column, primary_key):
+    """Recreate table as PARTITION BY RANGE (column) with monthly and default partitions, keeping its rows"""
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    old_table = f"{table}_unpartitioned"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT ic.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i "
+            "JOIN pg_class ic ON ic.oid = i.indexrelid "
+            "WHERE i.indrelid = %s::regclass AND NOT i.indisunique",
+            [table],
+        )
+        indexes = cursor.fetchall()
+
+    for name, _ in indexes:
+        schema_editor.execute(f"DROP INDEX {quote(name)}")
+    schema_editor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}")
+    schema_editor.execute(
+        f"ALTER TABLE {quote(old_table)} RENAME CONSTRAINT {quote(table + '_pkey')} "
+        f"TO {quote(old_table + '_pkey')}"
+    )
+    schema_editor.execute(
+        f"CREATE TABLE {quote(table)} (LIKE {quote(old_table)} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE ({quote(column)})"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {quote(table)} ADD PRIMARY KEY ({', '.join(quote(name) for name in primary_key)})"
+    )
+    schema_editor.execute(f"CREATE TABLE {quote(table + '_default')} PARTITION OF {quote(table)} DEFAULT")
+    for _, definition in indexes:
+        schema_editor.execute(definition)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({quote(column)}), MAX({quote(column)}) FROM {quote(old_table)}")
+        lowest, highest = cursor.fetchone()
+    this_month = _month_start(date.today())
+    month = _month_start(lowest) if lowest else this_month
+    last = _add_months(max(_month_start(highest), this_month) if highest else this_month, 3)
+    while month <= last:
+        schema_editor.execute(
+            f"CREATE TABLE {quote(f'{table}_p{month.year:04d}{month.month:02d}')} PARTITION OF {quote(table)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [month.isoformat(), _add_months(month, 1).isoformat()],
+        )
+        month = _add_months(month, 1)
+
+    schema_editor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old_table)}")
+    schema_editor.execute(f"DROP TABLE {quote(old_table)} CASCADE")
+    for name, definition in foreign_keys:
+        schema_editor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
+
+
+def partition_appointments(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    _convert_to_partitioned(
+        schema_editor,
+        "core_appointment",
+        column="appointment_date",
+        primary_key=["appointment_id", "appointment_date"],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_notification_retention"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor_id", "appointment_date"],
+                name="appointment_doctor_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["patient_id", "appointment_date"],
+                name="appointment_patient_date_idx",
+            ),
+        ),
+        migrations.RunPython(partition_appointments, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_partition_appointments"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupState",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=50, primary_key=True, serialize=False),
+                ),
+                ("watermark", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "rollup_state",
+            },
+        ),
+        migrations.AddField(
+            model_name="appointment",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name="medicalrecord",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name="MetricRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "metric",
+                    models.CharField(
+                        choices=[
+                            ("BOOKINGS", "BOOKINGS"),
+                            ("CANCELLATIONS", "CANCELLATIONS"),
+                            ("COMPLETIONS", "COMPLETIONS"),
+                            ("NO_SHOWS", "NO_SHOWS"),
+                            ("BOOKED_MINUTES", "BOOKED_MINUTES"),
+                            ("CAPACITY_MINUTES", "CAPACITY_MINUTES"),
+                            ("UTILIZATION", "UTILIZATION"),
+                            ("MEDICAL_RECORDS", "MEDICAL_RECORDS"),
+                        ],
+                        max_length=30,
+                    ),
+                ),
+                (
+                    "dimension",
+                    models.CharField(
+                        choices=[
+                            ("ALL", "ALL"),
+                            ("DOCTOR", "DOCTOR"),
+                            ("SPECIALTY", "SPECIALTY"),
+                            ("STATUS", "STATUS"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "dimension_value",
+                    models.CharField(blank=True, default="", max_length=100),
+                ),
+                (
+                    "granularity",
+                    models.CharField(
+                        choices=[("DAY", "DAY"), ("WEEK", "WEEK"), ("MONTH", "MONTH")],
+                        max_length=10,
+                    ),
+                ),
+                ("bucket_start", models.DateField()),
+                ("value", models.FloatField()),
+            ],
+            options={
+                "verbose_name": "Metric Rollup",
+                "verbose_name_plural": "Metric Rollups",
+                "db_table": "metric_rollups",
+                "indexes": [
+                    models.Index(
+                        fields=["granularity", "bucket_start"],
+                        name="metric_rollup_bucket_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "metric",
+                            "dimension",
+                            "dimension_value",
+                            "granularity",
+                            "bucket_start",
+                        ),
+                        name="metric_rollup_series_bucket_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_metric_rollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointment",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
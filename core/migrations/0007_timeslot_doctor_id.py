@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:25
+
+from django.db import migrations, models
+
+
+def backfill_slot_doctors(apps, schema_editor):
+    TimeSlot = apps.get_model("core", "TimeSlot")
+    Schedule = apps.get_model("core", "Schedule")
+    TimeSlot.objects.filter(doctor_id__isnull=True).update(
+        doctor_id=models.Subquery(
+            Schedule.objects.filter(available_slots=models.OuterRef("pk")).values(
+                "doctor_id"
+            )[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_appointment_created_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="timeslot",
+            name="doctor_id",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="timeslot",
+            index=models.Index(
+                fields=["doctor_id", "start_time"], name="time_slot_doctor_start_idx"
+            ),
+        ),
+        migrations.RunPython(backfill_slot_doctors, migrations.RunPython.noop),
+    ]
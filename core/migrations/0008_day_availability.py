@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_timeslot_doctor_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DayAvailability",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("doctor_id", models.CharField(max_length=100)),
+                ("day", models.DateField()),
+                ("open_bits", models.BinaryField(default=bytes)),
+                ("booked_bits", models.BinaryField(default=bytes)),
+                ("blocked_bits", models.BinaryField(default=bytes)),
+            ],
+            options={
+                "verbose_name": "Day Availability",
+                "verbose_name_plural": "Day Availability",
+                "db_table": "day_availability",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("doctor_id", "day"),
+                        name="day_availability_doctor_day_uniq",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_day_availability"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeLogEntry",
+            fields=[
+                ("seq", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "entity",
+                    models.CharField(
+                        choices=[
+                            ("APPOINTMENT", "APPOINTMENT"),
+                            ("MEDICAL_RECORD", "MEDICAL_RECORD"),
+                            ("NOTIFICATION", "NOTIFICATION"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("object_id", models.CharField(max_length=100)),
+                (
+                    "operation",
+                    models.CharField(
+                        choices=[
+                            ("CREATED", "CREATED"),
+                            ("UPDATED", "UPDATED"),
+                            ("DELETED", "DELETED"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("changed_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "verbose_name": "Change Log Entry",
+                "verbose_name_plural": "Change Log",
+                "db_table": "change_log",
+                "indexes": [
+                    models.Index(
+                        fields=["entity", "seq"], name="change_log_entity_seq_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0009_change_log"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="medicalrecord",
+            index=models.Index(
+                fields=["patient_id", "visit_date"], name="record_patient_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("is_read", False)),
+                fields=["user_id"],
+                name="notification_user_unread_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0010_patient_timeline_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="medicalrecord",
+            index=models.Index(
+                fields=["doctor_id", "visit_date"], name="record_doctor_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="medicalrecord",
+            index=models.Index(fields=["visit_date"], name="record_visit_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(fields=["sent_date"], name="notification_sent_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="testresult",
+            index=models.Index(fields=["test_date"], name="test_result_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="timeslot",
+            index=models.Index(fields=["start_time"], name="time_slot_start_idx"),
+        ),
+    ]
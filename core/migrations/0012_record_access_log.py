@@ -0,0 +1,58 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0011_admin_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecordAccess",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("record_id", models.CharField(max_length=100)),
+                ("patient_id", models.CharField(max_length=100)),
+                (
+                    "accessed_by",
+                    models.CharField(blank=True, max_length=100, null=True),
+                ),
+                (
+                    "access_type",
+                    models.CharField(
+                        choices=[
+                            ("LIST", "LIST"),
+                            ("RETRIEVE", "RETRIEVE"),
+                            ("PATIENT_RECORDS", "PATIENT_RECORDS"),
+                            ("CHANGE_FEED", "CHANGE_FEED"),
+                            ("TIMELINE", "TIMELINE"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("client_ip", models.GenericIPAddressField(blank=True, null=True)),
+                ("accessed_at", models.DateTimeField()),
+                ("written_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "verbose_name": "Record Access",
+                "verbose_name_plural": "Record Access Log",
+                "db_table": "record_access_log",
+                "indexes": [
+                    models.Index(
+                        fields=["patient_id", "accessed_at"],
+                        name="record_access_patient_idx",
+                    ),
+                    models.Index(
+                        fields=["accessed_by", "accessed_at"],
+                        name="record_access_user_idx",
+                    ),
+                    models.Index(fields=["accessed_at"], name="record_access_time_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_record_access_log"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["status", "appointment_date"],
+                name="appointment_status_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["specialty", "appointment_date"],
+                name="appointment_specialty_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=models.Index(fields=["specialty"], name="doctor_specialty_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=models.Index(fields=["department"], name="doctor_department_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="medicalrecord",
+            index=models.Index(
+                fields=["visit_type", "visit_date"], name="record_type_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["priority", "sent_date"], name="notification_priority_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["is_read", "sent_date"], name="notification_read_sent_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="timeslot",
+            index=models.Index(
+                fields=["is_available", "start_time"], name="time_slot_free_start_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,96 @@
+import logging
+
+from django.db import migrations, models
+from django.db.models import DurationField, ExpressionWrapper, F, OuterRef, Subquery
+
+# Frozen copy of the DDL in core/overlap.py as of this migration, so later
+# changes to that module do not change what this migration does
+CONSTRAINT_SQL = (
+    "ALTER TABLE {partition} ADD CONSTRAINT {constraint} "
+    "EXCLUDE USING gist (doctor_id WITH =, tstzrange(appointment_date, appointment_end) WITH &&) "
+    "WHERE (status <> 'CANCELLED')"
+)
+
+
+def fill_appointment_end(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "UPDATE core_appointment a SET appointment_end = a.appointment_date + (s.end_time - s.start_time) "
+            "FROM time_slots s WHERE s.slot_id = a.time_slot_id"
+        )
+        return
+    Appointment = apps.get_model("core", "Appointment")
+    TimeSlot = apps.get_model("core", "TimeSlot")
+    length = (TimeSlot.objects.filter(slot_id=OuterRef("time_slot_id"))
+              .annotate(length=ExpressionWrapper(F("end_time") - F("start_time"), output_field=DurationField()))
+              .values("length")[:1])
+    Appointment.objects.update(appointment_end=F("appointment_date") + Subquery(length, output_field=DurationField()))
+
+
+def _partitions(cursor):
+    """Every partition of core_appointment, the default one included"""
+    cursor.execute(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'core_appointment'::regclass ORDER BY c.relname"
+    )
+    return [name for name, in cursor.fetchall()]
+
+
+def add_constraints(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'btree_gist'")
+        if cursor.fetchone() is None:
+            logging.getLogger("core.overlap").warning(
+                "btree_gist is not available; overlapping appointments are rejected by Appointment.save() only")
+            return
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        for partition in _partitions(cursor):
+            cursor.execute(CONSTRAINT_SQL.format(partition=quote(partition),
+                                                 constraint=quote(partition + "_no_overlap")))
+
+
+def drop_constraints(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for partition in _partitions(cursor):
+            cursor.execute(f"ALTER TABLE {quote(partition)} DROP CONSTRAINT IF EXISTS {quote(partition + '_no_overlap')}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0013_list_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="appointment",
+            name="appointment_end",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(fill_appointment_end, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="appointment",
+            name="appointment_end",
+            field=models.DateTimeField(),
+        ),
+        migrations.RemoveIndex(
+            model_name="appointment",
+            name="appointment_doctor_date_idx",
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["doctor_id", "appointment_date", "appointment_end"],
+                name="appointment_doctor_span_idx",
+            ),
+        ),
+        migrations.RunPython(add_constraints, drop_constraints),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0014_appointment_no_overlap"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="NextAvailableSlots",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[("DOCTOR", "DOCTOR"), ("SPECIALTY", "SPECIALTY")],
+                        max_length=10,
+                    ),
+                ),
+                ("key", models.CharField(max_length=100)),
+                ("specialty", models.CharField(max_length=100)),
+                ("slots", models.JSONField(default=list)),
+                ("expires_at", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Next Available Slots",
+                "verbose_name_plural": "Next Available Slots",
+                "db_table": "next_available_slots",
+                "indexes": [
+                    models.Index(
+                        fields=["expires_at"], name="next_available_expires_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("scope", "key"), name="next_available_scope_key_uniq"
+                    )
+                ],
+            },
+        ),
+    ]
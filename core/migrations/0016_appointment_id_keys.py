@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# The partitioned core_appointment's primary key is (appointment_id,
+# appointment_date), so PostgreSQL no longer keeps appointment_id unique on
+# its own. Triggers mirror every appointment_id into a small unpartitioned
+# key table whose primary key does.
+
+FORWARD = """
+CREATE TABLE appointment_ids (appointment_id varchar(100) PRIMARY KEY);
+INSERT INTO appointment_ids (appointment_id) SELECT appointment_id FROM core_appointment;
+
+CREATE FUNCTION appointment_ids_sync() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    -- Partition maintenance moving rows out of the default partition keeps their keys
+    IF current_setting('harms.moving_partition_rows', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE appointment_ids;
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM appointment_ids WHERE appointment_id = OLD.appointment_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO appointment_ids (appointment_id) VALUES (NEW.appointment_id);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER appointment_ids_insert_delete AFTER INSERT OR DELETE ON core_appointment
+    FOR EACH ROW EXECUTE FUNCTION appointment_ids_sync();
+-- A row moving between partitions fires only this one, with the ID unchanged
+CREATE TRIGGER appointment_ids_update AFTER UPDATE OF appointment_id ON core_appointment
+    FOR EACH ROW WHEN (OLD.appointment_id IS DISTINCT FROM NEW.appointment_id)
+    EXECUTE FUNCTION appointment_ids_sync();
+CREATE TRIGGER appointment_ids_truncate AFTER TRUNCATE ON core_appointment
+    FOR EACH STATEMENT EXECUTE FUNCTION appointment_ids_sync();
+"""
+
+BACKWARD = """
+DROP TRIGGER appointment_ids_truncate ON core_appointment;
+DROP TRIGGER appointment_ids_update ON core_appointment;
+DROP TRIGGER appointment_ids_insert_delete ON core_appointment;
+DROP FUNCTION appointment_ids_sync();
+DROP TABLE appointment_ids;
+"""
+
+
+def add_key_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(FORWARD)
+
+
+def drop_key_table(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0015_next_available_slots"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_key_table, drop_key_table),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0016_appointment_id_keys"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RollupDirtyDay",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("day", models.DateField()),
+                ("marked_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "db_table": "rollup_dirty_days",
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-19 21:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_rollup_dirty_days"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="schedule",
+            name="created_at",
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -1,20 +1,32 @@
-from django.db import models
+import json
+
+from django.db import IntegrityError, connections, models, router, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import EmailValidator
-from datetime import datetime, date
+from django.utils import timezone
+from datetime import datetime, date, timedelta
 from typing import List, Optional
 from .enums import (
     UserType, Priority, NotificationType, 
-    AppointmentStatus, ReportType
+    AppointmentStatus, ReportType,
+    RollupGranularity, RollupDimension, RollupMetric, AnalyticsMetric,
+    ChangeEntity, ChangeOperation, RecordAccessType, AvailabilityScope
+)
+from .ids import new_id
+from .object_cache import ObjectCacheQuerySet, invalidate_objects
+from .overlap import (
+    MAX_APPOINTMENT_LENGTH, AppointmentOverlapError, enforced_by_database, is_overlap_violation,
 )
 
 
-class UserManager(BaseUserManager):
+class UserManager(BaseUserManager.from_queryset(ObjectCacheQuerySet)):
     """Custom user manager"""
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('The Email field must be set')
         email = self.normalize_email(email)
+        extra_fields.setdefault('user_id', new_id('USR'))
         user = self.model(email=email, **extra_fields)
         user.set_password(password)
         user.save(using=self._db)
@@ -140,6 +152,10 @@ class Doctor(User):
         db_table = 'doctors'
         verbose_name = 'Doctor'
         verbose_name_plural = 'Doctors'
+        indexes = [
+            models.Index(fields=['specialty'], name='doctor_specialty_idx'),
+            models.Index(fields=['department'], name='doctor_department_idx'),
+        ]
 
 
 class SystemAdmin(User):
@@ -156,16 +172,27 @@ class SystemAdmin(User):
         """Manage users"""
         pass
 
-    def view_analytics(self) -> 'Analytics':
+    def view_analytics(self, metric_type: str = AnalyticsMetric.DAILY_TREND.value, days: int = 30) -> 'Analytics':
         """View analytics"""
-        pass
+        today = date.today()
+        analytics = Analytics(
+            analytics_id=new_id('ANA'),
+            metric_type=metric_type,
+            period={'start': (today - timedelta(days=days)).isoformat(), 'end': today.isoformat()},
+        )
+        analytics.calculate_metrics()
+        analytics.save()
+        return analytics
 
     def system_settings(self) -> None:
         """System settings"""
         pass
 
-    def backup_database(self) -> bool:
-        """Backup database"""
+    def backup_database(self, incremental: bool = True) -> bool:
+        """Backup database (incremental on top of the latest backup when there is one)"""
+        from .backups import create_backup
+
+        create_backup(incremental=incremental)
         return True
 
     class Meta:
@@ -224,14 +251,33 @@ class TestResult(models.Model):
         db_table = 'test_results'
         verbose_name = 'Test Result'
         verbose_name_plural = 'Test Results'
+        indexes = [
+            models.Index(fields=['test_date'], name='test_result_date_idx'),
+        ]
  
 
+class TimeSlotQuerySet(models.QuerySet):
+    """QuerySet whose update() retires the cached appointments that carry the updated slots"""
+
+    def update(self, **kwargs):
+        slot_ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        invalidate_objects(Appointment, Appointment.objects.filter(time_slot_id__in=slot_ids)
+                           .values_list('appointment_id', flat=True))
+        return rows
+    update.alters_data = True
+
+
 class TimeSlot(models.Model):
     """TimeSlot class"""
     slot_id = models.CharField(max_length=100, unique=True, primary_key=True)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     is_available = models.BooleanField(default=True)
+    # Denormalized from the owning Schedule so calendar windows are index range scans
+    doctor_id = models.CharField(max_length=100, blank=True, null=True)
+
+    objects = TimeSlotQuerySet.as_manager()
 
     def check_availability(self) -> bool:
         """Check availability"""
@@ -241,20 +287,25 @@ class TimeSlot(models.Model):
         """Reserve time slot"""
         if self.is_available:
             self.is_available = False
-            self.save()
+            self.save(update_fields=['is_available'])
             return True
         return False
 
     def release(self) -> bool:
         """Release time slot"""
         self.is_available = True
-        self.save()
+        self.save(update_fields=['is_available'])
         return True
 
     class Meta:
         db_table = 'time_slots'
         verbose_name = 'Time Slot'
         verbose_name_plural = 'Time Slots'
+        indexes = [
+            models.Index(fields=['doctor_id', 'start_time'], name='time_slot_doctor_start_idx'),
+            models.Index(fields=['start_time'], name='time_slot_start_idx'),
+            models.Index(fields=['is_available', 'start_time'], name='time_slot_free_start_idx'),
+        ]
 
 
 class MedicalRecord(models.Model):
@@ -268,6 +319,7 @@ class MedicalRecord(models.Model):
     medications = models.ManyToManyField(Medication, related_name='medical_records')
     test_results = models.ManyToManyField(TestResult, related_name='medical_records')
     visit_type = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def create(self) -> bool:
         """Create medical record"""
@@ -301,6 +353,12 @@ class MedicalRecord(models.Model):
         db_table = 'medical_records'
         verbose_name = 'Medical Record'
         verbose_name_plural = 'Medical Records'
+        indexes = [
+            models.Index(fields=['patient_id', 'visit_date'], name='record_patient_date_idx'),
+            models.Index(fields=['doctor_id', 'visit_date'], name='record_doctor_date_idx'),
+            models.Index(fields=['visit_date'], name='record_visit_date_idx'),
+            models.Index(fields=['visit_type', 'visit_date'], name='record_type_date_idx'),
+        ]
 
 
 class Schedule(models.Model):
@@ -312,18 +370,37 @@ class Schedule(models.Model):
     end_time = models.TimeField()
     available_slots = models.ManyToManyField(TimeSlot, related_name='schedules', blank=True)
     blocked_slots = models.ManyToManyField(TimeSlot, related_name='blocked_schedules', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)  # the newest of a doctor's schedules is current
 
     def set_availability(self) -> bool:
         """Set availability"""
         return True
 
-    def block_time_slot(self) -> bool:
+    def block_time_slot(self, start: datetime, end: datetime) -> bool:
         """Block time slot"""
-        return True
+        from .availability import block_range
 
-    def get_available_slots(self) -> List[TimeSlot]:
+        return block_range(self.doctor_id, start, end)
+
+    def unblock_time_slot(self, start: datetime, end: datetime) -> bool:
+        """Unblock time slot"""
+        from .availability import unblock_range
+
+        return unblock_range(self.doctor_id, start, end)
+
+    def get_slots(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> models.QuerySet:
+        """Get slots starting within [start, end), as a lazy queryset"""
+        slots = self.available_slots.filter(doctor_id=self.doctor_id)
+        if start:
+            slots = slots.filter(start_time__gte=start)
+        if end:
+            slots = slots.filter(start_time__lt=end)
+        return slots.order_by('start_time')
+
+    def get_available_slots(self, start: Optional[datetime] = None,
+                            end: Optional[datetime] = None) -> models.QuerySet:
         """Get available slots"""
-        return list(self.available_slots.filter(is_available=True))
+        return self.get_slots(start, end).filter(is_available=True)
 
     def update_schedule(self) -> bool:
         """Update schedule"""
@@ -335,12 +412,66 @@ class Schedule(models.Model):
         verbose_name_plural = 'Schedules'
 
 
+class DayAvailability(models.Model):
+    """
+    Per-doctor, per-day availability bitsets; bit i covers the i-th
+    15-minute slot of the local day (see core/availability.py).
+    """
+    doctor_id = models.CharField(max_length=100)
+    day = models.DateField()
+    open_bits = models.BinaryField(default=bytes)     # covered by one of the doctor's TimeSlots
+    booked_bits = models.BinaryField(default=bytes)   # covered by a reserved TimeSlot
+    blocked_bits = models.BinaryField(default=bytes)  # blocked via Schedule.block_time_slot / blocked_slots
+
+    class Meta:
+        db_table = 'day_availability'
+        verbose_name = 'Day Availability'
+        verbose_name_plural = 'Day Availability'
+        constraints = [
+            models.UniqueConstraint(fields=['doctor_id', 'day'], name='day_availability_doctor_day_uniq'),
+        ]
+
+
+class NextAvailableSlots(models.Model):
+    """
+    The next HARMS_NEXT_AVAILABLE_SIZE free slots of one doctor or one
+    specialty, kept current as slots change (see core/next_available.py).
+    """
+    scope = models.CharField(
+        max_length=10,
+        choices=[(tag.value, tag.name) for tag in AvailabilityScope]
+    )
+    key = models.CharField(max_length=100)  # doctor_id or specialty
+    specialty = models.CharField(max_length=100)  # of the doctor when the row was computed
+    slots = models.JSONField(default=list)  # [{slot_id, doctor_id, start_time, end_time}] by start_time
+    expires_at = models.DateTimeField(null=True, blank=True)  # start of the first slot
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'next_available_slots'
+        verbose_name = 'Next Available Slots'
+        verbose_name_plural = 'Next Available Slots'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='next_available_scope_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='next_available_expires_idx'),
+        ]
+
+
+# Unique appointment_id on PostgreSQL, where the partitioned table cannot enforce it
+APPOINTMENT_ID_KEY = 'appointment_ids_pkey'
+
+
 class Appointment(models.Model):
     """Appointment class"""
     appointment_id = models.CharField(max_length=100, unique=True, primary_key=True)
     patient_id = models.CharField(max_length=100)
     doctor_id = models.CharField(max_length=100)
     appointment_date = models.DateTimeField()
+    # appointment_date plus the slot's length, filled in on save; the doctor may
+    # not have two appointments (other than cancelled ones) overlapping in time
+    appointment_end = models.DateTimeField()
     time_slot = models.ForeignKey(TimeSlot, on_delete=models.CASCADE, related_name='appointments')
     specialty = models.CharField(max_length=100)
     reason_for_visit = models.TextField()
@@ -350,15 +481,103 @@ class Appointment(models.Model):
         default=AppointmentStatus.PENDING.value
     )
     notes = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ObjectCacheQuerySet.as_manager()
 
     def create(self) -> bool:
         """Create appointment"""
         return True
 
-    def reschedule(self) -> bool:
-        """Reschedule appointment"""
+    def reschedule(self, new_slot) -> bool:
+        """
+        Move the appointment to new_slot (a TimeSlot or its slot_id) in one
+        transaction: the new slot is reserved and the old one released only if
+        the new one is still free. The appointment row is locked first, then both
+        slots in slot_id order, so concurrent reschedules (swaps included) queue
+        instead of deadlocking. Returns False if the appointment is closed or the
+        slot is taken or belongs to another doctor; raises AppointmentOverlapError
+        if the doctor has another appointment at that time.
+        """
+        from .availability import rebuild_slot_days
+        from .next_available import refresh_for_slots
+
+        new_slot_id = getattr(new_slot, 'slot_id', new_slot)
+        with transaction.atomic():
+            current = (Appointment.objects.select_for_update()
+                       .only('status', 'time_slot_id').get(pk=self.pk))
+            self.status = current.status
+            if current.status in (AppointmentStatus.CANCELLED.value, AppointmentStatus.COMPLETED.value):
+                return False
+            if current.time_slot_id == new_slot_id:
+                return True
+
+            slots = {slot.slot_id: slot for slot in TimeSlot.objects.select_for_update()
+                     .filter(slot_id__in=[current.time_slot_id, new_slot_id]).order_by('slot_id')}
+            target = slots.get(new_slot_id)
+            if (target is None or not target.is_available
+                    or (target.doctor_id and target.doctor_id != self.doctor_id)):
+                return False
+
+            # Reserve the new slot and release the old one in a single UPDATE
+            TimeSlot.objects.filter(slot_id__in=slots).update(is_available=models.Case(
+                models.When(slot_id=new_slot_id, then=models.Value(False)), default=models.Value(True)))
+            self.time_slot = target
+            self.appointment_date = target.start_time
+            self.appointment_end = target.end_time
+            self.save(update_fields=['time_slot', 'appointment_date', 'appointment_end', 'updated_at'])
+            for slot in slots.values():
+                slot.is_available = slot.slot_id != new_slot_id
+            rebuild_slot_days(slots.values())
+            refresh_for_slots(slots.values())
         return True
 
+    def overlapping(self):
+        """The doctor's other open appointments that overlap this one (index range scan)"""
+        return (Appointment.objects
+                .filter(doctor_id=self.doctor_id,
+                        appointment_date__gt=self.appointment_date - MAX_APPOINTMENT_LENGTH,
+                        appointment_date__lt=self.appointment_end,
+                        appointment_end__gt=self.appointment_date)
+                .exclude(status=AppointmentStatus.CANCELLED.value)
+                .exclude(pk=self.pk))
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        # The span follows the date and the slot's length; a full save may have
+        # changed either (a PUT or PATCH of appointment_date goes through here)
+        if self.appointment_end is None or update_fields is None or \
+                {'appointment_date', 'time_slot', 'time_slot_id'} & set(update_fields):
+            slot = self.time_slot
+            self.appointment_end = self.appointment_date + (slot.end_time - slot.start_time)
+            if update_fields is not None and 'appointment_end' not in update_fields:
+                kwargs['update_fields'] = update_fields = [*update_fields, 'appointment_end']
+        using = kwargs.get('using') or router.db_for_write(Appointment, instance=self)
+        if enforced_by_database(connections[using]):
+            # Enforced by the per-partition exclusion constraints (core/overlap.py)
+            try:
+                return super().save(*args, **kwargs)
+            except IntegrityError as exc:
+                if is_overlap_violation(exc):
+                    raise AppointmentOverlapError(self._overlap_message()) from exc
+                raise
+
+        changes_span = update_fields is None or {'appointment_date', 'appointment_end', 'status',
+                                                 'doctor_id'} & set(update_fields)
+        with transaction.atomic(using=using):
+            if changes_span and self.status != AppointmentStatus.CANCELLED.value:
+                # Bookings for one doctor queue on the doctor's row
+                list(Doctor.objects.using(using).select_for_update()
+                     .filter(doctor_id=self.doctor_id).values_list('pk', flat=True))
+                if self.overlapping().using(using).exists():
+                    raise AppointmentOverlapError(self._overlap_message())
+            return super().save(*args, **kwargs)
+
+    def _overlap_message(self):
+        return (f'Doctor {self.doctor_id} already has an appointment overlapping '
+                f'{self.appointment_date.isoformat()} - {self.appointment_end.isoformat()}')
+
     def cancel(self) -> bool:
         """Cancel appointment"""
         self.status = AppointmentStatus.CANCELLED.value
@@ -386,7 +605,24 @@ class Appointment(models.Model):
             'status': self.status,
             'reason_for_visit': self.reason_for_visit
         }
-    
+
+    class Meta:
+        # Range-partitioned by month on appointment_date on PostgreSQL (see migration 0004);
+        # each partition carries the no-overlap exclusion constraint (core/overlap.py).
+        # The table's primary key there is (appointment_id, appointment_date), so
+        # appointment_id is kept unique by triggers mirroring it into the unpartitioned
+        # appointment_ids table (migration 0016; APPOINTMENT_ID_KEY is its constraint)
+        indexes = [
+            models.Index(fields=['appointment_date', 'status'], name='appointment_date_status_idx'),
+            # Also the interval index behind the overlap check on databases without exclusion constraints
+            models.Index(fields=['doctor_id', 'appointment_date', 'appointment_end'],
+                         name='appointment_doctor_span_idx'),
+            models.Index(fields=['patient_id', 'appointment_date'], name='appointment_patient_date_idx'),
+            models.Index(fields=['status', 'appointment_date'], name='appointment_status_date_idx'),
+            models.Index(fields=['specialty', 'appointment_date'], name='appointment_specialty_idx'),
+        ]
+
+
 class Notification(models.Model):
     """Notification class"""
     notification_id = models.CharField(max_length=100, unique=True, primary_key=True)
@@ -422,6 +658,44 @@ class Notification(models.Model):
         db_table = 'notifications'
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
+        indexes = [
+            models.Index(fields=['user_id', 'sent_date'], name='notification_user_sent_idx'),
+            models.Index(fields=['sent_date'], name='notification_sent_idx'),
+            models.Index(fields=['type', 'priority', 'sent_date'], name='notification_retention_idx'),
+            models.Index(fields=['priority', 'sent_date'], name='notification_priority_idx'),
+            models.Index(fields=['is_read', 'sent_date'], name='notification_read_sent_idx'),
+            models.Index(fields=['user_id'], condition=models.Q(is_read=False),
+                         name='notification_user_unread_idx'),
+        ]
+
+
+class ArchivedNotification(models.Model):
+    """Cold storage for notifications past their hot retention period"""
+    notification_id = models.CharField(max_length=100, primary_key=True)
+    user_id = models.CharField(max_length=100)
+    type = models.CharField(
+        max_length=50,
+        choices=[(tag.value, tag.name) for tag in NotificationType]
+    )
+    message = models.TextField()
+    sent_date = models.DateTimeField()
+    is_read = models.BooleanField(default=False)
+    priority = models.CharField(
+        max_length=20,
+        choices=[(tag.value, tag.name) for tag in Priority],
+        default=Priority.MEDIUM.value
+    )
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Range-partitioned by month on sent_date on PostgreSQL (see migration 0003)
+        db_table = 'notifications_archive'
+        verbose_name = 'Archived Notification'
+        verbose_name_plural = 'Archived Notifications'
+        indexes = [
+            models.Index(fields=['user_id', 'sent_date'], name='archived_notif_user_sent_idx'),
+            models.Index(fields=['type', 'priority', 'sent_date'], name='archived_notif_retention_idx'),
+        ]
 
 
 class Analytics(models.Model):
@@ -433,16 +707,33 @@ class Analytics(models.Model):
 
     def calculate_metrics(self) -> dict:
         """Calculate metrics"""
+        from .analytics import compute_analytics, period_bounds
+
+        if self.metric_type not in AnalyticsMetric.__members__:
+            return {
+                'metric_type': self.metric_type,
+                'value': self.value,
+                'period': self.period
+            }
+        metric = AnalyticsMetric(self.metric_type)
+        start, end = period_bounds(self.period)
+        result = compute_analytics([metric], start, end,
+                                   doctor_ids=self.period.get('doctor_ids'),
+                                   specialty=self.period.get('specialty'))[metric.value]
+        self.value = json.dumps(result, cls=DjangoJSONEncoder)
         return {
             'metric_type': self.metric_type,
-            'value': self.value,
+            'value': result,
             'period': self.period
         }
 
-    def visualize(self):
+    def visualize(self) -> dict:
         """Visualize analytics"""
-        # Implementation would return a chart
-        pass
+        from .analytics import chart
+
+        if self.metric_type not in AnalyticsMetric.__members__:
+            return {}
+        return chart(AnalyticsMetric(self.metric_type), self.calculate_metrics()['value'])
 
     class Meta:
         db_table = 'analytics'
@@ -450,6 +741,124 @@ class Analytics(models.Model):
         verbose_name_plural = 'Analytics'
 
 
+class MetricRollup(models.Model):
+    """Typed time-series rollup of appointment and record metrics"""
+    metric = models.CharField(
+        max_length=30,
+        choices=[(tag.value, tag.name) for tag in RollupMetric]
+    )
+    dimension = models.CharField(
+        max_length=20,
+        choices=[(tag.value, tag.name) for tag in RollupDimension]
+    )
+    dimension_value = models.CharField(max_length=100, blank=True, default='')
+    granularity = models.CharField(
+        max_length=10,
+        choices=[(tag.value, tag.name) for tag in RollupGranularity]
+    )
+    bucket_start = models.DateField()
+    value = models.FloatField()
+
+    class Meta:
+        db_table = 'metric_rollups'
+        verbose_name = 'Metric Rollup'
+        verbose_name_plural = 'Metric Rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['metric', 'dimension', 'dimension_value', 'granularity', 'bucket_start'],
+                name='metric_rollup_series_bucket_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['granularity', 'bucket_start'], name='metric_rollup_bucket_idx'),
+        ]
+
+
+class RollupState(models.Model):
+    """High-water mark of source changes already folded into the rollups"""
+    name = models.CharField(max_length=50, primary_key=True)
+    watermark = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'rollup_state'
+
+
+class RollupDirtyDay(models.Model):
+    """
+    A day whose rollups went stale in a way updated_at cannot show: an
+    appointment or medical record moved off it or was deleted. Written by
+    core/signals.py, consumed by refresh_rollups().
+    """
+    id = models.BigAutoField(primary_key=True)
+    day = models.DateField()
+    marked_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'rollup_dirty_days'
+
+
+class ChangeLogEntry(models.Model):
+    """
+    Append-only log of creates, updates and deletes behind the change feeds.
+    seq is the feed cursor (see core/changes.py).
+    """
+    seq = models.BigAutoField(primary_key=True)
+    entity = models.CharField(
+        max_length=20,
+        choices=[(tag.value, tag.name) for tag in ChangeEntity]
+    )
+    object_id = models.CharField(max_length=100)
+    operation = models.CharField(
+        max_length=10,
+        choices=[(tag.value, tag.name) for tag in ChangeOperation]
+    )
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'change_log'
+        verbose_name = 'Change Log Entry'
+        verbose_name_plural = 'Change Log'
+        indexes = [
+            models.Index(fields=['entity', 'seq'], name='change_log_entity_seq_idx'),
+        ]
+
+
+class RecordAccess(models.Model):
+    """
+    Append-only audit trail of medical record reads, written in batches by
+    core/audit.py. Rows are never updated or deleted through the ORM.
+    """
+    id = models.BigAutoField(primary_key=True)
+    record_id = models.CharField(max_length=100)
+    patient_id = models.CharField(max_length=100)
+    accessed_by = models.CharField(max_length=100, blank=True, null=True)  # reader's user_id, if authenticated
+    access_type = models.CharField(
+        max_length=20,
+        choices=[(tag.value, tag.name) for tag in RecordAccessType]
+    )
+    client_ip = models.GenericIPAddressField(blank=True, null=True)
+    accessed_at = models.DateTimeField()
+    written_at = models.DateTimeField(default=timezone.now)  # when the batch reached the table
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Record access entries are append-only')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError('Record access entries are append-only')
+
+    class Meta:
+        db_table = 'record_access_log'
+        verbose_name = 'Record Access'
+        verbose_name_plural = 'Record Access Log'
+        indexes = [
+            models.Index(fields=['patient_id', 'accessed_at'], name='record_access_patient_idx'),
+            models.Index(fields=['accessed_by', 'accessed_at'], name='record_access_user_idx'),
+            models.Index(fields=['accessed_at'], name='record_access_time_idx'),
+        ]
+
+
 class Report(models.Model):
     """Report class"""
     report_id = models.CharField(max_length=100, unique=True, primary_key=True)
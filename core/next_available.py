@@ -0,0 +1,254 @@
+"""
+Precomputed "next available slots" per doctor and per specialty.
+
+Each NextAvailableSlots row holds the next HARMS_NEXT_AVAILABLE_SIZE free
+slots (available, not blocked, starting in the future) of one doctor, or of
+every doctor with one Doctor.specialty, so "the earliest appointment with any
+cardiologist" is a single row read however many slots the doctors have. A
+row is computed from the time slot indexes the first time it is read or
+touched.
+
+Slot writes keep the rows current (core/signals.py, plus
+Appointment.reschedule, which updates slots in bulk):
+  * a slot that becomes free (release(), new slots, unblocking) is merged
+    into its doctor's and specialty's lists if it starts early enough;
+  * a listed slot that is taken, blocked, moved or deleted makes the list
+    recompute, since the slot that replaces it is unknown.
+A slot is blocked if it is in a Schedule.blocked_slots or its time overlaps
+the doctor's DayAvailability.blocked_bits (Schedule.block_time_slot and the
+block endpoint; core/availability.py refreshes the lists it covers).
+A write that cannot change a list only reads it; one that can locks the row,
+doctor rows before specialty rows. Lists also age as their first slots
+start: readers skip past entries and refresh_next_available() (a periodic
+task) recomputes every list whose first slot has started. Bulk loads that
+bypass signals call rebuild_next_available().
+"""
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .availability import day_masks, to_int
+from .enums import AvailabilityScope
+from .models import DayAvailability, Doctor, NextAvailableSlots, Schedule, TimeSlot
+
+DOCTOR = AvailabilityScope.DOCTOR
+SPECIALTY = AvailabilityScope.SPECIALTY
+
+
+def _iso(value):
+    # Stored as UTC ISO strings, which sort in time order
+    return value.astimezone(dt_timezone.utc).isoformat()
+
+
+def _entry(slot_id, doctor_id, start_time, end_time):
+    return {'slot_id': slot_id, 'doctor_id': doctor_id,
+            'start_time': _iso(start_time), 'end_time': _iso(end_time)}
+
+
+def _sort_key(entry):
+    return entry['start_time'], entry['slot_id']
+
+
+def free_slots(now=None):
+    """
+    Available slots not in a schedule's blocked_slots, starting after now.
+    Range blocks live in the availability bitmap; filter rows with range_blocked().
+    """
+    blocked = Schedule.blocked_slots.through.objects.filter(timeslot_id=OuterRef('pk'))
+    return (TimeSlot.objects
+            .filter(is_available=True, start_time__gt=now or timezone.now())
+            .filter(~Exists(blocked))
+            .order_by('start_time', 'slot_id'))
+
+
+def range_blocked(rows):
+    """slot_ids of (slot_id, doctor_id, start_time, end_time) rows that overlap their doctor's blocked bits"""
+    masks = {row[0]: [(row[1], day, bits) for day, bits in day_masks(row[2], row[3])] for row in rows if row[1]}
+    keys = {(doctor_id, day) for row_masks in masks.values() for doctor_id, day, _ in row_masks}
+    if not keys:
+        return set()
+    blocked = {(doctor_id, day): to_int(bits) for doctor_id, day, bits in DayAvailability.objects.filter(
+        doctor_id__in={doctor_id for doctor_id, _ in keys}, day__in={day for _, day in keys},
+    ).values_list('doctor_id', 'day', 'blocked_bits')}
+    return {slot_id for slot_id, row_masks in masks.items()
+            if any(blocked.get((doctor_id, day), 0) & bits for doctor_id, day, bits in row_masks)}
+
+
+def compute(scope, key):
+    """The next free slots of a doctor or specialty, read from the time slot indexes"""
+    size = settings.HARMS_NEXT_AVAILABLE_SIZE
+    slots = free_slots()
+    if scope == DOCTOR:
+        slots = slots.filter(doctor_id=key)
+    else:
+        slots = slots.filter(doctor_id__in=Doctor.objects.filter(specialty=key).values('doctor_id'))
+    rows = slots.values_list('slot_id', 'doctor_id', 'start_time', 'end_time')
+    entries, offset, batch_size = [], 0, size
+    while len(entries) < size:
+        batch = list(rows[offset:offset + batch_size])
+        blocked = range_blocked(batch)
+        entries += [_entry(*row) for row in batch if row[0] not in blocked]
+        if len(batch) < batch_size:
+            break
+        # A blocked range (a doctor's leave) can hide many slots; widen each pass
+        offset += batch_size
+        batch_size *= 2
+    return entries[:size]
+
+
+def _store(row, entries):
+    row.slots = entries
+    row.expires_at = parse_datetime(entries[0]['start_time']) if entries else None
+    row.save()
+
+
+def _locked_row(scope, key, specialty):
+    """(row, created) with the row locked; a new row is filled from compute()"""
+    row, created = NextAvailableSlots.objects.select_for_update().get_or_create(
+        scope=scope.value, key=key, defaults={'specialty': specialty})
+    if created:
+        _store(row, compute(scope, key))
+    return row, created
+
+
+def _changes(slots, changed):
+    """(recompute, inserts) for a list given {slot_id: entry, or None if no longer free}"""
+    size = settings.HARMS_NEXT_AVAILABLE_SIZE
+    listed = {entry['slot_id']: entry for entry in slots}
+    recompute = any(slot_id in listed and listed[slot_id] != entry for slot_id, entry in changed.items())
+    last = _sort_key(slots[-1]) if slots else None
+    inserts = [entry for slot_id, entry in changed.items()
+               if entry is not None and slot_id not in listed
+               and (len(slots) < size or _sort_key(entry) < last)]
+    return recompute, inserts
+
+
+def _apply(scope, key, specialty, changed):
+    row = NextAvailableSlots.objects.filter(scope=scope.value, key=key).first()
+    if row is not None and not any(_changes(row.slots, changed)):
+        return
+    with transaction.atomic():
+        row, created = _locked_row(scope, key, specialty)
+        if created:
+            return
+        recompute, inserts = _changes(row.slots, changed)
+        if recompute:
+            _store(row, compute(scope, key))
+        elif inserts:
+            _store(row, sorted(row.slots + inserts, key=_sort_key)[:settings.HARMS_NEXT_AVAILABLE_SIZE])
+
+
+def refresh_for_slots(slots, deleted=False):
+    """Fold changes to these slots (saved, or deleted) into their doctors' and specialties' lists"""
+    slots = [slot for slot in slots if slot.doctor_id]
+    if not slots:
+        return
+    now = timezone.now()
+    candidates = {slot.pk for slot in slots if not deleted and slot.is_available and slot.start_time > now}
+    blocked = set(Schedule.blocked_slots.through.objects.filter(timeslot_id__in=candidates)
+                  .values_list('timeslot_id', flat=True)) if candidates else set()
+    blocked |= range_blocked([(slot.pk, slot.doctor_id, slot.start_time, slot.end_time)
+                              for slot in slots if slot.pk in candidates])
+    by_doctor = {}
+    for slot in slots:
+        free = slot.pk in candidates and slot.pk not in blocked
+        by_doctor.setdefault(slot.doctor_id, {})[slot.pk] = (
+            _entry(slot.pk, slot.doctor_id, slot.start_time, slot.end_time) if free else None)
+
+    specialties = dict(Doctor.objects.filter(doctor_id__in=by_doctor).values_list('doctor_id', 'specialty'))
+    by_specialty = {}
+    # Sorted, so concurrent writers lock rows in the same order
+    for doctor_id in sorted(by_doctor):
+        specialty = specialties.get(doctor_id, '')
+        _apply(DOCTOR, doctor_id, specialty, by_doctor[doctor_id])
+        if specialty:
+            by_specialty.setdefault(specialty, {}).update(by_doctor[doctor_id])
+    for specialty in sorted(by_specialty):
+        _apply(SPECIALTY, specialty, specialty, by_specialty[specialty])
+
+
+def _recompute(scope, key):
+    with transaction.atomic():
+        row = NextAvailableSlots.objects.select_for_update().filter(scope=scope.value, key=key).first()
+        if row is not None:
+            _store(row, compute(scope, key))
+
+
+def refresh_for_doctor(doctor, deleted=False):
+    """Move a doctor's slots between specialty lists when their specialty changes (or they are deleted)"""
+    row = NextAvailableSlots.objects.filter(scope=DOCTOR.value, key=doctor.doctor_id).first()
+    if row is not None and not deleted and row.specialty == doctor.specialty:
+        return
+    # The list the doctor was tracked under; an untracked doctor's slots can
+    # only be in (or missing from) their current specialty's list
+    stale = {row.specialty if row is not None else doctor.specialty}
+    if deleted:
+        NextAvailableSlots.objects.filter(scope=DOCTOR.value, key=doctor.doctor_id).delete()
+    else:
+        with transaction.atomic():
+            row, created = _locked_row(DOCTOR, doctor.doctor_id, doctor.specialty)
+            if not created:
+                row.specialty = doctor.specialty
+                row.save(update_fields=['specialty', 'updated_at'])
+        stale.add(doctor.specialty)
+    for specialty in sorted(stale - {''}):
+        _recompute(SPECIALTY, specialty)
+
+
+def upcoming_free_slots(scope, key, limit=None):
+    """
+    Up to limit (at most HARMS_NEXT_AVAILABLE_SIZE) upcoming free slots of a
+    doctor or specialty from its precomputed row, or None if no doctor has
+    that ID or specialty.
+    """
+    size = settings.HARMS_NEXT_AVAILABLE_SIZE
+    limit = min(limit or size, size)
+    slots = NextAvailableSlots.objects.filter(scope=scope.value, key=key).values_list('slots', flat=True).first()
+    if slots is None:
+        doctors = Doctor.objects.filter(**{'doctor_id' if scope == DOCTOR else 'specialty': key})
+        specialty = doctors.values_list('specialty', flat=True).first()
+        if specialty is None:
+            return None
+        with transaction.atomic():
+            slots = _locked_row(scope, key, specialty)[0].slots
+    now = _iso(timezone.now())
+    return [entry for entry in slots if entry['start_time'] > now][:limit]
+
+
+def refresh_next_available():
+    """Recompute every list whose first slot has started; returns the number of lists refreshed"""
+    expired = (NextAvailableSlots.objects.filter(expires_at__lte=timezone.now())
+               .order_by('scope', 'key').values_list('scope', 'key'))
+    refreshed = 0
+    for scope, key in expired:
+        _recompute(AvailabilityScope(scope), key)
+        refreshed += 1
+    return refreshed
+
+
+def rebuild_next_available(doctor_ids=None):
+    """
+    Recompute the lists of the given doctors (default: all) and of their
+    specialties in one pass. Returns the number of rows written.
+    """
+    doctors = Doctor.objects.all()
+    if doctor_ids:
+        doctors = doctors.filter(doctor_id__in=doctor_ids)
+    doctors = dict(doctors.values_list('doctor_id', 'specialty'))
+    specialties = set(doctors.values()) - {''}
+    rows = [NextAvailableSlots(scope=DOCTOR.value, key=doctor_id, specialty=specialty)
+            for doctor_id, specialty in doctors.items()]
+    rows += [NextAvailableSlots(scope=SPECIALTY.value, key=specialty, specialty=specialty)
+             for specialty in specialties]
+    for row in rows:
+        row.slots = compute(AvailabilityScope(row.scope), row.key)
+        row.expires_at = parse_datetime(row.slots[0]['start_time']) if row.slots else None
+    with transaction.atomic():
+        NextAvailableSlots.objects.filter(scope=DOCTOR.value, key__in=list(doctors)).delete()
+        NextAvailableSlots.objects.filter(scope=SPECIALTY.value, key__in=specialties).delete()
+        NextAvailableSlots.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,196 @@
+"""
+Read-through cache of single patients, doctors and appointments.
+
+CachedObjectMixin serves a ViewSet's GET get_object() from the shared cache,
+keyed by the lookup value (patient_id, doctor_id, appointment_id), and loads
+and stores the row on a miss. Writes always read the database.
+
+Keys carry a schema version (bump CACHE_VERSION when a cached model's fields
+change) and each entry records the model's generation when it was stored:
+  * save/delete signals drop the row's key, again once the transaction
+    commits so a reader racing the write cannot put the old row back;
+  * queryset update(), delete() and bulk_update() (ObjectCacheQuerySet)
+    bump the generation, which retires every cached row of the model
+    without knowing their keys.
+Patients and doctors are joined to users, so writes to a plain User retire
+them as well; appointments carry their time slot, so slot saves and
+TimeSlot queryset updates (TimeSlotQuerySet) drop the appointments on them.
+
+HARMS_OBJECT_CACHE_LOCAL_SIZE > 0 puts a per-process LRU in front of the
+shared cache. Other processes cannot reach it, so its entries live only
+HARMS_OBJECT_CACHE_LOCAL_TTL_SECONDS: that is how stale a read may be.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from .metrics import OBJECT_CACHE
+
+CACHE_VERSION = 2
+
+
+def _label(model):
+    return model._meta.label_lower
+
+
+def _generation_key(model):
+    return f'objcache:{CACHE_VERSION}:{_label(model)}:generation'
+
+
+def object_key(model, value):
+    return f'objcache:{CACHE_VERSION}:{_label(model)}:{value}'
+
+
+class LocalLRU:
+    """Small thread-safe LRU of pickled rows with a per-entry expiry"""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, data):
+        size = settings.HARMS_OBJECT_CACHE_LOCAL_SIZE
+        if size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + settings.HARMS_OBJECT_CACHE_LOCAL_TTL_SECONDS, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def discard_prefix(self, prefix):
+        with self.lock:
+            for key in [key for key in self.entries if key.startswith(prefix)]:
+                del self.entries[key]
+
+
+_local = LocalLRU()
+
+
+def _enabled():
+    return settings.HARMS_OBJECT_CACHE_TTL_SECONDS > 0
+
+
+def get_cached(queryset, field, value):
+    """The row of queryset with field=value, through the local and shared caches (Http404 if missing)"""
+    model = queryset.model
+    if not _enabled():
+        return get_object_or_404(queryset, **{field: value})
+    key = object_key(model, value)
+    data = _local.get(key)
+    if data is not None:
+        OBJECT_CACHE.labels(model=_label(model), result='local_hit').inc()
+        return pickle.loads(data)
+
+    generation_key = _generation_key(model)
+    found = cache.get_many([key, generation_key])
+    generation = found.get(generation_key, 0)
+    entry = found.get(key)
+    if entry is not None and entry[0] == generation:
+        OBJECT_CACHE.labels(model=_label(model), result='hit').inc()
+        _local.set(key, entry[1])
+        return pickle.loads(entry[1])
+
+    OBJECT_CACHE.labels(model=_label(model), result='miss').inc()
+    instance = get_object_or_404(queryset, **{field: value})
+    # Pickled once; the local LRU hands out a fresh copy per request
+    data = pickle.dumps(instance, pickle.HIGHEST_PROTOCOL)
+    cache.set(key, (generation, data), settings.HARMS_OBJECT_CACHE_TTL_SECONDS)
+    _local.set(key, data)
+    return instance
+
+
+def invalidate_objects(model, values):
+    """Drop cached rows by lookup value, now and again after the current transaction commits"""
+    if not _enabled():
+        return
+    keys = [object_key(model, value) for value in values if value]
+    if not keys:
+        return
+
+    def drop():
+        cache.delete_many(keys)
+        _local.discard(keys)
+    drop()
+    transaction.on_commit(drop)
+
+
+def invalidate_model(model):
+    """Retire every cached row of model (bulk update/delete paths)"""
+    if not _enabled():
+        return
+
+    def bump():
+        key = _generation_key(model)
+        # incr() fails on a missing key; add() sets it only if it is still missing
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, None)
+        _local.discard_prefix(object_key(model, ''))
+    bump()
+    transaction.on_commit(bump)
+
+
+class ObjectCacheQuerySet(models.QuerySet):
+    """QuerySet whose bulk writes retire the model's cached rows"""
+
+    def _retire(self):
+        # A bulk write to users also changes the patients and doctors joined to them
+        for model in [self.model, *self.model.__subclasses__()]:
+            invalidate_model(model)
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        self._retire()
+        return rows
+    update.alters_data = True
+
+    def delete(self):
+        result = super().delete()
+        self._retire()
+        return result
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class CachedObjectMixin:
+    """
+    Serve GET get_object() through get_cached(). The ViewSet's queryset must
+    not depend on the request, since every request shares the cached row.
+    """
+
+    def get_object(self):
+        if self.request.method not in ('GET', 'HEAD'):
+            return super().get_object()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            instance = get_cached(self.get_queryset(), self.lookup_field, self.kwargs[lookup_url_kwarg])
+        except (TypeError, ValueError):
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
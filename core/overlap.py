@@ -0,0 +1,111 @@
+"""
+Storage-level guarantee that a doctor's appointments never overlap.
+
+An appointment occupies [appointment_date, appointment_end). On PostgreSQL
+every partition of core_appointment carries an exclusion constraint
+
+    EXCLUDE USING gist (doctor_id WITH =, tstzrange(appointment_date, appointment_end) WITH &&)
+        WHERE (status <> 'CANCELLED')
+
+so a conflicting INSERT or UPDATE fails inside the database (waiting for an
+in-flight conflicting transaction first) and no read-check-write race is
+possible. PostgreSQL cannot enforce this across partitions, so the constraint
+is added to each monthly partition as create_monthly_partitions makes it
+(on_create=add_overlap_constraint) and to the default partition. Two
+appointments in different partitions can only collide if one runs past
+midnight at the end of a month, which slots never do.
+
+The constraint needs the btree_gist extension (for = on doctor_id). Other
+databases, and PostgreSQL servers built without contrib, have no such
+constraint: Appointment.save() then checks for overlapping appointments on
+the (doctor_id, appointment_date, appointment_end) index instead, after
+locking the doctor's row so bookings for one doctor queue (SQLite serializes
+writers anyway).
+"""
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError
+
+from .enums import AppointmentStatus
+from .partitions import DEFAULT_SUFFIX, list_partitions
+
+logger = logging.getLogger('core.overlap')
+
+CONSTRAINT_SUFFIX = '_no_overlap'
+
+# Appointments are assumed shorter than this; bounds the fallback index scan
+MAX_APPOINTMENT_LENGTH = timedelta(days=1)
+
+
+class AppointmentOverlapError(IntegrityError):
+    """The doctor already has an appointment overlapping this one"""
+
+
+def is_overlap_violation(exc):
+    """True if a database IntegrityError came from an overlap constraint"""
+    diag = getattr(exc.__cause__, 'diag', None)
+    return (getattr(diag, 'constraint_name', None) or '').endswith(CONSTRAINT_SUFFIX)
+
+
+def _has_btree_gist(cursor):
+    cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'btree_gist'")
+    return cursor.fetchone() is not None
+
+
+_enforced = {}
+
+
+def enforced_by_database(connection):
+    """True if this database rejects overlapping appointments itself (cached per alias)"""
+    if connection.vendor != 'postgresql':
+        return False
+    if connection.alias not in _enforced:
+        with connection.cursor() as cursor:
+            _enforced[connection.alias] = _has_btree_gist(cursor)
+    return _enforced[connection.alias]
+
+
+def add_overlap_constraint(cursor, partition):
+    """on_create callback for create_monthly_partitions of core_appointment"""
+    if not _has_btree_gist(cursor):
+        return
+    quote = cursor.db.ops.quote_name
+    cursor.execute(
+        f"ALTER TABLE {quote(partition)} ADD CONSTRAINT {quote(partition + CONSTRAINT_SUFFIX)} "
+        f"EXCLUDE USING gist (doctor_id WITH =, tstzrange(appointment_date, appointment_end) WITH &&) "
+        f"WHERE (status <> %s)",
+        [AppointmentStatus.CANCELLED.value],
+    )
+
+
+def _partitions(table, using):
+    return [*list_partitions(table, using).values(), table + DEFAULT_SUFFIX]
+
+
+def install_overlap_constraints(schema_editor, table):
+    """Add the constraint to every existing partition of table (PostgreSQL only)"""
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        # gist has no operator class for plain equality on text without btree_gist
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'btree_gist'")
+        if cursor.fetchone() is None:
+            logger.warning('btree_gist is not available; overlapping appointments are '
+                           'rejected by Appointment.save() only')
+            return
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        for partition in _partitions(table, connection.alias):
+            add_overlap_constraint(cursor, partition)
+    _enforced.pop(connection.alias, None)
+
+
+def remove_overlap_constraints(schema_editor, table):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    quote = connection.ops.quote_name
+    for partition in _partitions(table, connection.alias):
+        schema_editor.execute(
+            f"ALTER TABLE {quote(partition)} DROP CONSTRAINT IF EXISTS {quote(partition + CONSTRAINT_SUFFIX)}")
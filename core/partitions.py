@@ -0,0 +1,219 @@
+"""
+Helpers for PostgreSQL monthly range partitions.
+
+Partitions are named '<table>_pYYYYMM' and cover [first of month, first of next
+month). Every partitioned table also has a '<table>_default' partition so rows
+outside the maintained range are never rejected. All helpers are no-ops on
+databases other than PostgreSQL.
+"""
+from datetime import date
+
+from django.db import connections, transaction
+
+DEFAULT_SUFFIX = '_default'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month.year:04d}{month.month:02d}"
+
+
+def is_partitioned(table, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [table],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions(table, using='default'):
+    """Return {month: partition_name} for the monthly partitions of a table"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT child.relname FROM pg_inherits i "
+            "JOIN pg_class parent ON parent.oid = i.inhparent "
+            "JOIN pg_class child ON child.oid = i.inhrelid "
+            "WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)",
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    prefix = f"{table}_p"
+    partitions = {}
+    for name in names:
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit():
+            partitions[date(int(suffix[:4]), int(suffix[4:]), 1)] = name
+    return partitions
+
+
+def _move_default_rows(cursor, quote, table, name, column, lower, upper):
+    """
+    Create a partition as a standalone table, move matching rows out of the default
+    partition and attach it, in one transaction. PostgreSQL refuses to create a
+    partition whose range overlaps rows already sitting in the default partition.
+    Row triggers fired by the move see harms.moving_partition_rows = 'on' (the
+    appointment ID key table must not lose the moved rows' keys).
+    """
+    default = quote(table + DEFAULT_SUFFIX)
+    with transaction.atomic(using=cursor.db.alias):
+        cursor.execute("SELECT set_config('harms.moving_partition_rows', 'on', true)")
+        cursor.execute(f"CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {default} WHERE {quote(column)} >= %s AND {quote(column)} < %s "
+            f"RETURNING *) INSERT INTO {quote(name)} SELECT * FROM moved",
+            [lower, upper],
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} FOR VALUES FROM (%s) TO (%s)",
+            [lower, upper],
+        )
+        cursor.execute("SELECT set_config('harms.moving_partition_rows', 'off', true)")
+
+
+def create_monthly_partitions(table, first_month, last_month, using='default', on_create=None):
+    """
+    Create any missing monthly partitions between two months (inclusive).
+    on_create(cursor, partition) is called for each new partition, e.g. to add
+    per-partition constraints. Returns the names of the partitions created.
+    """
+    if not is_partitioned(table, using):
+        return []
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    existing = list_partitions(table, using)
+    column = partition_column(table, using)
+    created = []
+    month = month_start(first_month)
+    last_month = month_start(last_month)
+    with connection.cursor() as cursor:
+        while month <= last_month:
+            if month not in existing:
+                name = partition_name(table, month)
+                bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+                cursor.execute(
+                    f"SELECT 1 FROM {quote(table + DEFAULT_SUFFIX)} "
+                    f"WHERE {quote(column)} >= %s AND {quote(column)} < %s LIMIT 1",
+                    bounds,
+                )
+                if cursor.fetchone():
+                    _move_default_rows(cursor, quote, table, name, column, *bounds)
+                else:
+                    cursor.execute(
+                        f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)} "
+                        f"FOR VALUES FROM (%s) TO (%s)",
+                        bounds,
+                    )
+                if on_create is not None:
+                    on_create(cursor, name)
+                created.append(name)
+            month = add_months(month, 1)
+    return created
+
+
+def partition_column(table, using='default'):
+    """Return the range partition key column of a partitioned table"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT a.attname FROM pg_partitioned_table pt "
+            "JOIN pg_class c ON c.oid = pt.partrelid "
+            "JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = pt.partattrs[0] "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)",
+            [table],
+        )
+        return cursor.fetchone()[0]
+
+
+def drop_partitions_before(table, cutoff, using='default'):
+    """
+    Detach and drop monthly partitions whose whole range ends on or before cutoff.
+    Dropping a partition is a metadata operation, unlike a bulk DELETE.
+    Returns the names of the partitions dropped.
+    """
+    if not is_partitioned(table, using):
+        return []
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    dropped = []
+    with connection.cursor() as cursor:
+        for month, name in sorted(list_partitions(table, using).items()):
+            if add_months(month, 1) > cutoff:
+                break
+            cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+            cursor.execute(f"DROP TABLE {quote(name)}")
+            dropped.append(name)
+    return dropped
+
+
+def convert_to_partitioned(schema_editor, table, column, primary_key):
+    """
+    Recreate a table as a PARTITION BY RANGE table, keeping its rows. The primary
+    key is widened to include the partition column, as PostgreSQL requires.
+    Foreign keys and non-unique indexes of the original table are recreated on
+    the parent (and so on every partition); a default partition is attached.
+    """
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+    old_table = f"{table}_unpartitioned"
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [table],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT ic.relname, pg_get_indexdef(i.indexrelid) FROM pg_index i "
+            "JOIN pg_class ic ON ic.oid = i.indexrelid "
+            "WHERE i.indrelid = %s::regclass AND NOT i.indisunique",
+            [table],
+        )
+        indexes = cursor.fetchall()
+
+    for name, _ in indexes:
+        schema_editor.execute(f"DROP INDEX {quote(name)}")
+    schema_editor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}")
+    schema_editor.execute(
+        f"ALTER TABLE {quote(old_table)} RENAME CONSTRAINT {quote(table + '_pkey')} "
+        f"TO {quote(old_table + '_pkey')}"
+    )
+    schema_editor.execute(
+        f"CREATE TABLE {quote(table)} (LIKE {quote(old_table)} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE ({quote(column)})"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {quote(table)} ADD PRIMARY KEY "
+        f"({', '.join(quote(name) for name in primary_key)})"
+    )
+    schema_editor.execute(
+        f"CREATE TABLE {quote(table + DEFAULT_SUFFIX)} PARTITION OF {quote(table)} DEFAULT"
+    )
+    for _, definition in indexes:
+        schema_editor.execute(definition)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN({quote(column)}), MAX({quote(column)}) FROM {quote(old_table)}")
+        lowest, highest = cursor.fetchone()
+    today = date.today()
+    first = month_start(lowest) if lowest else month_start(today)
+    last = add_months(max(month_start(highest), month_start(today)) if highest else month_start(today), 3)
+    create_monthly_partitions(table, first, last, using=connection.alias)
+
+    schema_editor.execute(f"INSERT INTO {quote(table)} SELECT * FROM {quote(old_table)}")
+    schema_editor.execute(f"DROP TABLE {quote(old_table)} CASCADE")
+    for name, definition in foreign_keys:
+        schema_editor.execute(f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(name)} {definition}")
@@ -0,0 +1,128 @@
+import cProfile
+import hmac
+import os
+import random
+import re
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import BasePermission
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .enums import UserType
+from .middleware import resolve_view_name
+
+PROFILE_HEADER = 'X-Harms-Profile'
+PROFILE_SUFFIX = '.prof'
+
+_UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def profiling_enabled():
+    return getattr(settings, 'HARMS_PROFILING_ENABLED', False)
+
+
+def profile_dir():
+    return str(getattr(settings, 'HARMS_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+def _caller(request):
+    """
+    The requesting user. The middleware sees a plain HttpRequest whose user
+    only reflects the session, so API clients (basic auth and the like) are
+    authenticated with the DRF authenticators the views use.
+    """
+    user = getattr(request, 'user', None)
+    if isinstance(request, Request) or (user is not None and user.is_authenticated):
+        return user
+    authenticators = [authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    try:
+        return Request(request, authenticators=authenticators).user
+    except APIException:
+        return None
+
+
+def is_profiling_authorized(request):
+    """Profiling is restricted to system admins or callers presenting the shared secret"""
+    secret = getattr(settings, 'HARMS_PROFILING_SECRET', '')
+    header = request.headers.get(PROFILE_HEADER)
+    if secret and header and hmac.compare_digest(header, secret):
+        return True
+    user = _caller(request)
+    return bool(user and user.is_authenticated and
+                getattr(user, 'user_type', None) == UserType.SYSTEM_ADMIN.value)
+
+
+def list_profiles():
+    """List stored profiles, newest first"""
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(PROFILE_SUFFIX):
+            stat = entry.stat()
+            profiles.append({
+                'profile_id': entry.name[:-len(PROFILE_SUFFIX)],
+                'size': stat.st_size,
+                'created_at': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat(),
+            })
+    profiles.sort(key=lambda p: p['profile_id'], reverse=True)
+    return profiles
+
+
+def profile_path(profile_id):
+    """Return the on-disk path of a stored profile, or None if it does not exist"""
+    if _UNSAFE_CHARS.search(profile_id) or profile_id.startswith('.'):
+        return None
+    path = os.path.join(profile_dir(), profile_id + PROFILE_SUFFIX)
+    return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """
+    Capture a cProfile of the whole request (view, serializers and ORM) for a
+    sampled fraction of authorized requests and store it as a pstats file.
+    Removed from the middleware chain entirely when profiling is disabled.
+    """
+
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'HARMS_PROFILING_SAMPLE_RATE', 1.0)
+        os.makedirs(profile_dir(), exist_ok=True)
+
+    def __call__(self, request):
+        if not (is_profiling_authorized(request) and random.random() < self.sample_rate):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+
+        profile_id = self.save(profiler, request)
+        response['X-Profile-Id'] = profile_id
+        return response
+
+    def save(self, profiler, request):
+        match = getattr(request, 'resolver_match', None)
+        route = resolve_view_name(match.func, request.method) if match else 'unresolved'
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+        profile_id = _UNSAFE_CHARS.sub('_', f"{timestamp}-{route}-{uuid.uuid4().hex[:6]}")
+        profiler.dump_stats(os.path.join(profile_dir(), profile_id + PROFILE_SUFFIX))
+        return profile_id
+
+
+class CanAccessProfiles(BasePermission):
+    """Allow access to stored profiles only when profiling is enabled and authorized"""
+
+    def has_permission(self, request, view):
+        return profiling_enabled() and is_profiling_authorized(request)
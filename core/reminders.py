@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .changes import record_changes
+from .enums import AppointmentStatus, ChangeEntity, ChangeOperation, NotificationType, Priority
+from .models import Appointment, Notification
+from .timeline import invalidate_patient_summaries
+
+REMINDER_STATUSES = [AppointmentStatus.CONFIRMED.value, AppointmentStatus.SCHEDULED.value]
+
+
+def reminder_notification_id(appointment_id, hours):
+    """Deterministic id so a reminder can be inserted at most once per appointment and offset"""
+    return f"NOT-REM{hours}H-{appointment_id}"
+
+
+def reminder_windows(now, offsets):
+    """
+    Split the look-ahead into non-overlapping windows, one per reminder offset.
+    With offsets (24, 1) appointments in (now+1h, now+24h] get the 24h reminder and
+    appointments in (now, now+1h] get the 1h reminder.
+    """
+    offsets = sorted(set(offsets), reverse=True)
+    windows = []
+    for i, hours in enumerate(offsets):
+        lower = offsets[i + 1] if i + 1 < len(offsets) else 0
+        windows.append((hours, now + timedelta(hours=lower), now + timedelta(hours=hours)))
+    return windows
+
+
+def _create_reminders(batch):
+    """
+    Insert the reminders not sent yet from {appointment_id: notification}, log
+    them to the change feed and drop stale summaries.
+    """
+    if not batch:
+        return
+    with transaction.atomic():
+        # Overlapping runs lock the batch's appointments in the same order; the
+        # later one waits here and then finds the earlier one's reminders sent,
+        # so each reminder is logged as created once
+        list(Appointment.objects.select_for_update().filter(appointment_id__in=list(batch))
+             .order_by('appointment_id').values_list('pk', flat=True))
+        ids = [notification.notification_id for notification in batch.values()]
+        sent = set(Notification.objects.filter(notification_id__in=ids).values_list('notification_id', flat=True))
+        new = [notification for notification in batch.values() if notification.notification_id not in sent]
+        if new:
+            Notification.objects.bulk_create(new, ignore_conflicts=True)
+            record_changes(ChangeEntity.NOTIFICATION, [notification.notification_id for notification in new],
+                           ChangeOperation.CREATED)
+    if new:
+        invalidate_patient_summaries({notification.user_id for notification in new})
+
+
+def send_appointment_reminders(now=None, batch_size=1000):
+    """
+    Create reminder notifications for upcoming confirmed/scheduled appointments.
+    Each window is one range scan on the (appointment_date, status) index, so a run
+    costs O(appointments in window). Reminder ids are deterministic, and each batch
+    locks its appointments before checking which reminders exist, which makes
+    overlapping or restarted runs idempotent.
+    Returns the number of reminders considered.
+    """
+    now = now or timezone.now()
+    offsets = getattr(settings, 'HARMS_REMINDER_OFFSETS_HOURS', (24, 1))
+    considered = 0
+    for hours, window_start, window_end in reminder_windows(now, offsets):
+        upcoming = Appointment.objects.filter(
+            appointment_date__gt=window_start,
+            appointment_date__lte=window_end,
+            status__in=REMINDER_STATUSES,
+        ).values_list('appointment_id', 'patient_id', 'appointment_date')
+
+        batch = {}
+        for appointment_id, patient_id, appointment_date in upcoming.iterator(chunk_size=batch_size):
+            batch[appointment_id] = Notification(
+                notification_id=reminder_notification_id(appointment_id, hours),
+                user_id=patient_id,
+                type=NotificationType.APPOINTMENT_REMINDER.value,
+                message=f"Reminder: you have an appointment on {appointment_date}",
+                priority=Priority.HIGH.value if hours <= 1 else Priority.MEDIUM.value,
+            )
+            if len(batch) >= batch_size:
+                _create_reminders(batch)
+                considered += len(batch)
+                batch = {}
+        _create_reminders(batch)
+        considered += len(batch)
+    return considered
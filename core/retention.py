@@ -0,0 +1,130 @@
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .changes import record_changes
+from .enums import ChangeEntity, ChangeOperation, NotificationType, Priority
+from .models import ArchivedNotification, Notification
+from .partitions import add_months, create_monthly_partitions, drop_partitions_before, month_start
+
+# hot_days: how long a notification stays in the 'notifications' table.
+# retain_days: total lifetime before it is purged (None keeps it forever).
+# When retain_days <= hot_days the notification is deleted instead of archived.
+RetentionPolicy = namedtuple('RetentionPolicy', ['hot_days', 'retain_days'])
+
+DEFAULT_POLICY = RetentionPolicy(hot_days=90, retain_days=730)
+
+# Keys are (NotificationType, Priority or None); None matches any priority
+RETENTION_POLICIES = {
+    (NotificationType.SYSTEM_MAINTENANCE, None): RetentionPolicy(hot_days=14, retain_days=14),
+    (NotificationType.APPOINTMENT_REMINDER, None): RetentionPolicy(hot_days=14, retain_days=180),
+    (NotificationType.APPOINTMENT_CONFIRMATION, None): RetentionPolicy(hot_days=60, retain_days=730),
+    (NotificationType.PRESCRIPTION_RENEWAL, None): RetentionPolicy(hot_days=90, retain_days=1095),
+    (NotificationType.TEST_RESULTS_AVAILABLE, None): RetentionPolicy(hot_days=180, retain_days=2555),
+    (NotificationType.HEALTH_ALERT, None): RetentionPolicy(hot_days=90, retain_days=1825),
+    (NotificationType.HEALTH_ALERT, Priority.URGENT): RetentionPolicy(hot_days=365, retain_days=3650),
+}
+
+ARCHIVE_COLUMNS = ['notification_id', 'user_id', 'type', 'message', 'sent_date', 'is_read', 'priority']
+
+
+def get_policy(notification_type, priority):
+    """Resolve the retention policy for a type/priority pair (enum members or raw values)"""
+    notification_type = NotificationType(getattr(notification_type, 'value', notification_type))
+    priority = Priority(getattr(priority, 'value', priority))
+    return (RETENTION_POLICIES.get((notification_type, priority))
+            or RETENTION_POLICIES.get((notification_type, None))
+            or DEFAULT_POLICY)
+
+
+def _policies():
+    for notification_type in NotificationType:
+        for priority in Priority:
+            yield notification_type, priority, get_policy(notification_type, priority)
+
+
+def ensure_archive_partitions(now=None, months_ahead=3):
+    """Create monthly archive partitions from the oldest hot notification up to a few months ahead"""
+    now = now or timezone.now()
+    oldest = Notification.objects.order_by('sent_date').values_list('sent_date', flat=True).first()
+    first = month_start(oldest or now)
+    return create_monthly_partitions(ArchivedNotification._meta.db_table, first,
+                                     add_months(month_start(now), months_ahead))
+
+
+def archive_notifications(now=None, batch_size=5000):
+    """
+    Move notifications past their hot period into notifications_archive, or delete
+    them outright when the policy keeps nothing in cold storage. Works in
+    primary-key batches: one INSERT ... SELECT, one DELETE and the change-feed
+    tombstones per batch.
+    Returns {'archived': n, 'deleted': n}.
+    """
+    now = now or timezone.now()
+    ensure_archive_partitions(now)
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(column) for column in ARCHIVE_COLUMNS)
+    insert_sql = (
+        f"INSERT INTO {quote(ArchivedNotification._meta.db_table)} ({columns}, {quote('archived_at')}) "
+        f"SELECT {columns}, %s FROM {quote(Notification._meta.db_table)} "
+        f"WHERE {quote('notification_id')} IN ({{placeholders}}) ON CONFLICT DO NOTHING"
+    )
+    # Raw DELETE: the ORM would load every row to fire post_delete; the
+    # change-feed tombstones are written in bulk instead
+    delete_sql = (
+        f"DELETE FROM {quote(Notification._meta.db_table)} "
+        f"WHERE {quote('notification_id')} IN ({{placeholders}})"
+    )
+    totals = {'archived': 0, 'deleted': 0}
+    for notification_type, priority, policy in _policies():
+        cutoff = now - timedelta(days=policy.hot_days)
+        keep_cold = policy.retain_days is None or policy.retain_days > policy.hot_days
+        expired = Notification.objects.filter(
+            type=notification_type.value, priority=priority.value, sent_date__lt=cutoff,
+        ).order_by('sent_date').values_list('notification_id', flat=True)
+        while True:
+            ids = list(expired[:batch_size])
+            if not ids:
+                break
+            placeholders = ', '.join(['%s'] * len(ids))
+            with transaction.atomic(), connection.cursor() as cursor:
+                if keep_cold:
+                    cursor.execute(insert_sql.format(placeholders=placeholders), [now] + ids)
+                cursor.execute(delete_sql.format(placeholders=placeholders), ids)
+                record_changes(ChangeEntity.NOTIFICATION, ids, ChangeOperation.DELETED)
+            totals['archived' if keep_cold else 'deleted'] += len(ids)
+    return totals
+
+
+def purge_archived_notifications(now=None, batch_size=5000):
+    """
+    Remove archived notifications past their total retention. Whole monthly
+    partitions older than every policy's retention are dropped; the remainder
+    is deleted in primary-key batches per type/priority.
+    Returns {'partitions_dropped': [...], 'deleted': n}.
+    """
+    now = now or timezone.now()
+    policies = list(_policies())
+    result = {'partitions_dropped': [], 'deleted': 0}
+
+    if all(policy.retain_days is not None for _, _, policy in policies):
+        longest = max(policy.retain_days for _, _, policy in policies)
+        result['partitions_dropped'] = drop_partitions_before(
+            ArchivedNotification._meta.db_table, (now - timedelta(days=longest)).date())
+
+    for notification_type, priority, policy in policies:
+        if policy.retain_days is None:
+            continue
+        expired = ArchivedNotification.objects.filter(
+            type=notification_type.value, priority=priority.value,
+            sent_date__lt=now - timedelta(days=policy.retain_days),
+        ).values_list('notification_id', flat=True)
+        while True:
+            ids = list(expired[:batch_size])
+            if not ids:
+                break
+            ArchivedNotification.objects.filter(notification_id__in=ids).delete()
+            result['deleted'] += len(ids)
+    return result
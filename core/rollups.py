@@ -0,0 +1,264 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .bulk import bulk_insert
+from .enums import AppointmentStatus, RollupDimension, RollupGranularity, RollupMetric
+from .models import Appointment, Doctor, MedicalRecord, MetricRollup, RollupDirtyDay, RollupState, Schedule
+from .partitions import add_months
+
+WATERMARK_NAME = 'appointments'
+
+# Late-committing transactions can carry an updated_at slightly older than the
+# previous watermark; re-reading a short overlap keeps them from being missed.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+OPEN_STATUSES = {AppointmentStatus.PENDING.value, AppointmentStatus.CONFIRMED.value,
+                 AppointmentStatus.SCHEDULED.value}
+ROLLUP_FIELDS = ['metric', 'dimension', 'dimension_value', 'granularity', 'bucket_start', 'value']
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Metrics that can be summed from day buckets into week/month buckets
+ADDITIVE_METRICS = [metric for metric in RollupMetric if metric != RollupMetric.UTILIZATION]
+
+
+def bucket_start(day, granularity):
+    if granularity == RollupGranularity.WEEK:
+        return day - timedelta(days=day.weekday())
+    if granularity == RollupGranularity.MONTH:
+        return day.replace(day=1)
+    return day
+
+
+def bucket_end(start, granularity):
+    if granularity == RollupGranularity.WEEK:
+        return start + timedelta(days=7)
+    if granularity == RollupGranularity.MONTH:
+        return add_months(start, 1)
+    return start + timedelta(days=1)
+
+
+def _day_ranges(days):
+    """Collapse a set of days into contiguous [first, last] ranges"""
+    ranges = []
+    for day in sorted(days):
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ranges
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def weekly_capacity_minutes():
+    """Scheduled working minutes per doctor and weekday, from each doctor's current (newest) schedule"""
+    capacity = defaultdict(lambda: [0] * 7)
+    seen = set()
+    for doctor_id, working_days, start, end in Schedule.objects.order_by(
+            'doctor_id', '-created_at', '-schedule_id').values_list(
+            'doctor_id', 'working_days', 'start_time', 'end_time'):
+        if doctor_id in seen:
+            continue
+        seen.add(doctor_id)
+        minutes = (end.hour * 60 + end.minute) - (start.hour * 60 + start.minute)
+        for weekday, name in enumerate(DAY_NAMES):
+            if name in (working_days or []) and minutes > 0:
+                capacity[doctor_id][weekday] += minutes
+    return capacity
+
+
+def _day_values(days):
+    """
+    Aggregate the raw tables for the given days with one GROUP BY per source.
+    Returns {(metric, dimension, dimension_value, day): value}.
+    """
+    values = defaultdict(float)
+    if not days:
+        return values
+    ranges = _day_ranges(days)
+    today = timezone.localdate()
+    specialties = dict(Doctor.objects.values_list('doctor_id', 'specialty'))
+
+    appointment_range = Q()
+    record_range = Q()
+    for first, last in ranges:
+        appointment_range |= Q(appointment_date__gte=_aware(first),
+                               appointment_date__lt=_aware(last + timedelta(days=1)))
+        record_range |= Q(visit_date__gte=first, visit_date__lte=last)
+
+    duration = ExpressionWrapper(F('time_slot__end_time') - F('time_slot__start_time'),
+                                 output_field=DurationField())
+    grouped = (Appointment.objects.filter(appointment_range)
+               .annotate(day=TruncDate('appointment_date'))
+               .values('day', 'doctor_id', 'specialty', 'status')
+               .annotate(count=Count('pk'), booked=Sum(duration)))
+
+    def add(metric, day, doctor_id, specialty, amount):
+        values[(metric, RollupDimension.ALL, '', day)] += amount
+        values[(metric, RollupDimension.DOCTOR, doctor_id, day)] += amount
+        values[(metric, RollupDimension.SPECIALTY, specialty, day)] += amount
+
+    for row in grouped:
+        day, doctor_id, specialty, status, count = (
+            row['day'], row['doctor_id'], row['specialty'], row['status'], row['count'])
+        if day not in days:
+            continue
+        add(RollupMetric.BOOKINGS, day, doctor_id, specialty, count)
+        values[(RollupMetric.BOOKINGS, RollupDimension.STATUS, status, day)] += count
+        if status == AppointmentStatus.CANCELLED.value:
+            add(RollupMetric.CANCELLATIONS, day, doctor_id, specialty, count)
+            continue
+        if status == AppointmentStatus.COMPLETED.value:
+            add(RollupMetric.COMPLETIONS, day, doctor_id, specialty, count)
+        elif status in OPEN_STATUSES and day < today:
+            add(RollupMetric.NO_SHOWS, day, doctor_id, specialty, count)
+        booked = row['booked']
+        if booked:
+            add(RollupMetric.BOOKED_MINUTES, day, doctor_id, specialty, booked.total_seconds() / 60)
+
+    records = (MedicalRecord.objects.filter(record_range)
+               .values('visit_date', 'doctor_id')
+               .annotate(count=Count('pk')))
+    for row in records:
+        if row['visit_date'] in days:
+            add(RollupMetric.MEDICAL_RECORDS, row['visit_date'], row['doctor_id'],
+                specialties.get(row['doctor_id'], ''), row['count'])
+
+    for doctor_id, weekly in weekly_capacity_minutes().items():
+        for day in days:
+            minutes = weekly[day.weekday()]
+            if minutes:
+                add(RollupMetric.CAPACITY_MINUTES, day, doctor_id, specialties.get(doctor_id, ''), minutes)
+
+    _add_utilization(values)
+    return values
+
+
+def _add_utilization(values):
+    for (metric, dimension, dimension_value, bucket), capacity in list(values.items()):
+        if metric == RollupMetric.CAPACITY_MINUTES and capacity:
+            booked = values.get((RollupMetric.BOOKED_MINUTES, dimension, dimension_value, bucket), 0.0)
+            values[(RollupMetric.UTILIZATION, dimension, dimension_value, bucket)] = booked / capacity
+
+
+def _replace_buckets(granularity, buckets, values):
+    """Swap all rollup rows of the given buckets for freshly computed values"""
+    with transaction.atomic():
+        MetricRollup.objects.filter(granularity=granularity.value, bucket_start__in=buckets).delete()
+        bulk_insert(MetricRollup, ROLLUP_FIELDS, (
+            (metric.value, dimension.value, dimension_value, granularity.value, bucket, value)
+            for (metric, dimension, dimension_value, bucket), value in values.items()
+        ))
+
+
+def _roll_up_periods(days):
+    """Rebuild week and month buckets that contain any of the given days from day rollups"""
+    for granularity in (RollupGranularity.WEEK, RollupGranularity.MONTH):
+        buckets = sorted({bucket_start(day, granularity) for day in days})
+        values = defaultdict(float)
+        for start in buckets:
+            rows = (MetricRollup.objects
+                    .filter(granularity=RollupGranularity.DAY.value,
+                            bucket_start__gte=start, bucket_start__lt=bucket_end(start, granularity),
+                            metric__in=[metric.value for metric in ADDITIVE_METRICS])
+                    .values('metric', 'dimension', 'dimension_value')
+                    .annotate(total=Sum('value')))
+            for row in rows:
+                values[(RollupMetric(row['metric']), RollupDimension(row['dimension']),
+                        row['dimension_value'], start)] = row['total']
+        _add_utilization(values)
+        _replace_buckets(granularity, buckets, values)
+
+
+def recompute_days(days, batch_days=31):
+    """Recompute day rollups for the given days and every week/month containing them"""
+    days = sorted(set(days))
+    for start in range(0, len(days), batch_days):
+        chunk = set(days[start:start + batch_days])
+        _replace_buckets(RollupGranularity.DAY, chunk, _day_values(chunk))
+    _roll_up_periods(days)
+    return len(days)
+
+
+def mark_days_dirty(values):
+    """Queue days (dates, or datetimes in the current time zone) for the next refresh_rollups()"""
+    days = {timezone.localdate(value) if isinstance(value, datetime) else value
+            for value in values if value is not None}
+    RollupDirtyDay.objects.bulk_create([RollupDirtyDay(day=day) for day in days])
+
+
+def refresh_rollups(now=None, full=False):
+    """
+    Fold source changes since the last run into the rollups. Only days touched by
+    appointments or medical records updated after the watermark are recomputed,
+    plus days marked by mark_days_dirty() (rows moved to another day or deleted)
+    and recent days whose open appointments may have turned into no-shows.
+    Returns the number of days recomputed.
+    """
+    with transaction.atomic():
+        # Overlapping runs would delete and insert the same buckets; a second run waits here
+        state, _ = RollupState.objects.select_for_update().get_or_create(name=WATERMARK_NAME)
+        return _refresh(state, now or timezone.now(), full)
+
+
+def _refresh(state, now, full):
+    since = None if full else state.watermark
+    dirty = list(RollupDirtyDay.objects.values_list('id', 'day'))
+
+    if since is None:
+        first = Appointment.objects.order_by('appointment_date').values_list('appointment_date', flat=True).first()
+        if first is None:
+            days = set()
+        else:
+            first_day, last_day = timezone.localdate(first), timezone.localdate(now)
+            latest = Appointment.objects.order_by('-appointment_date').values_list('appointment_date', flat=True).first()
+            last_day = max(last_day, timezone.localdate(latest))
+            days = {first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)}
+    else:
+        since = since - WATERMARK_OVERLAP
+        changed = Appointment.objects.filter(updated_at__gt=since, updated_at__lte=now)
+        days = {timezone.localdate(value) for value in changed.values_list('appointment_date', flat=True)}
+        days |= set(MedicalRecord.objects.filter(updated_at__gt=since, updated_at__lte=now)
+                    .values_list('visit_date', flat=True).distinct())
+        # Yesterday's still-open appointments become no-shows once the day has passed
+        first_open_day = timezone.localdate(since) - timedelta(days=1)
+        days |= {first_open_day + timedelta(days=i)
+                 for i in range((timezone.localdate(now) - first_open_day).days + 1)}
+
+    days |= {day for _, day in dirty}
+    recomputed = recompute_days(days)
+    state.watermark = now
+    state.save(update_fields=['watermark'])
+    # Only the marks read above: days marked while this run was recomputing stay queued
+    ids = [pk for pk, _ in dirty]
+    for start in range(0, len(ids), 1000):
+        RollupDirtyDay.objects.filter(id__in=ids[start:start + 1000]).delete()
+    return recomputed
+
+
+def query_rollups(metric, granularity=RollupGranularity.DAY, dimension=RollupDimension.ALL,
+                  dimension_value=None, start=None, end=None):
+    """
+    Range query over the rollup table. Returns {dimension_value: [(bucket_start, value), ...]}
+    ordered by bucket; start is inclusive and end exclusive.
+    """
+    rows = MetricRollup.objects.filter(metric=metric.value, dimension=dimension.value,
+                                       granularity=granularity.value)
+    if dimension_value is not None:
+        rows = rows.filter(dimension_value=dimension_value)
+    if start:
+        rows = rows.filter(bucket_start__gte=start)
+    if end:
+        rows = rows.filter(bucket_start__lt=end)
+    series = defaultdict(list)
+    for value_key, bucket, value in rows.order_by('dimension_value', 'bucket_start').values_list(
+            'dimension_value', 'bucket_start', 'value'):
+        series[value_key].append((bucket, value))
+    return dict(series)
@@ -1,11 +1,18 @@
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from rest_framework import serializers
 from .models import (
     User, Patient, Doctor, SystemAdmin, Appointment,
     MedicalRecord, TimeSlot, Schedule, Notification,
-    Medication, TestResult, Report, Analytics
+    Medication, TestResult, Report, Analytics, RecordAccess, APPOINTMENT_ID_KEY
 )
 from .enums import UserType, AppointmentStatus, NotificationType, Priority, ReportType
 
+# Days of slots shown with a schedule when no window is given
+DEFAULT_SCHEDULE_WINDOW_DAYS = 14
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -66,11 +73,19 @@ class SystemAdminSerializer(serializers.ModelSerializer):
 class TimeSlotSerializer(serializers.ModelSerializer):
     class Meta:
         model = TimeSlot
-        fields = ['slot_id', 'start_time', 'end_time', 'is_available']
+        fields = ['slot_id', 'start_time', 'end_time', 'is_available', 'doctor_id']
 
 
 class ScheduleSerializer(serializers.ModelSerializer):
-    available_slots = TimeSlotSerializer(many=True, read_only=True)
+    available_slots = serializers.SerializerMethodField()
+
+    def get_available_slots(self, schedule):
+        """Slots prefetched for the requested window (as 'window_slots'), else the default window from today"""
+        slots = getattr(schedule, 'window_slots', None)
+        if slots is None:
+            start = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+            slots = schedule.get_slots(start, start + timedelta(days=DEFAULT_SCHEDULE_WINDOW_DAYS))
+        return TimeSlotSerializer(slots, many=True).data
 
     class Meta:
         model = Schedule
@@ -84,16 +99,26 @@ class AppointmentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Appointment
-        fields = ['appointment_id', 'patient_id', 'doctor_id', 'appointment_date',
+        fields = ['appointment_id', 'patient_id', 'doctor_id', 'appointment_date', 'appointment_end',
                   'time_slot', 'time_slot_id', 'specialty', 'reason_for_visit',
                   'status', 'notes']
-        read_only_fields = ['status']
+        read_only_fields = ['status', 'appointment_end']
 
     def create(self, validated_data):
         time_slot_id = validated_data.pop('time_slot_id')
         time_slot = TimeSlot.objects.get(slot_id=time_slot_id)
-        appointment = Appointment.objects.create(time_slot=time_slot, **validated_data)
-        time_slot.reserve()
+        # Raises AppointmentOverlapError, leaving the slot untouched, if the doctor is busy then
+        try:
+            with transaction.atomic():
+                appointment = Appointment.objects.create(time_slot=time_slot, **validated_data)
+                time_slot.reserve()
+        except IntegrityError as exc:
+            # A concurrent booking took the ID after the unique validator ran
+            diag = getattr(exc.__cause__, 'diag', None)
+            if getattr(diag, 'constraint_name', None) == APPOINTMENT_ID_KEY:
+                raise serializers.ValidationError(
+                    {'appointment_id': ['appointment with this appointment id already exists.']})
+            raise
         return appointment
 
 
@@ -138,3 +163,9 @@ class AnalyticsSerializer(serializers.ModelSerializer):
     class Meta:
         model = Analytics
         fields = ['analytics_id', 'metric_type', 'value', 'period']
+
+
+class RecordAccessSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RecordAccess
+        fields = ['id', 'record_id', 'patient_id', 'accessed_by', 'access_type', 'client_ip', 'accessed_at']
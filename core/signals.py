@@ -0,0 +1,222 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .availability import rebuild_slot_days, unblock_range, unblock_slots
+from .changes import record_change
+from .enums import ChangeEntity, ChangeOperation
+from .models import Appointment, Doctor, MedicalRecord, Notification, Patient, Schedule, TestResult, TimeSlot, User
+from .next_available import refresh_for_doctor, refresh_for_slots
+from .object_cache import invalidate_objects
+from .rollups import mark_days_dirty
+from .timeline import invalidate_patient_summaries
+
+CHANGE_ENTITIES = {
+    Appointment: ChangeEntity.APPOINTMENT,
+    MedicalRecord: ChangeEntity.MEDICAL_RECORD,
+    Notification: ChangeEntity.NOTIFICATION,
+}
+ROLLUP_DAY_FIELDS = {
+    Appointment: 'appointment_date',
+    MedicalRecord: 'visit_date',
+}
+
+
+@receiver(m2m_changed, sender=Schedule.available_slots.through)
+def stamp_slot_doctor(sender, instance, action, reverse, pk_set, **kwargs):
+    """Copy the schedule's doctor onto slots added to it (TimeSlot.doctor_id)"""
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        doctor_id = Schedule.objects.filter(pk__in=pk_set).values_list('doctor_id', flat=True).first()
+        TimeSlot.objects.filter(pk=instance.pk, doctor_id__isnull=True).update(doctor_id=doctor_id)
+        slots = list(TimeSlot.objects.filter(pk=instance.pk))
+    else:
+        TimeSlot.objects.filter(pk__in=pk_set, doctor_id__isnull=True).update(doctor_id=instance.doctor_id)
+        slots = list(TimeSlot.objects.filter(pk__in=pk_set))
+    rebuild_slot_days(slots)
+    refresh_for_slots(slots)
+
+
+SLOT_POSITION_FIELDS = {'doctor_id', 'start_time', 'end_time'}
+
+
+@receiver(pre_save, sender=TimeSlot)
+def remember_slot_position(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Keep where a slot was before a save moves it, so its old days are rebuilt too"""
+    instance._previous_position = None
+    if raw or instance._state.adding or (update_fields is not None and not SLOT_POSITION_FIELDS & set(update_fields)):
+        return
+    previous = TimeSlot.objects.filter(pk=instance.pk).values_list('doctor_id', 'start_time', 'end_time').first()
+    if previous is not None and previous != (instance.doctor_id, instance.start_time, instance.end_time):
+        doctor_id, start_time, end_time = previous
+        instance._previous_position = TimeSlot(slot_id=instance.pk, doctor_id=doctor_id,
+                                               start_time=start_time, end_time=end_time,
+                                               is_available=False)
+
+
+@receiver(pre_delete, sender=TimeSlot)
+def remember_blocked_slot(sender, instance, **kwargs):
+    """Deleting a slot drops its blocked_slots rows without m2m_changed; note them before they go"""
+    instance._was_blocked = Schedule.blocked_slots.through.objects.filter(timeslot_id=instance.pk).exists()
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def sync_slot_availability(sender, instance, **kwargs):
+    """Keep the doctor's availability bitmap in step with the slot, at its old position too if it moved"""
+    if instance.__dict__.pop('_was_blocked', False) and instance.doctor_id:
+        # The blocked bits of a deleted slot belonged to it; rebuild would keep them
+        unblock_range(instance.doctor_id, instance.start_time, instance.end_time)
+    previous = instance.__dict__.pop('_previous_position', None)
+    if previous is not None and Schedule.blocked_slots.through.objects.filter(timeslot_id=instance.pk).exists():
+        # The blocked bits at the old position belonged to this slot
+        unblock_range(previous.doctor_id, previous.start_time, previous.end_time)
+    rebuild_slot_days([instance] + ([previous] if previous is not None else []))
+    if previous is not None:
+        refresh_for_slots([previous], deleted=True)
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def sync_next_available(sender, instance, signal, **kwargs):
+    """Reserving, releasing, creating or deleting a slot can change the next-available lists"""
+    refresh_for_slots([instance], deleted=signal is post_delete)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def sync_doctor_next_available(sender, instance, signal, raw=False, **kwargs):
+    """A doctor's slots belong to their specialty's next-available list"""
+    if raw:
+        return
+    refresh_for_doctor(instance, deleted=signal is post_delete)
+
+
+@receiver(m2m_changed, sender=Schedule.blocked_slots.through)
+def sync_blocked_slots(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mirror Schedule.blocked_slots into the availability bitmap's blocked bits and the next-available lists"""
+    if reverse:
+        slots = [instance]
+    elif action == 'pre_clear':
+        # clear() does not pass pk_set; remember the slots before they go
+        instance._cleared_blocked_slots = list(instance.blocked_slots.all())
+        return
+    elif action == 'post_clear':
+        slots = instance.__dict__.pop('_cleared_blocked_slots', [])
+    else:
+        slots = list(TimeSlot.objects.filter(pk__in=pk_set or []))
+
+    if action == 'post_add':
+        rebuild_slot_days(slots)
+    elif action in ('post_remove', 'post_clear'):
+        unblock_slots(slots)
+    else:
+        return
+    refresh_for_slots(slots)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=MedicalRecord)
+@receiver(post_save, sender=Notification)
+def log_saved_change(sender, instance, created, raw=False, **kwargs):
+    """Append to the change feed on every save, status transitions included"""
+    if raw:
+        return
+    record_change(CHANGE_ENTITIES[sender], instance.pk,
+                  ChangeOperation.CREATED if created else ChangeOperation.UPDATED)
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=MedicalRecord)
+@receiver(post_delete, sender=Notification)
+def log_deleted_change(sender, instance, **kwargs):
+    """Leave a tombstone in the change feed"""
+    record_change(CHANGE_ENTITIES[sender], instance.pk, ChangeOperation.DELETED)
+
+
+@receiver(pre_save, sender=Appointment)
+@receiver(pre_save, sender=MedicalRecord)
+def mark_previous_rollup_day(sender, instance, raw=False, update_fields=None, **kwargs):
+    """The rollups of the day a row moves away from are recomputed with it (its new day shows in updated_at)"""
+    field = ROLLUP_DAY_FIELDS[sender]
+    if raw or instance._state.adding or (update_fields is not None and field not in update_fields):
+        return
+    previous = sender._base_manager.filter(pk=instance.pk).values_list(field, flat=True).first()
+    if previous is not None and previous != getattr(instance, field):
+        mark_days_dirty([previous])
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=MedicalRecord)
+def mark_deleted_rollup_day(sender, instance, **kwargs):
+    """A deleted row leaves no updated_at behind for refresh_rollups() to find"""
+    mark_days_dirty([getattr(instance, ROLLUP_DAY_FIELDS[sender])])
+
+
+@receiver(m2m_changed, sender=MedicalRecord.medications.through)
+@receiver(m2m_changed, sender=MedicalRecord.test_results.through)
+def log_record_attachments(sender, instance, action, reverse, pk_set, **kwargs):
+    """Medications and test results are part of a record's feed payload"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    record_ids = (pk_set or []) if reverse else [instance.pk]
+    for record_id in record_ids:
+        record_change(ChangeEntity.MEDICAL_RECORD, record_id, ChangeOperation.UPDATED)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=MedicalRecord)
+@receiver(post_delete, sender=MedicalRecord)
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def drop_patient_summary(sender, instance, **kwargs):
+    """The cached patient summary reads appointments, records and notifications"""
+    invalidate_patient_summaries([getattr(instance, 'patient_id', None) or instance.user_id])
+
+
+@receiver(post_save, sender=TestResult)
+def drop_summaries_for_result(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_patient_summaries(
+            MedicalRecord.objects.filter(test_results=instance).values_list('patient_id', flat=True))
+
+
+@receiver(m2m_changed, sender=MedicalRecord.test_results.through)
+def drop_summaries_for_attached_results(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        invalidate_patient_summaries(
+            MedicalRecord.objects.filter(pk__in=pk_set or []).values_list('patient_id', flat=True))
+    else:
+        invalidate_patient_summaries([instance.patient_id])
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def drop_cached_object(sender, instance, **kwargs):
+    """Patients, doctors and appointments are cached by the ID their ViewSet looks up"""
+    lookup = {Patient: 'patient_id', Doctor: 'doctor_id', Appointment: 'appointment_id'}[sender]
+    invalidate_objects(sender, [getattr(instance, lookup)])
+
+
+@receiver(post_save, sender=TimeSlot)
+def drop_cached_slot_appointments(sender, instance, created, raw=False, **kwargs):
+    """A cached appointment carries its slot"""
+    if created or raw:
+        return
+    invalidate_objects(Appointment, Appointment.objects.filter(time_slot=instance)
+                       .values_list('appointment_id', flat=True))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def drop_cached_profiles(sender, instance, **kwargs):
+    """A plain User save changes the columns a cached patient or doctor joins in"""
+    invalidate_objects(Patient, Patient.objects.filter(pk=instance.pk).values_list('patient_id', flat=True))
+    invalidate_objects(Doctor, Doctor.objects.filter(pk=instance.pk).values_list('doctor_id', flat=True))
@@ -0,0 +1,56 @@
+from celery import shared_task
+from django.utils import timezone
+
+from .changes import prune_change_log
+from .models import Appointment
+from .next_available import refresh_next_available
+from .overlap import add_overlap_constraint
+from .partitions import add_months, create_monthly_partitions, month_start
+from .reminders import send_appointment_reminders
+from .retention import archive_notifications, ensure_archive_partitions, purge_archived_notifications
+from .rollups import refresh_rollups
+
+
+@shared_task(name='core.send_appointment_reminders')
+def send_appointment_reminders_task():
+    """Periodic job: queue reminder notifications for upcoming appointments"""
+    return send_appointment_reminders()
+
+
+@shared_task(name='core.apply_notification_retention')
+def apply_notification_retention_task():
+    """Nightly job: archive expired notifications and purge the cold store"""
+    return {
+        'archive': archive_notifications(),
+        'purge': purge_archived_notifications(),
+    }
+
+
+@shared_task(name='core.maintain_partitions')
+def maintain_partitions_task(months_ahead=12):
+    """Daily job: create upcoming monthly partitions before rows need them"""
+    this_month = month_start(timezone.now())
+    return {
+        'appointments': create_monthly_partitions(
+            Appointment._meta.db_table, this_month, add_months(this_month, months_ahead),
+            on_create=add_overlap_constraint),
+        'notifications_archive': ensure_archive_partitions(),
+    }
+
+
+@shared_task(name='core.refresh_rollups')
+def refresh_rollups_task():
+    """Periodic job: fold appointment and medical record changes into the metric rollups"""
+    return refresh_rollups()
+
+
+@shared_task(name='core.refresh_next_available')
+def refresh_next_available_task():
+    """Periodic job: recompute next-available lists whose first slot has started"""
+    return refresh_next_available()
+
+
+@shared_task(name='core.prune_change_log')
+def prune_change_log_task():
+    """Nightly job: drop change-feed entries past HARMS_CHANGE_LOG_RETENTION_DAYS"""
+    return prune_change_log()
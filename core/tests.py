@@ -0,0 +1,557 @@
+import base64
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from types import SimpleNamespace
+from unittest import mock
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import idempotency
+from .backups import create_backup, restore_backup, verify_backup
+from .audit import AuditWriter
+from .availability import block_range, is_free, unblock_range
+from .enums import AppointmentStatus, AvailabilityScope, ChangeEntity, ChangeOperation, NotificationType, UserType
+from .models import Appointment, ChangeLogEntry, Doctor, Notification, Patient, Schedule, SystemAdmin, TimeSlot
+from .next_available import compute, upcoming_free_slots
+from .reminders import _create_reminders, reminder_notification_id, send_appointment_reminders
+from .rollups import weekly_capacity_minutes
+from .serializers import ScheduleSerializer
+from .throttling import MemoryBucketStore
+
+DOCTOR_ID = 'DOC-TEST'
+
+
+def in_thread(func, *args):
+    """Run func on its own thread and database connection; returns a started thread whose .result is set"""
+    def run():
+        try:
+            thread.result = func(*args)
+        except DatabaseError as exc:
+            thread.result = exc
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=run)
+    thread.result = None
+    thread.start()
+    return thread
+
+
+def waiting_for_locks():
+    with connection.cursor() as cursor:
+        # Activity is snapshotted once per transaction unless the snapshot is dropped
+        cursor.execute("SELECT pg_stat_clear_snapshot()")
+        cursor.execute("SELECT COUNT(*) FROM pg_stat_activity WHERE datname = current_database() "
+                       "AND wait_event_type = 'Lock'")
+        return cursor.fetchone()[0]
+
+
+def wait_for_lock_waiter(timeout=10):
+    deadline = time.monotonic() + timeout
+    while waiting_for_locks() < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'row locks need PostgreSQL')
+class RescheduleConcurrencyTests(TransactionTestCase):
+    """
+    Appointment.reschedule from concurrent threads, each on its own connection.
+    python manage.py stress_reschedule runs the same checks at a larger scale.
+    """
+
+    def setUp(self):
+        start = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=30), dt_time(8)))
+        self.slots = [TimeSlot.objects.create(slot_id=f'SLOT-TEST-{index}', doctor_id=DOCTOR_ID,
+                                              start_time=start + timedelta(minutes=15 * index),
+                                              end_time=start + timedelta(minutes=15 * (index + 1)))
+                      for index in range(6)]
+
+    def book(self, index, slot):
+        appointment = Appointment.objects.create(
+            appointment_id=f'APT-TEST-{index}', patient_id=f'PAT-TEST-{index}', doctor_id=DOCTOR_ID,
+            appointment_date=slot.start_time, time_slot=slot, specialty='Test',
+            reason_for_visit='Concurrency test', status=AppointmentStatus.CONFIRMED.value)
+        slot.reserve()
+        return appointment
+
+    def reschedule(self, appointment_id, slot_id, barrier=None):
+        appointment = Appointment.objects.get(pk=appointment_id)
+        if barrier is not None:
+            barrier.wait()
+        return appointment.reschedule(slot_id)
+
+    def run_concurrently(self, moves):
+        """Run reschedule(slot_id) for each (appointment_id, slot_id) at once; returns the results"""
+        barrier = threading.Barrier(len(moves))
+        threads = [in_thread(self.reschedule, appointment_id, slot_id, barrier) for appointment_id, slot_id in moves]
+        for thread in threads:
+            thread.join(timeout=30)
+        return [thread.result for thread in threads]
+
+    def is_unlocked(self, slot_id):
+        with transaction.atomic():
+            return TimeSlot.objects.select_for_update(skip_locked=True).filter(pk=slot_id).exists()
+
+    def assert_consistent(self):
+        held = Counter(Appointment.objects.filter(doctor_id=DOCTOR_ID).values_list('time_slot_id', flat=True))
+        self.assertEqual([slot_id for slot_id, count in held.items() if count > 1], [])
+        for slot in TimeSlot.objects.filter(doctor_id=DOCTOR_ID):
+            self.assertEqual(slot.is_available, slot.slot_id not in held, slot.slot_id)
+
+    def test_slots_are_locked_in_slot_id_order(self):
+        # Moving down from SLOT-TEST-3 to SLOT-TEST-1: while SLOT-TEST-1 is held
+        # elsewhere the reschedule must wait for it before locking its own slot,
+        # or two opposite moves could each hold the slot the other needs
+        self.book(0, self.slots[3])
+        with transaction.atomic():
+            TimeSlot.objects.select_for_update().get(pk=self.slots[1].pk)
+            mover = in_thread(self.reschedule, 'APT-TEST-0', self.slots[1].slot_id)
+            wait_for_lock_waiter()
+            probe = in_thread(self.is_unlocked, self.slots[3].pk)
+            probe.join(timeout=10)
+        mover.join(timeout=30)
+        self.assertIs(probe.result, True)
+        self.assertIs(mover.result, True)
+        self.assert_consistent()
+
+    def test_one_free_slot_goes_to_one_appointment(self):
+        for index in range(5):
+            self.book(index, self.slots[index])
+        results = self.run_concurrently([(f'APT-TEST-{index}', self.slots[5].slot_id) for index in range(5)])
+        self.assertEqual(sorted(results, key=repr), [False] * 4 + [True])
+        self.assertEqual(Appointment.objects.filter(time_slot=self.slots[5]).count(), 1)
+        self.assert_consistent()
+
+    def test_crossing_reschedules_do_not_deadlock(self):
+        for index in range(3):
+            self.book(index, self.slots[index * 2])
+        for _ in range(5):
+            held = sorted(Appointment.objects.filter(doctor_id=DOCTOR_ID).values_list('appointment_id', 'time_slot_id'))
+            # Each appointment asks for the next one's slot, so the slot pairs form a cycle
+            crossing = [(appointment_id, held[(index + 1) % len(held)][1])
+                        for index, (appointment_id, _) in enumerate(held)]
+            self.assertEqual(self.run_concurrently(crossing), [False] * len(held))
+            self.assert_consistent()
+
+            free = TimeSlot.objects.filter(doctor_id=DOCTOR_ID, is_available=True).values_list('slot_id', flat=True)
+            moves = list(zip([appointment_id for appointment_id, _ in held], sorted(free, reverse=True)))
+            self.assertEqual(self.run_concurrently(moves), [True] * len(held))
+            self.assert_consistent()
+
+
+class RecordAccessPermissionTests(TestCase):
+    url = '/api/record-access/'
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def test_anonymous_and_patients_are_refused(self):
+        patient = Patient.objects.create_user(
+            email='patient@example.com', password='x', user_type=UserType.PATIENT.value,
+            patient_id='PAT-PERM', full_name='Patient')
+        self.assertEqual(self.client_for().get(self.url).status_code, 403)
+        self.assertEqual(self.client_for(patient).get(self.url).status_code, 403)
+
+    def test_system_admins_can_list(self):
+        admin = SystemAdmin.objects.create_user(
+            email='admin@example.com', password='x', user_type=UserType.SYSTEM_ADMIN.value,
+            admin_id='ADM-PERM', full_name='Admin', access_level='full')
+        self.assertEqual(self.client_for(admin).get(self.url).status_code, 200)
+
+
+class CachedAppointmentSlotTests(TestCase):
+
+    def test_slot_update_retires_cached_appointment(self):
+        start = timezone.now() + timedelta(days=7)
+        slot = TimeSlot.objects.create(slot_id='SLOT-CACHE', doctor_id='DOC-CACHE', start_time=start,
+                                       end_time=start + timedelta(minutes=15), is_available=False)
+        Appointment.objects.create(
+            appointment_id='APT-CACHE', patient_id='PAT-CACHE', doctor_id='DOC-CACHE',
+            appointment_date=slot.start_time, time_slot=slot, specialty='Test',
+            reason_for_visit='Cache test', status=AppointmentStatus.CONFIRMED.value)
+        url = '/api/appointments/APT-CACHE/'
+        client = APIClient()
+        self.assertFalse(client.get(url).data['time_slot']['is_available'])
+        TimeSlot.objects.filter(pk=slot.pk).update(is_available=True)
+        self.assertTrue(client.get(url).data['time_slot']['is_available'])
+
+
+class AppointmentSpanTests(TestCase):
+
+    def test_changing_the_date_moves_the_end(self):
+        start = timezone.now().replace(microsecond=0) + timedelta(days=7)
+        slot = TimeSlot.objects.create(slot_id='SLOT-SPAN', doctor_id='DOC-SPAN', start_time=start,
+                                       end_time=start + timedelta(minutes=20), is_available=False)
+        Appointment.objects.create(
+            appointment_id='APT-SPAN', patient_id='PAT-SPAN', doctor_id='DOC-SPAN',
+            appointment_date=slot.start_time, time_slot=slot, specialty='Test',
+            reason_for_visit='Span test', status=AppointmentStatus.CONFIRMED.value)
+        moved = start + timedelta(days=1)
+        response = APIClient().patch('/api/appointments/APT-SPAN/', {'appointment_date': moved.isoformat()},
+                                     format='json')
+        self.assertEqual(response.status_code, 200)
+        appointment = Appointment.objects.get(pk='APT-SPAN')
+        self.assertEqual(appointment.appointment_date, moved)
+        self.assertEqual(appointment.appointment_end, moved + timedelta(minutes=20))
+
+
+class ListPaginationTests(TestCase):
+
+    def test_unfiltered_list_is_paged_by_cursor(self):
+        start = timezone.now() + timedelta(days=1)
+        TimeSlot.objects.bulk_create([
+            TimeSlot(slot_id=f'SLOT-PAGE-{index:04d}', start_time=start + timedelta(minutes=15 * (index // 2)),
+                     end_time=start + timedelta(minutes=15 * (index // 2 + 1)))
+            for index in range(250)])
+        client = APIClient()
+        seen, cursor = [], None
+        while True:
+            response = client.get('/api/time-slots/', {'limit': 100, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            seen += [slot['slot_id'] for slot in response.data['results']]
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 250)
+        self.assertEqual(len(set(seen)), 250)
+        self.assertEqual(client.get('/api/time-slots/', {'cursor': 'bogus'}).status_code, 400)
+
+
+class NextAvailableBlockTests(TestCase):
+
+    def test_blocked_ranges_leave_the_lists(self):
+        Doctor.objects.create_user(
+            email='doctor@example.com', password='x', user_type=UserType.DOCTOR.value, doctor_id='DOC-BLOCK',
+            full_name='Doctor', specialty='Blocking', license_number='LIC-BLOCK', department='Test')
+        start = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=3), dt_time(9)))
+        for index in range(4):
+            TimeSlot.objects.create(slot_id=f'SLOT-BLOCK-{index}', doctor_id='DOC-BLOCK',
+                                    start_time=start + timedelta(minutes=15 * index),
+                                    end_time=start + timedelta(minutes=15 * (index + 1)))
+
+        def listed(scope, key):
+            return [entry['slot_id'] for entry in upcoming_free_slots(scope, key)]
+
+        everything = [f'SLOT-BLOCK-{index}' for index in range(4)]
+        self.assertEqual(listed(AvailabilityScope.DOCTOR, 'DOC-BLOCK'), everything)
+        self.assertEqual(listed(AvailabilityScope.SPECIALTY, 'Blocking'), everything)
+        block_range('DOC-BLOCK', start, start + timedelta(minutes=30))
+        self.assertEqual(listed(AvailabilityScope.DOCTOR, 'DOC-BLOCK'), everything[2:])
+        self.assertEqual(listed(AvailabilityScope.SPECIALTY, 'Blocking'), everything[2:])
+        unblock_range('DOC-BLOCK', start, start + timedelta(minutes=15))
+        self.assertEqual(listed(AvailabilityScope.DOCTOR, 'DOC-BLOCK'), everything[:1] + everything[2:])
+
+    def test_deleting_a_blocked_slot_frees_its_time(self):
+        start = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=3), dt_time(9)))
+        end = start + timedelta(minutes=15)
+        slot = TimeSlot.objects.create(slot_id='SLOT-GONE', doctor_id='DOC-GONE', start_time=start, end_time=end)
+        schedule = Schedule.objects.create(schedule_id='SCH-GONE', doctor_id='DOC-GONE',
+                                           start_time=dt_time(9), end_time=dt_time(17))
+        schedule.blocked_slots.add(slot)
+        self.assertFalse(is_free('DOC-GONE', start))
+        slot.delete()
+        TimeSlot.objects.create(slot_id='SLOT-NEW', doctor_id='DOC-GONE', start_time=start, end_time=end)
+        self.assertTrue(is_free('DOC-GONE', start))
+        self.assertEqual(compute(AvailabilityScope.DOCTOR, 'DOC-GONE')[0]['slot_id'], 'SLOT-NEW')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class IdempotencyKeyTests(TestCase):
+    url = '/api/appointments/'
+
+    def setUp(self):
+        cache.clear()
+        start = timezone.now() + timedelta(days=2)
+        for index in range(2):
+            TimeSlot.objects.create(slot_id=f'SLOT-IDEM-{index}', doctor_id='DOC-IDEM',
+                                    start_time=start + timedelta(minutes=15 * index),
+                                    end_time=start + timedelta(minutes=15 * (index + 1)))
+        self.client = APIClient()
+
+    def book(self, key, slot_index=0):
+        return self.client.post(self.url, {
+            'patient_id': 'PAT-IDEM', 'doctor_id': 'DOC-IDEM', 'specialty': 'Test',
+            'appointment_date': TimeSlot.objects.get(pk=f'SLOT-IDEM-{slot_index}').start_time.isoformat(),
+            'time_slot_id': f'SLOT-IDEM-{slot_index}', 'reason_for_visit': 'Idempotency test',
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_repeat_is_replayed_without_booking_twice(self):
+        first = self.book('key-1')
+        second = self.book('key-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(Appointment.objects.filter(doctor_id='DOC-IDEM').count(), 1)
+        self.assertEqual(Notification.objects.filter(user_id='PAT-IDEM').count(), 1)
+
+    def test_key_reused_for_another_request_is_refused(self):
+        self.assertEqual(self.book('key-2').status_code, 201)
+        self.assertEqual(self.book('key-2', slot_index=1).status_code, 422)
+        self.assertEqual(Appointment.objects.filter(doctor_id='DOC-IDEM').count(), 1)
+
+    def test_duplicate_while_in_flight_gets_409(self):
+        request = SimpleNamespace(user=AnonymousUser(), path=self.url)
+        cache.add(idempotency._cache_key(request, 'key-3'), idempotency.IN_FLIGHT)
+        response = self.book('key-3')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertFalse(Appointment.objects.filter(doctor_id='DOC-IDEM').exists())
+
+    def test_server_errors_are_not_stored(self):
+        self.client.raise_request_exception = False
+        with mock.patch.object(Notification.objects, 'create', side_effect=DatabaseError):
+            self.assertEqual(self.book('key-4').status_code, 500)
+        request = SimpleNamespace(user=AnonymousUser(), path=self.url)
+        self.assertIsNone(cache.get(idempotency._cache_key(request, 'key-4')))
+        retry = self.book('key-4', slot_index=1)
+        self.assertEqual(retry.status_code, 201)
+        self.assertNotIn(idempotency.REPLAYED_HEADER, retry)
+
+
+class MemoryBucketStoreTests(TestCase):
+
+    def test_bucket_empties_and_refills(self):
+        store = MemoryBucketStore()
+        bucket = [('throttle:test', (2, 1.0))]  # two tokens, one more per second
+        with mock.patch('core.throttling.time.monotonic', return_value=100.0) as clock:
+            self.assertEqual(store.consume(bucket), 0.0)
+            self.assertEqual(store.consume(bucket), 0.0)
+            self.assertAlmostEqual(store.consume(bucket), 1.0)
+            clock.return_value = 100.5
+            self.assertAlmostEqual(store.consume(bucket), 0.5)
+            clock.return_value = 101.0
+            self.assertEqual(store.consume(bucket), 0.0)
+            self.assertAlmostEqual(store.consume(bucket), 1.0)
+
+    def test_a_request_draws_only_if_every_bucket_has_a_token(self):
+        store = MemoryBucketStore()
+        roomy, tight = ('throttle:roomy', (10, 1.0)), ('throttle:tight', (1, 1.0))
+        with mock.patch('core.throttling.time.monotonic', return_value=100.0):
+            self.assertEqual(store.consume([roomy, tight]), 0.0)
+            self.assertAlmostEqual(store.consume([roomy, tight]), 1.0)
+            # The refused request left the roomy bucket untouched
+            self.assertEqual(store.buckets['throttle:roomy'][0], 9)
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {
+    'user': '', 'client': '100/min', 'search': '100/min', 'booking': '2/min'}})
+class TokenBucketThrottleTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('core.throttling._store', MemoryBucketStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_endpoint_scopes_have_their_own_buckets(self):
+        client = APIClient()
+        for _ in range(2):
+            self.assertEqual(client.post('/api/appointments/', {}, format='json').status_code, 400)
+        refused = client.post('/api/appointments/', {}, format='json')
+        self.assertEqual(refused.status_code, 429)
+        # 2/min refills one token every 30 seconds; wait() becomes Retry-After
+        self.assertEqual(refused['Retry-After'], '30')
+        self.assertEqual(client.get('/api/doctors/DOC-NONE/next-available/').status_code, 404)
+        other = APIClient(REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(other.post('/api/appointments/', {}, format='json').status_code, 400)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BackupRoundTripTests(TransactionTestCase):
+    """Restore runs as its own transaction, as restore_database does"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        start = timezone.now() + timedelta(days=4)
+        for index in range(6):
+            slot = TimeSlot.objects.create(slot_id=f'SLOT-BAK-{index}', doctor_id='DOC-BAK',
+                                           start_time=start + timedelta(minutes=15 * index),
+                                           end_time=start + timedelta(minutes=15 * (index + 1)))
+            if index < 4:
+                Appointment.objects.create(
+                    appointment_id=f'APT-BAK-{index}', patient_id='PAT-BAK', doctor_id='DOC-BAK',
+                    appointment_date=slot.start_time, time_slot=slot, specialty='Test',
+                    reason_for_visit='Backup test', status=AppointmentStatus.PENDING.value)
+
+    def rows(self):
+        return {
+            'appointments': set(Appointment.objects.values_list(
+                'appointment_id', 'appointment_date', 'appointment_end', 'time_slot_id', 'status', 'notes')),
+            'slots': set(TimeSlot.objects.values_list('slot_id', 'start_time', 'end_time', 'is_available')),
+        }
+
+    def test_full_and_incremental_backups_restore_the_latest_rows(self):
+        create_backup(self.root)
+        Appointment.objects.get(pk='APT-BAK-0').confirm()
+        appointment = Appointment.objects.get(pk='APT-BAK-1')
+        appointment.notes = 'Bring referral'
+        appointment.save()
+        Appointment.objects.get(pk='APT-BAK-2').delete()
+        Appointment.objects.create(
+            appointment_id='APT-BAK-9', patient_id='PAT-BAK', doctor_id='DOC-BAK',
+            appointment_date=TimeSlot.objects.get(pk='SLOT-BAK-5').start_time, time_slot_id='SLOT-BAK-5',
+            specialty='Test', reason_for_visit='Backup test', status=AppointmentStatus.PENDING.value)
+        expected = self.rows()
+        incremental = create_backup(self.root, incremental=True)
+        self.assertTrue(incremental.endswith('-incremental'))
+
+        Appointment.objects.filter(pk='APT-BAK-0').update(status=AppointmentStatus.CANCELLED.value)
+        Appointment.objects.filter(pk='APT-BAK-3').delete()
+        TimeSlot.objects.filter(pk='SLOT-BAK-4').update(is_available=False)
+        restore_backup(incremental)
+        self.assertEqual(self.rows(), expected)
+
+    def test_verify_rejects_a_tampered_file(self):
+        path = create_backup(self.root)
+        verify_backup(path)
+        table = os.path.join(path, f'{Appointment._meta.db_table}.ndjson.gz')
+        with gzip.open(table, 'rb') as stream:
+            content = stream.read()
+        with gzip.open(table, 'wb') as stream:
+            stream.write(content.replace(b'APT-BAK-0', b'APT-BAK-8'))
+        with self.assertRaises(ValueError):
+            verify_backup(path)
+        with self.assertRaises(ValueError):
+            restore_backup(path)
+
+
+class ProfilingAuthorizationTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        overrides = override_settings(HARMS_PROFILING_ENABLED=True, HARMS_PROFILE_DIR=directory,
+                                      HARMS_PROFILING_SAMPLE_RATE=1.0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def get(self, email=None):
+        # A new client loads the middleware chain with profiling enabled
+        client = APIClient()
+        if email:
+            token = base64.b64encode(f'{email}:secret'.encode()).decode()
+            client.credentials(HTTP_AUTHORIZATION=f'Basic {token}')
+        return client.get('/api/time-slots/')
+
+    def test_admins_using_api_authentication_are_profiled(self):
+        SystemAdmin.objects.create_user(
+            email='admin@example.com', password='secret', user_type=UserType.SYSTEM_ADMIN.value,
+            admin_id='ADM-PROF', full_name='Admin', access_level='full')
+        response = self.get('admin@example.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Profile-Id', response)
+        self.assertNotIn('X-Profile-Id', self.get())
+
+
+class AuditWriterTests(TestCase):
+
+    def writer(self):
+        # A file where the spool directory should be: spooling fails with OSError
+        handle, spool = tempfile.mkstemp()
+        os.close(handle)
+        self.addCleanup(os.remove, spool)
+        return AuditWriter(batch_size=10, flush_seconds=0, spool_dir=spool)
+
+    def test_events_stay_queued_when_they_cannot_be_spooled(self):
+        writer = self.writer()
+        writer.queue.extend([('REC-1', 'PAT-1', None, 'VIEW', None, timezone.now())] * 3)
+        with mock.patch('core.audit.write_events', side_effect=DatabaseError), \
+                self.assertLogs('core.audit', 'ERROR'), self.assertRaises(OSError):
+            writer.flush()
+        self.assertEqual(len(writer.queue), 3)
+
+    def test_thread_survives_failed_flushes_and_is_restarted_if_it_dies(self):
+        writer = self.writer()
+        calls = []
+
+        def flush():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise OSError('spool directory is not writable')
+            writer.stopping = True
+
+        writer.flush = flush
+        with self.assertLogs('core.audit', 'ERROR'):
+            writer.add([])
+            writer.thread.join(timeout=5)
+        self.assertEqual(calls, [0, 1])
+
+        dead = writer.thread
+        writer.stopping = False
+        with self.assertLogs('core.audit', 'ERROR'):
+            writer.add([])
+        self.assertIsNot(writer.thread, dead)
+        writer.thread.join(timeout=5)
+        self.assertFalse(writer.thread.is_alive())
+
+
+class ScheduleSerializerTests(TestCase):
+
+    def test_without_a_prefetched_window_only_the_default_window_is_listed(self):
+        schedule = Schedule.objects.create(schedule_id='SCH-WIN', doctor_id='DOC-WIN',
+                                           start_time=dt_time(9), end_time=dt_time(17))
+        now = timezone.now()
+        for name, offset in (('past', -30), ('soon', 2), ('later', 60)):
+            schedule.available_slots.add(TimeSlot.objects.create(
+                slot_id=f'SLOT-WIN-{name}', doctor_id='DOC-WIN', start_time=now + timedelta(days=offset),
+                end_time=now + timedelta(days=offset, minutes=15)))
+        slots = ScheduleSerializer(schedule).data['available_slots']
+        self.assertEqual([slot['slot_id'] for slot in slots], ['SLOT-WIN-soon'])
+
+
+class CapacityTests(TestCase):
+
+    def test_only_the_current_schedule_counts(self):
+        Schedule.objects.create(schedule_id='SCH-CAP-1', doctor_id='DOC-CAP', working_days=['Monday', 'Tuesday'],
+                                start_time=dt_time(9), end_time=dt_time(17))
+        Schedule.objects.create(schedule_id='SCH-CAP-2', doctor_id='DOC-CAP', working_days=['Monday'],
+                                start_time=dt_time(9), end_time=dt_time(13))
+        self.assertEqual(weekly_capacity_minutes()['DOC-CAP'], [240, 0, 0, 0, 0, 0, 0])
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'row locks need PostgreSQL')
+@override_settings(HARMS_REMINDER_OFFSETS_HOURS=(24,))
+class ReminderConcurrencyTests(TransactionTestCase):
+
+    def test_overlapping_runs_log_each_reminder_once(self):
+        start = timezone.now() + timedelta(hours=5)
+        for index in range(3):
+            slot = TimeSlot.objects.create(slot_id=f'SLOT-REM-{index}', doctor_id='DOC-REM',
+                                           start_time=start + timedelta(minutes=15 * index),
+                                           end_time=start + timedelta(minutes=15 * (index + 1)),
+                                           is_available=False)
+            Appointment.objects.create(
+                appointment_id=f'APT-REM-{index}', patient_id='PAT-REM', doctor_id='DOC-REM',
+                appointment_date=slot.start_time, time_slot=slot, specialty='Test',
+                reason_for_visit='Reminder test', status=AppointmentStatus.CONFIRMED.value)
+        batch = {f'APT-REM-{index}': Notification(
+            notification_id=reminder_notification_id(f'APT-REM-{index}', 24), user_id='PAT-REM',
+            type=NotificationType.APPOINTMENT_REMINDER.value, message='Reminder') for index in range(3)}
+        # This connection plays the first run: the second starts while its reminders are uncommitted
+        with transaction.atomic():
+            _create_reminders(batch)
+            second = in_thread(send_appointment_reminders)
+            wait_for_lock_waiter()
+        second.join(timeout=30)
+        self.assertEqual(second.result, 3)
+        reminder_ids = [notification.notification_id for notification in batch.values()]
+        created = ChangeLogEntry.objects.filter(entity=ChangeEntity.NOTIFICATION.value, object_id__in=reminder_ids,
+                                                operation=ChangeOperation.CREATED.value)
+        self.assertEqual(sorted(created.values_list('object_id', flat=True)), sorted(reminder_ids))
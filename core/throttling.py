@@ -0,0 +1,178 @@
+"""
+Token-bucket rate limiting shared across gunicorn workers.
+
+Every request draws one token from up to three buckets: the authenticated
+user's, the client's (by IP) and, for throttled endpoint classes, the
+caller's bucket for that class (search, booking, exports, analytics). Views
+name their class with `throttle_scope`, or per action with `throttle_scopes`.
+A request is let through only if all of its buckets have a token, and all of
+them are checked and drawn from in one Redis round trip by a Lua script.
+HARMS_THROTTLE_BACKEND = 'memory' keeps buckets in-process instead, for
+tests and single-process runs.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import THROTTLED_REQUESTS
+
+logger = logging.getLogger('core.throttling')
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Seconds to skip Redis after a connection error before trying again
+REDIS_RETRY_SECONDS = 5
+
+# KEYS: bucket keys; ARGV: capacity and refill rate (tokens/s) for each key.
+# Returns '0' after drawing a token from every bucket, otherwise the seconds
+# until the emptiest bucket has one (and nothing is drawn).
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tokens = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local available = tonumber(bucket[1]) or capacity
+    local elapsed = math.max(0, now - (tonumber(bucket[2]) or now))
+    available = math.min(capacity, available + elapsed * rate)
+    if available < 1 then
+        wait = math.max(wait, (1 - available) / rate)
+    end
+    tokens[i] = available
+end
+if wait > 0 then
+    return tostring(wait)
+end
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 2 - 1])
+    local rate = tonumber(ARGV[i * 2])
+    redis.call('HSET', key, 'tokens', tokens[i] - 1, 'ts', now)
+    redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+end
+return '0'
+"""
+
+
+def parse_rate(rate):
+    """'120/min' -> (capacity, tokens per second); None disables the bucket"""
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    seconds = PERIODS[period.strip()[0]]
+    return int(count), int(count) / seconds
+
+
+class MemoryBucketStore:
+    """In-process buckets with the same semantics as the Redis script"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def consume(self, buckets):
+        now = time.monotonic()
+        with self.lock:
+            tokens = []
+            wait = 0.0
+            for key, (capacity, rate) in buckets:
+                available, stamp = self.buckets.get(key, (capacity, now))
+                available = min(capacity, available + max(0.0, now - stamp) * rate)
+                if available < 1:
+                    wait = max(wait, (1 - available) / rate)
+                tokens.append(available)
+            if wait:
+                return wait
+            for (key, _), available in zip(buckets, tokens):
+                self.buckets[key] = (available - 1, now)
+            return 0.0
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class RedisBucketStore:
+    """Buckets in Redis, checked and drawn atomically by TOKEN_BUCKET_SCRIPT"""
+
+    def __init__(self, url):
+        import redis
+
+        self.errors = redis.RedisError
+        self.client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.down_until = 0.0
+
+    def consume(self, buckets):
+        if time.monotonic() < self.down_until:
+            return 0.0
+        args = []
+        for _, (capacity, rate) in buckets:
+            args += [capacity, rate]
+        try:
+            return float(self.script(keys=[key for key, _ in buckets], args=args))
+        except self.errors:
+            # Fail open: an unreachable Redis must not take the API down with it
+            logger.warning('Throttle store unavailable, not rate limiting for %ss', REDIS_RETRY_SECONDS,
+                           exc_info=True)
+            self.down_until = time.monotonic() + REDIS_RETRY_SECONDS
+            return 0.0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.HARMS_THROTTLE_BACKEND == 'memory':
+                    _store = MemoryBucketStore()
+                else:
+                    _store = RedisBucketStore(settings.HARMS_THROTTLE_REDIS_URL)
+    return _store
+
+
+def endpoint_scope(view):
+    """The endpoint class of the action being served, if it is throttled separately"""
+    scopes = getattr(view, 'throttle_scopes', {})
+    return scopes.get(getattr(view, 'action', None), getattr(view, 'throttle_scope', None))
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Per-user, per-client and per-endpoint-class token buckets"""
+
+    def get_buckets(self, request, view):
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        client = self.get_ident(request)
+        user = request.user.pk if request.user and request.user.is_authenticated else None
+        caller = f'user:{user}' if user is not None else f'client:{client}'
+        buckets = [
+            ('user', f'throttle:user:{user}' if user is not None else None),
+            ('client', f'throttle:client:{client}'),
+        ]
+        scope = endpoint_scope(view)
+        if scope:
+            buckets.append((scope, f'throttle:{scope}:{caller}'))
+        return [(name, key, parse_rate(rates.get(name))) for name, key in buckets]
+
+    def allow_request(self, request, view):
+        buckets = [(key, rate) for _, key, rate in self.get_buckets(request, view) if key and rate]
+        if not buckets:
+            return True
+        self.delay = get_store().consume(buckets)
+        if self.delay:
+            THROTTLED_REQUESTS.labels(scope=endpoint_scope(view) or 'default').inc()
+            return False
+        return True
+
+    def wait(self):
+        return self.delay
@@ -0,0 +1,176 @@
+"""
+Patient timeline and cached patient summary.
+
+The timeline merges a patient's appointments, medical records, test results
+and notifications into one newest-first feed. Each source is narrowed to the
+patient (and to the rows after the page cursor) on its own index, and the
+sources are combined with UNION ALL, so a page is a single query. Pages are
+keyset-paginated on (at, type, id): the cursor is the last item of the
+previous page.
+
+The summary (next appointment, unread notifications, latest test results)
+is cached per patient and dropped by core/signals.py whenever one of those
+sources is written.
+"""
+import base64
+import json
+from datetime import datetime, time, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, CharField, DateTimeField, F, Q, Subquery, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .enums import AppointmentStatus, TimelineItemType
+from .models import Appointment, MedicalRecord, Notification, TestResult
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+LATEST_RESULTS = 5
+COLUMNS = ['item_type', 'item_id', 'at', 'title', 'state', 'detail']
+
+OPEN_STATUSES = [AppointmentStatus.PENDING.value, AppointmentStatus.CONFIRMED.value,
+                 AppointmentStatus.SCHEDULED.value]
+
+
+def _patient_test_ids(patient_id):
+    return Subquery(MedicalRecord.test_results.through.objects
+                    .filter(medicalrecord__patient_id=patient_id).values('testresult_id'))
+
+
+def _source(item_type, queryset, item_id, at, title, state, detail):
+    text = CharField()
+    return queryset.annotate(
+        item_type=Value(item_type.value, output_field=text),
+        item_id=F(item_id),
+        at=at,
+        title=Cast(title, text),
+        state=Cast(state, text),
+        detail=Cast(detail, text),
+    ).values(*COLUMNS)
+
+
+# type -> (queryset for a patient, id field, time field, time field is a date, title, state, detail)
+def _sources(patient_id):
+    return {
+        TimelineItemType.APPOINTMENT: (
+            Appointment.objects.filter(patient_id=patient_id),
+            'appointment_id', 'appointment_date', False, 'specialty', 'status', 'doctor_id'),
+        TimelineItemType.MEDICAL_RECORD: (
+            MedicalRecord.objects.filter(patient_id=patient_id),
+            'record_id', 'visit_date', True, 'diagnosis', 'visit_type', 'doctor_id'),
+        TimelineItemType.TEST_RESULT: (
+            TestResult.objects.filter(pk__in=_patient_test_ids(patient_id)),
+            'test_id', 'test_date', True, 'test_name', 'status', 'results'),
+        TimelineItemType.NOTIFICATION: (
+            Notification.objects.filter(user_id=patient_id),
+            'notification_id', 'sent_date', False, 'message',
+            Case(When(is_read=True, then=Value('READ')), default=Value('UNREAD'), output_field=CharField()),
+            'type'),
+    }
+
+
+def _at(field, lookup, at, is_date):
+    """
+    field <lookup> at, on the column itself so the filter uses its index.
+    Date columns count as midnight UTC, the same as the `at` they are shown with.
+    """
+    if not is_date:
+        return Q(**{f'{field}__{lookup}': at})
+    day = at.astimezone(dt_timezone.utc).date()
+    midnight = at == datetime.combine(day, time.min, dt_timezone.utc)
+    if lookup == 'lt':
+        return Q(**{f'{field}__lt' if midnight else f'{field}__lte': day})
+    if lookup == 'lte':
+        return Q(**{f'{field}__lte': day})
+    return Q(**{field: day}) if midnight else Q(pk__in=[])
+
+
+def _after(item_type, cursor, item_id, field, is_date):
+    """Rows of one source that sort after the cursor in (at, type, item_id) descending order"""
+    if cursor is None:
+        return Q()
+    at, cursor_type, cursor_id = cursor
+    if item_type.value < cursor_type:
+        return _at(field, 'lte', at, is_date)
+    if item_type.value > cursor_type:
+        return _at(field, 'lt', at, is_date)
+    return _at(field, 'lt', at, is_date) | (_at(field, 'exact', at, is_date) & Q(**{f'{item_id}__lt': cursor_id}))
+
+
+def encode_cursor(item):
+    raw = json.dumps([item['at'].isoformat(), item['item_type'], item['item_id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token):
+    """(at, type, item_id) from encode_cursor; ValueError if the token is malformed"""
+    try:
+        at, item_type, item_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return datetime.fromisoformat(at), item_type, item_id
+    except (TypeError, ValueError, UnicodeDecodeError) as exc:
+        raise ValueError('Invalid cursor') from exc
+
+
+def timeline_page(patient_id, cursor=None, limit=DEFAULT_PAGE_SIZE, types=None):
+    """One page of the merged timeline; returns (items, next_cursor or None)"""
+    parts = []
+    for item_type, (queryset, item_id, field, is_date, *shown) in _sources(patient_id).items():
+        if types and item_type not in types:
+            continue
+        at = Cast(field, DateTimeField()) if is_date else F(field)
+        source = _source(item_type, queryset.filter(_after(item_type, cursor, item_id, field, is_date)),
+                         item_id, at, *shown)
+        if connection.features.supports_slicing_ordering_in_compound:
+            # Let each source stop after a page's worth of rows
+            source = source.order_by('-at', '-item_id')[:limit + 1]
+        parts.append(source)
+    if not parts:
+        return [], None
+    merged = parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+    items = list(merged.order_by('-at', '-item_type', '-item_id')[:limit + 1])
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return items[:limit], next_cursor
+
+
+def summary_cache_key(patient_id):
+    return f'patient-summary:{patient_id}'
+
+
+def invalidate_patient_summaries(patient_ids):
+    cache.delete_many([summary_cache_key(patient_id) for patient_id in patient_ids if patient_id])
+
+
+def _compute_summary(patient_id, now):
+    next_appointment = (Appointment.objects
+                        .filter(patient_id=patient_id, appointment_date__gte=now, status__in=OPEN_STATUSES)
+                        .order_by('appointment_date')
+                        .values('appointment_id', 'appointment_date', 'doctor_id', 'specialty', 'status')
+                        .first())
+    unread = Notification.objects.filter(user_id=patient_id, is_read=False).count()
+    latest_results = list(TestResult.objects.filter(pk__in=_patient_test_ids(patient_id))
+                          .order_by('-test_date', '-test_id')
+                          .values('test_id', 'test_name', 'test_date', 'status', 'results')[:LATEST_RESULTS])
+    return {
+        'patient_id': patient_id,
+        'next_appointment': next_appointment,
+        'unread_notifications': unread,
+        'latest_results': latest_results,
+    }
+
+
+def patient_summary(patient_id):
+    """Cached summary; expires early when the next appointment starts"""
+    key = summary_cache_key(patient_id)
+    summary = cache.get(key)
+    if summary is None:
+        now = timezone.now()
+        summary = _compute_summary(patient_id, now)
+        timeout = settings.HARMS_PATIENT_SUMMARY_TTL_SECONDS
+        if summary['next_appointment']:
+            starts_in = (summary['next_appointment']['appointment_date'] - now).total_seconds()
+            timeout = max(1, min(timeout, int(starts_in)))
+        cache.set(key, summary, timeout)
+    return summary
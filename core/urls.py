@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     PatientViewSet, DoctorViewSet, AppointmentViewSet,
     MedicalRecordViewSet, TimeSlotViewSet, NotificationViewSet,
-    ReportViewSet, AnalyticsViewSet
+    ReportViewSet, AnalyticsViewSet, ProfileViewSet, RecordAccessViewSet
 )
 
 router = DefaultRouter()
@@ -15,6 +15,8 @@ router.register(r'time-slots', TimeSlotViewSet, basename='timeslot')
 router.register(r'notifications', NotificationViewSet, basename='notification')
 router.register(r'reports', ReportViewSet, basename='report')
 router.register(r'analytics', AnalyticsViewSet, basename='analytics')
+router.register(r'profiles', ProfileViewSet, basename='profile')
+router.register(r'record-access', RecordAccessViewSet, basename='recordaccess')
 
 urlpatterns = [
     path('api/', include(router.urls)),
@@ -1,8 +1,13 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from datetime import datetime, timedelta
-import uuid
+from rest_framework.exceptions import ValidationError
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
+from django.db.models.functions import TruncDate
+from django.http import FileResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
 
 from .models import (
     Patient, Doctor, SystemAdmin, Appointment,
@@ -13,24 +18,134 @@ from .serializers import (
     PatientSerializer, DoctorSerializer, SystemAdminSerializer,
     AppointmentSerializer, MedicalRecordSerializer, TimeSlotSerializer,
     ScheduleSerializer, NotificationSerializer, MedicationSerializer,
-    TestResultSerializer, ReportSerializer, AnalyticsSerializer
+    TestResultSerializer, ReportSerializer, AnalyticsSerializer, RecordAccessSerializer,
+    DEFAULT_SCHEDULE_WINDOW_DAYS
 )
-from .enums import AppointmentStatus, NotificationType, Priority
-
-
-class PatientViewSet(viewsets.ModelViewSet):
+from .enums import (
+    AppointmentStatus, AvailabilityScope, ChangeEntity, NotificationType, Priority, RecordAccessType,
+    RollupDimension, RollupGranularity, RollupMetric, AnalyticsMetric, TimelineItemType
+)
+from .analytics import compute_analytics
+from . import audit
+from .changes import ChangeFeedMixin
+from .availability import SLOT_MINUTES, block_range, free_ranges, is_free, unblock_range
+from .idempotency import idempotent
+from .filters import (
+    AppointmentFilter, DoctorFilter, IndexedListMixin, MedicalRecordFilter, NotificationFilter, TimeSlotFilter
+)
+from .ids import new_id, new_ids
+from .next_available import upcoming_free_slots
+from .object_cache import CachedObjectMixin
+from .overlap import AppointmentOverlapError
+from .profiling import CanAccessProfiles, list_profiles, profile_path
+from .rollups import query_rollups
+from .timeline import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor, patient_summary, timeline_page
+
+MAX_SCHEDULE_WINDOW_DAYS = 92
+
+
+def _parse_window_bound(value, name, end=False):
+    """Parse an ISO date or datetime; a plain date used as an end bound includes that whole day"""
+    try:
+        # parse_datetime also accepts bare dates, so try the date form first
+        day = parse_date(value)
+        if day is not None:
+            parsed = datetime.combine(day + timedelta(days=1) if end else day, time.min)
+        else:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise ValueError
+    except ValueError:
+        raise ValidationError({name: 'Expected an ISO 8601 date or datetime'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def date_window(request):
+    """Return the optional [start, end) window given by ?start=&end= query params"""
+    start = request.query_params.get('start')
+    end = request.query_params.get('end')
+    start = _parse_window_bound(start, 'start') if start else None
+    end = _parse_window_bound(end, 'end', end=True) if end else None
+    if start and end and end <= start:
+        raise ValidationError({'end': 'end must be after start'})
+    return start, end
+
+
+def _parse_choice(request, enum, name, default=None):
+    """Read an enum-valued query param, rejecting unknown values"""
+    value = request.query_params.get(name)
+    if value is None:
+        if default is None:
+            raise ValidationError({name: 'This query parameter is required'})
+        return default
+    try:
+        return enum(value.upper())
+    except ValueError:
+        raise ValidationError({name: f"Expected one of {', '.join(member.value for member in enum)}"})
+
+
+def schedule_window(request):
+    """
+    Return the [start, end) window of a calendar view: ?start=&end= when given,
+    otherwise DEFAULT_SCHEDULE_WINDOW_DAYS from today. Windows are capped at
+    MAX_SCHEDULE_WINDOW_DAYS so payloads stay bounded.
+    """
+    start, end = date_window(request)
+    span = timedelta(days=DEFAULT_SCHEDULE_WINDOW_DAYS)
+    if start is None:
+        today = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+        start = end - span if end else today
+    if end is None:
+        end = start + span
+    if end - start > timedelta(days=MAX_SCHEDULE_WINDOW_DAYS):
+        raise ValidationError({'end': f'The window may span at most {MAX_SCHEDULE_WINDOW_DAYS} days'})
+    return start, end
+
+
+def filter_appointment_window(appointments, request):
+    """Restrict appointments to the requested window so PostgreSQL can prune partitions"""
+    start, end = date_window(request)
+    if start:
+        appointments = appointments.filter(appointment_date__gte=start)
+    if end:
+        appointments = appointments.filter(appointment_date__lt=end)
+    return appointments.select_related('time_slot').order_by('appointment_date')
+
+
+def _next_available_limit(request):
+    """?limit= of a next-available query; None means as many as are kept"""
+    limit = request.query_params.get('limit')
+    if limit is None:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValidationError({'limit': 'Expected a positive integer'})
+    return limit
+
+
+class PatientViewSet(CachedObjectMixin, viewsets.ModelViewSet):
     """
     ViewSet for Patient operations
-    Use cases: Patient registration, profile management, view appointments
+    Use cases: Patient registration, profile management, view appointments, timeline
     """
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
     lookup_field = 'patient_id'
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def register(self, request):
         """Register a new patient"""
-        serializer = self.get_serializer(data=request.data)
+        data = request.data.copy()
+        if 'patient_id' not in data:
+            data['patient_id'] = new_id('PAT')
+
+        serializer = self.get_serializer(data=data)
         if serializer.is_valid():
             patient = serializer.save()
             return Response({
@@ -42,8 +157,9 @@ class PatientViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def appointments(self, request, patient_id=None):
-        """Get all appointments for a patient"""
-        appointments = Appointment.objects.filter(patient_id=patient_id)
+        """Get a patient's appointments, optionally within ?start=&end="""
+        appointments = filter_appointment_window(
+            Appointment.objects.filter(patient_id=patient_id), request)
         serializer = AppointmentSerializer(appointments, many=True)
         return Response(serializer.data)
 
@@ -52,10 +168,44 @@ class PatientViewSet(viewsets.ModelViewSet):
         """Get all medical records for a patient"""
         records = MedicalRecord.objects.filter(patient_id=patient_id)
         serializer = MedicalRecordSerializer(records, many=True)
+        audit.record_reads(request, serializer.data, RecordAccessType.PATIENT_RECORDS)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def timeline(self, request, patient_id=None):
+        """Newest-first feed of appointments, records, test results and notifications (?cursor=&limit=&types=)"""
+        cursor = request.query_params.get('cursor')
+        try:
+            cursor = decode_cursor(cursor) if cursor else None
+            limit = min(int(request.query_params.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValidationError({'cursor': 'Invalid cursor or limit'})
+        types = request.query_params.get('types')
+        try:
+            types = {TimelineItemType(value.strip().upper()) for value in types.split(',')} if types else None
+        except ValueError:
+            raise ValidationError({'types': f"Expected a comma-separated subset of "
+                                            f"{', '.join(member.value for member in TimelineItemType)}"})
+
+        items, next_cursor = timeline_page(patient_id, cursor, max(limit, 1), types)
+        audit.record_reads(request, [{'record_id': item['item_id'], 'patient_id': patient_id} for item in items
+                                     if item['item_type'] == TimelineItemType.MEDICAL_RECORD.value],
+                           RecordAccessType.TIMELINE)
+        return Response({
+            'patient_id': patient_id,
+            'results': [{'type': item['item_type'], 'id': item['item_id'], 'at': item['at'],
+                         'title': item['title'], 'status': item['state'], 'detail': item['detail']}
+                        for item in items],
+            'next_cursor': next_cursor,
+        })
+
+    @action(detail=True, methods=['get'])
+    def summary(self, request, patient_id=None):
+        """Next appointment, unread notification count and latest test results (cached)"""
+        return Response(patient_summary(patient_id))
+
 
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(CachedObjectMixin, IndexedListMixin, viewsets.ModelViewSet):
     """
     ViewSet for Doctor operations
     Use cases: Doctor registration, schedule management, view patients
@@ -63,21 +213,51 @@ class DoctorViewSet(viewsets.ModelViewSet):
     queryset = Doctor.objects.all()
     serializer_class = DoctorSerializer
     lookup_field = 'doctor_id'
+    filterset_class = DoctorFilter
+    ordering_fields = ['doctor_id', 'specialty', 'department']
+    ordering = 'doctor_id'
+    throttle_scopes = {'schedule': 'search', 'schedule_days': 'search', 'availability': 'search',
+                       'next_available': 'search', 'specialty_next_available': 'search'}
 
     @action(detail=True, methods=['get'])
     def schedule(self, request, doctor_id=None):
-        """Get doctor's schedule"""
-        schedules = Schedule.objects.filter(doctor_id=doctor_id)
+        """Get doctor's schedule with the slots inside ?start=&end= (default: the next two weeks)"""
+        start, end = schedule_window(request)
+        window_slots = TimeSlot.objects.filter(
+            doctor_id=doctor_id, start_time__gte=start, start_time__lt=end).order_by('start_time')
+        schedules = Schedule.objects.filter(doctor_id=doctor_id).prefetch_related(
+            Prefetch('available_slots', queryset=window_slots, to_attr='window_slots'))
         serializer = ScheduleSerializer(schedules, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'], url_path='schedule/days')
+    def schedule_days(self, request, doctor_id=None):
+        """Get per-day free, booked and blocked slot counts for the doctor's schedule window"""
+        start, end = schedule_window(request)
+        blocked = Exists(Schedule.blocked_slots.through.objects.filter(
+            timeslot_id=OuterRef('pk'), schedule__doctor_id=doctor_id))
+        days = (TimeSlot.objects
+                .filter(doctor_id=doctor_id, start_time__gte=start, start_time__lt=end)
+                .annotate(day=TruncDate('start_time'), blocked=blocked)
+                .values('day')
+                .annotate(total=Count('pk'),
+                          free=Count('pk', filter=Q(is_available=True, blocked=False)),
+                          booked=Count('pk', filter=Q(is_available=False)),
+                          blocked_count=Count('pk', filter=Q(blocked=True)))
+                .order_by('day'))
+        return Response([
+            {'date': row['day'], 'total': row['total'], 'free': row['free'],
+             'booked': row['booked'], 'blocked': row['blocked_count']}
+            for row in days
+        ])
+
     @action(detail=True, methods=['post'])
     def set_schedule(self, request, doctor_id=None):
         """Set doctor's schedule"""
         data = request.data.copy()
         data['doctor_id'] = doctor_id
         if 'schedule_id' not in data:
-            data['schedule_id'] = f"SCH-{uuid.uuid4().hex[:8].upper()}"
+            data['schedule_id'] = new_id('SCH')
 
         serializer = ScheduleSerializer(data=data)
         if serializer.is_valid():
@@ -88,36 +268,108 @@ class DoctorViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=True, methods=['get'])
+    def availability(self, request, doctor_id=None):
+        """Check ?at= (optionally up to ?end=), or list free time on ?date= (default today)"""
+        at = request.query_params.get('at')
+        if at:
+            start = _parse_window_bound(at, 'at')
+            end = request.query_params.get('end')
+            end = _parse_window_bound(end, 'end') if end else None
+            if end and end <= start:
+                raise ValidationError({'end': 'end must be after at'})
+            return Response({'doctor_id': doctor_id, 'at': start, 'end': end,
+                             'free': is_free(doctor_id, start, end)})
+
+        day = request.query_params.get('date')
+        day = parse_date(day) if day else timezone.localdate()
+        if day is None:
+            raise ValidationError({'date': 'Expected an ISO 8601 date'})
+        return Response({
+            'doctor_id': doctor_id,
+            'date': day,
+            'slot_minutes': SLOT_MINUTES,
+            'free': [{'start': start, 'end': end} for start, end in free_ranges(doctor_id, day)],
+        })
+
+    @action(detail=True, methods=['get'], url_path='next-available')
+    def next_available(self, request, doctor_id=None):
+        """The doctor's next free slots (?limit=), read from one precomputed row"""
+        slots = upcoming_free_slots(AvailabilityScope.DOCTOR, doctor_id, _next_available_limit(request))
+        if slots is None:
+            return Response({'error': 'Doctor not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'doctor_id': doctor_id, 'slots': slots})
+
+    @action(detail=False, methods=['get'], url_path='next-available')
+    def specialty_next_available(self, request):
+        """The earliest free slots with any doctor of ?specialty= (?limit=), read from one precomputed row"""
+        specialty = request.query_params.get('specialty')
+        if not specialty:
+            raise ValidationError({'specialty': 'This parameter is required'})
+        slots = upcoming_free_slots(AvailabilityScope.SPECIALTY, specialty, _next_available_limit(request))
+        if slots is None:
+            return Response({'error': 'No doctors with that specialty'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'specialty': specialty, 'slots': slots})
+
+    @action(detail=True, methods=['post', 'delete'])
+    def block_time(self, request, doctor_id=None):
+        """Block (POST) or unblock (DELETE) the doctor's time between start and end"""
+        try:
+            start = _parse_window_bound(request.data['start'], 'start')
+            end = _parse_window_bound(request.data['end'], 'end')
+        except KeyError as missing:
+            raise ValidationError({missing.args[0]: 'This field is required'})
+        if end <= start:
+            raise ValidationError({'end': 'end must be after start'})
+        if request.method == 'DELETE':
+            unblock_range(doctor_id, start, end)
+            return Response({'message': 'Time unblocked successfully'})
+        block_range(doctor_id, start, end)
+        return Response({'message': 'Time blocked successfully'})
+
     @action(detail=True, methods=['get'])
     def appointments(self, request, doctor_id=None):
-        """Get all appointments for a doctor"""
-        appointments = Appointment.objects.filter(doctor_id=doctor_id)
+        """Get a doctor's appointments, optionally within ?start=&end="""
+        appointments = filter_appointment_window(
+            Appointment.objects.filter(doctor_id=doctor_id), request)
         serializer = AppointmentSerializer(appointments, many=True)
         return Response(serializer.data)
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(CachedObjectMixin, IndexedListMixin, ChangeFeedMixin, viewsets.ModelViewSet):
     """
     ViewSet for Appointment operations
-    Use cases: Book appointment, reschedule, cancel, confirm
+    Use cases: Book appointment, reschedule, cancel, confirm, sync changes
     """
-    queryset = Appointment.objects.all()
+    # The slot is serialized with the appointment, and cached with it. Joined: a
+    # list is one page, so each page row is a primary-key probe into time_slots
+    queryset = Appointment.objects.select_related('time_slot')
     serializer_class = AppointmentSerializer
     lookup_field = 'appointment_id'
-
+    filterset_class = AppointmentFilter
+    ordering_fields = ['appointment_date', 'updated_at']
+    ordering = '-appointment_date'
+    change_entity = ChangeEntity.APPOINTMENT
+    change_feed_queryset = Appointment.objects.select_related('time_slot')
+    throttle_scopes = {'create': 'booking', 'reschedule': 'booking', 'cancel': 'booking'}
+
+    @idempotent
     def create(self, request):
         """Book a new appointment"""
         data = request.data.copy()
         if 'appointment_id' not in data:
-            data['appointment_id'] = f"APT-{uuid.uuid4().hex[:8].upper()}"
+            data['appointment_id'] = new_id('APT')
 
         serializer = self.get_serializer(data=data)
         if serializer.is_valid():
-            appointment = serializer.save()
+            try:
+                appointment = serializer.save()
+            except AppointmentOverlapError as exc:
+                return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
 
             # Create notification for patient
             Notification.objects.create(
-                notification_id=f"NOT-{uuid.uuid4().hex[:8].upper()}",
+                notification_id=new_id('NOT'),
                 user_id=appointment.patient_id,
                 type=NotificationType.APPOINTMENT_CONFIRMATION.value,
                 message=f"Your appointment has been booked for {appointment.appointment_date}",
@@ -142,6 +394,37 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             })
         except Appointment.DoesNotExist:
             return Response({'error': 'Appointment not found'}, status=status.HTTP_404_NOT_FOUND)
+        except AppointmentOverlapError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+
+    @action(detail=True, methods=['post'])
+    def reschedule(self, request, appointment_id=None):
+        """Move an appointment to another free slot of the same doctor"""
+        appointment = self.get_object()
+        time_slot_id = request.data.get('time_slot_id')
+        if not time_slot_id:
+            raise ValidationError({'time_slot_id': 'This field is required'})
+        try:
+            moved = appointment.reschedule(time_slot_id)
+        except AppointmentOverlapError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_409_CONFLICT)
+        if not moved:
+            if appointment.status in (AppointmentStatus.CANCELLED.value, AppointmentStatus.COMPLETED.value):
+                return Response({'error': f'Cannot reschedule a {appointment.status.lower()} appointment'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response({'error': 'Time slot is not available'}, status=status.HTTP_409_CONFLICT)
+
+        Notification.objects.create(
+            notification_id=new_id('NOT'),
+            user_id=appointment.patient_id,
+            type=NotificationType.APPOINTMENT_CONFIRMATION.value,
+            message=f"Your appointment has been rescheduled to {appointment.appointment_date}",
+            priority=Priority.HIGH.value
+        )
+        return Response({
+            'message': 'Appointment rescheduled',
+            'data': self.get_serializer(appointment).data
+        })
 
     @action(detail=True, methods=['post'])
     def cancel(self, request, appointment_id=None):
@@ -171,7 +454,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Appointment not found'}, status=status.HTTP_404_NOT_FOUND)
 
 
-class TimeSlotViewSet(viewsets.ModelViewSet):
+class TimeSlotViewSet(IndexedListMixin, viewsets.ModelViewSet):
     """
     ViewSet for TimeSlot operations
     Use cases: View available slots, reserve slots
@@ -179,6 +462,10 @@ class TimeSlotViewSet(viewsets.ModelViewSet):
     queryset = TimeSlot.objects.all()
     serializer_class = TimeSlotSerializer
     lookup_field = 'slot_id'
+    filterset_class = TimeSlotFilter
+    ordering_fields = ['start_time']
+    ordering = 'start_time'
+    throttle_scopes = {'available': 'search'}
 
     @action(detail=False, methods=['get'])
     def available(self, request):
@@ -194,22 +481,32 @@ class TimeSlotViewSet(viewsets.ModelViewSet):
         end_date = request.data.get('end_date')
         start_time = request.data.get('start_time', '09:00')
         end_time = request.data.get('end_time', '17:00')
+        schedule = None
+        if request.data.get('schedule_id'):
+            schedule = Schedule.objects.filter(schedule_id=request.data['schedule_id']).first()
+            if schedule is None:
+                return Response({'error': 'Schedule not found'}, status=status.HTTP_404_NOT_FOUND)
 
         # Simple slot creation for prototype
         slots_created = []
         current_date = datetime.strptime(start_date, '%Y-%m-%d')
         end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
 
-        while current_date <= end_date_obj:
-            slot_id = f"TS-{uuid.uuid4().hex[:8].upper()}"
+        slot_ids = new_ids('TS', max((end_date_obj - current_date).days + 1, 0))
+        for slot_id in slot_ids:
             slot = TimeSlot.objects.create(
                 slot_id=slot_id,
-                start_time=datetime.combine(current_date.date(), datetime.strptime(start_time, '%H:%M').time()),
-                end_time=datetime.combine(current_date.date(), datetime.strptime(end_time, '%H:%M').time()),
-                is_available=True
+                start_time=timezone.make_aware(
+                    datetime.combine(current_date.date(), datetime.strptime(start_time, '%H:%M').time())),
+                end_time=timezone.make_aware(
+                    datetime.combine(current_date.date(), datetime.strptime(end_time, '%H:%M').time())),
+                is_available=True,
+                doctor_id=schedule.doctor_id if schedule else None
             )
             slots_created.append(slot.slot_id)
             current_date += timedelta(days=1)
+        if schedule:
+            schedule.available_slots.add(*slots_created)
 
         return Response({
             'message': f'{len(slots_created)} time slots created',
@@ -217,20 +514,47 @@ class TimeSlotViewSet(viewsets.ModelViewSet):
         }, status=status.HTTP_201_CREATED)
 
 
-class MedicalRecordViewSet(viewsets.ModelViewSet):
+class MedicalRecordViewSet(IndexedListMixin, ChangeFeedMixin, viewsets.ModelViewSet):
     """
     ViewSet for MedicalRecord operations
-    Use cases: Create records, view records, update records
+    Use cases: Create records, view records, update records, sync changes
     """
     queryset = MedicalRecord.objects.all()
     serializer_class = MedicalRecordSerializer
     lookup_field = 'record_id'
+    filterset_class = MedicalRecordFilter
+    ordering_fields = ['visit_date', 'updated_at']
+    ordering = '-visit_date'
+    change_entity = ChangeEntity.MEDICAL_RECORD
+    change_feed_queryset = MedicalRecord.objects.prefetch_related('medications', 'test_results')
+
+    def list(self, request, *args, **kwargs):
+        """List medical records (each returned record is audited)"""
+        response = super().list(request, *args, **kwargs)
+        audit.record_reads(request, response.data, RecordAccessType.LIST)
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """Get one medical record (audited)"""
+        response = super().retrieve(request, *args, **kwargs)
+        audit.record_reads(request, [response.data], RecordAccessType.RETRIEVE)
+        return response
 
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Created, updated and deleted records after ?cursor= (returned records are audited)"""
+        response = super().changes(request)
+        if response.status_code == status.HTTP_200_OK:
+            audit.record_reads(request, [change['data'] for change in response.data['changes'] if change['data']],
+                               RecordAccessType.CHANGE_FEED)
+        return response
+
+    @idempotent
     def create(self, request):
         """Create a new medical record"""
         data = request.data.copy()
         if 'record_id' not in data:
-            data['record_id'] = f"MR-{uuid.uuid4().hex[:8].upper()}"
+            data['record_id'] = new_id('MR')
 
         serializer = self.get_serializer(data=data)
         if serializer.is_valid():
@@ -238,7 +562,7 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
 
             # Create notification
             Notification.objects.create(
-                notification_id=f"NOT-{uuid.uuid4().hex[:8].upper()}",
+                notification_id=new_id('NOT'),
                 user_id=record.patient_id,
                 type=NotificationType.TEST_RESULTS_AVAILABLE.value,
                 message=f"New medical record created for your visit on {record.visit_date}",
@@ -252,14 +576,18 @@ class MedicalRecordViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class NotificationViewSet(viewsets.ModelViewSet):
+class NotificationViewSet(IndexedListMixin, ChangeFeedMixin, viewsets.ModelViewSet):
     """
     ViewSet for Notification operations
-    Use cases: View notifications, mark as read
+    Use cases: View notifications, mark as read, sync changes
     """
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     lookup_field = 'notification_id'
+    filterset_class = NotificationFilter
+    ordering_fields = ['sent_date']
+    ordering = '-sent_date'
+    change_entity = ChangeEntity.NOTIFICATION
 
     @action(detail=False, methods=['get'])
     def user_notifications(self, request):
@@ -294,13 +622,15 @@ class ReportViewSet(viewsets.ModelViewSet):
     queryset = Report.objects.all()
     serializer_class = ReportSerializer
     lookup_field = 'report_id'
+    throttle_scopes = {'generate': 'exports'}
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def generate(self, request):
         """Generate a new report"""
         data = request.data.copy()
         if 'report_id' not in data:
-            data['report_id'] = f"RPT-{uuid.uuid4().hex[:8].upper()}"
+            data['report_id'] = new_id('RPT')
 
         # For prototype, create simple report data
         report_type = data.get('report_type')
@@ -331,6 +661,8 @@ class AnalyticsViewSet(viewsets.ModelViewSet):
     queryset = Analytics.objects.all()
     serializer_class = AnalyticsSerializer
     lookup_field = 'analytics_id'
+    throttle_scope = 'analytics'
+    throttle_scopes = {'visualize': 'exports'}
 
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
@@ -343,3 +675,111 @@ class AnalyticsViewSet(viewsets.ModelViewSet):
             'completed_appointments': Appointment.objects.filter(status=AppointmentStatus.COMPLETED.value).count(),
         }
         return Response(analytics_data)
+
+    @action(detail=False, methods=['get'])
+    def rollups(self, request):
+        """Get a precomputed metric time series"""
+        metric = _parse_choice(request, RollupMetric, 'metric')
+        granularity = _parse_choice(request, RollupGranularity, 'granularity', RollupGranularity.DAY)
+        dimension = _parse_choice(request, RollupDimension, 'dimension', RollupDimension.ALL)
+        start, end = date_window(request)
+        series = query_rollups(
+            metric, granularity, dimension,
+            dimension_value=request.query_params.get('value'),
+            start=timezone.localdate(start) if start else None,
+            end=timezone.localdate(end) if end else None,
+        )
+        return Response({
+            'metric': metric.value,
+            'granularity': granularity.value,
+            'dimension': dimension.value,
+            'series': [
+                {'value': key, 'points': [{'bucket': bucket, 'value': value} for bucket, value in points]}
+                for key, points in series.items()
+            ],
+        })
+
+    @action(detail=False, methods=['get'])
+    def trends(self, request):
+        """Get utilization, cancellation, lead-time, heatmap and daily trend analytics"""
+        metrics = request.query_params.get('metric')
+        try:
+            metrics = [AnalyticsMetric(value.strip().upper()) for value in metrics.split(',')] if metrics else None
+        except ValueError:
+            raise ValidationError({'metric': f"Expected one of {', '.join(member.value for member in AnalyticsMetric)}"})
+        try:
+            window = int(request.query_params.get('window', 7))
+        except ValueError:
+            raise ValidationError({'window': 'Expected a number of days'})
+        start, end = date_window(request)
+        doctor_ids = request.query_params.get('doctor')
+        return Response(compute_analytics(
+            metrics, start, end,
+            doctor_ids=doctor_ids.split(',') if doctor_ids else None,
+            specialty=request.query_params.get('specialty'),
+            window=max(window, 1),
+        ))
+
+    @action(detail=True, methods=['post'])
+    def calculate(self, request, analytics_id=None):
+        """Calculate and store metrics for an analytics entry"""
+        analytics = self.get_object()
+        result = analytics.calculate_metrics()
+        analytics.save()
+        return Response(result)
+
+    @action(detail=True, methods=['get'])
+    def visualize(self, request, analytics_id=None):
+        """Get chart data for an analytics entry"""
+        return Response(self.get_object().visualize())
+
+
+class RecordAccessViewSet(viewsets.ViewSet):
+    """
+    ViewSet for the medical record access audit log (read-only)
+    Use cases: Who read a patient's records, what a user read, in a time range
+    """
+    permission_classes = [audit.CanReadAccessLog]
+
+    def list(self, request):
+        """Newest-first audit entries (?patient_id=&user_id=&since=&until=&cursor=&limit=)"""
+        patient_id = request.query_params.get('patient_id')
+        user_id = request.query_params.get('user_id')
+        since, until = request.query_params.get('since'), request.query_params.get('until')
+        since = _parse_window_bound(since, 'since') if since else None
+        until = _parse_window_bound(until, 'until', end=True) if until else None
+        cursor = request.query_params.get('cursor')
+        try:
+            cursor = audit.decode_cursor(cursor) if cursor else None
+            limit = min(int(request.query_params.get('limit', audit.DEFAULT_PAGE_SIZE)), audit.MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValidationError({'cursor': 'Invalid cursor or limit'})
+
+        entries, next_cursor = audit.access_page(patient_id, user_id, since, until, cursor, max(limit, 1))
+        return Response({
+            'results': RecordAccessSerializer(entries, many=True).data,
+            'next_cursor': next_cursor,
+        })
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    """
+    ViewSet for stored request profiles
+    Use cases: List captured profiles, download them for flame-graph tooling
+    """
+    permission_classes = [CanAccessProfiles]
+    lookup_field = 'profile_id'
+    lookup_value_regex = '[A-Za-z0-9_.-]+'
+
+    def list(self, request):
+        """List stored profiles"""
+        return Response(list_profiles())
+
+    def retrieve(self, request, profile_id=None):
+        """Download a stored profile in pstats format"""
+        path = profile_path(profile_id)
+        if path is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(open(path, 'rb'), as_attachment=True,
+                            filename=f"{profile_id}.prof",
+                            content_type='application/octet-stream')